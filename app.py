@@ -1,83 +1,169 @@
-import re
-import time
-import os
-import json
-import requests
-import bibtexparser
+# Must run before Flask, requests and httpx are imported
+from async_mode import ASYNC_MODE, monkey_patch, run_blocking
+monkey_patch()
 
-from typing import List, Dict, Any
-from flask import Flask, render_template, request, jsonify
-from flask_cors import CORS
-import numpy as np
-from pathlib import Path
-from datetime import datetime
-from flask_socketio import SocketIO
+from startup import STARTUP, ensure_embed_model, start_warmup, timed_import
 
-from llama_index.core import VectorStoreIndex, ComposableGraph, Settings
-from llama_index.embeddings.huggingface_optimum import OptimumEmbedding
-from llama_index.llms.lmstudio import LMStudio
-from llama_index.core.query_engine import RetrieverQueryEngine, ComposableGraphQueryEngine
-from llama_index.core.callbacks import CallbackManager, LlamaDebugHandler
+with STARTUP.phase('import flask and standard library', 'import'):
+    import re
+    import time
+    import os
+    import json
+    import hashlib
+    import threading
 
-from glossaryCreation import extract_keywords, explain_keyword, format_glossary
-from fetchDocuments import fetch_document_details
-from db_utils import VectorDBManager, get_or_create_index
+    from typing import List, Dict, Any
+    from flask import Flask, render_template, request, jsonify, Response, g, stream_with_context
+    from flask_cors import CORS
+    import numpy as np
+    from pathlib import Path
+    from datetime import datetime
+    from flask_socketio import SocketIO, join_room, leave_room
+
+# The embedding model, Chroma and the LMStudio integration are imported on first use
+with STARTUP.phase('import llama_index.core', 'import'):
+    from llama_index.core import VectorStoreIndex, ComposableGraph, Settings
+    from llama_index.core.query_engine import RetrieverQueryEngine, ComposableGraphQueryEngine
+    from llama_index.core.callbacks import CallbackManager
+    from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+    from llama_index.core.callbacks.schema import CBEventType, EventPayload
+    from llama_index.core.schema import QueryBundle
+
+with STARTUP.phase('import application modules', 'import'):
+    from config import CHAT_HISTORY_FILE, STORAGE_DIR, STARTUP_MODE, LEXICAL_WEIGHT, MMR_LAMBDA, EMBEDDING_PRECISION, ATTACHMENT_INDEX_FILE
+    from terminal_log import log_terminal, get_terminal_output
+    from glossaryCreation import extract_keywords, explain_keyword, format_glossary
+    from attachment_index import AttachmentIndex
+    from document_table import DocumentTable, DEFAULT_PAGE_SIZE
+    from db_utils import VectorDBManager, get_or_create_index, get_lexical_index, open_chroma_client
+    from retrieval import HybridRetriever, MMRPostprocessor, MMR_CANDIDATE_FACTOR
+    from library_index import LibraryIndex
+    from viz_session import VisualizationSessions, VIZ_CHANNELS, normalize_columns
+    from knn_graph import KNN_K
+    from clustering import ClusteringCache, MAX_CLUSTERS
+    from node_details import NodeDetailsCache
+    from llm_pool import LLMPool
+    from scheduler import LLMScheduler, AdmissionRejected, INTERACTIVE, BATCH, request_priority
+    from metrics import span, render_prometheus, LLM_TOKENS, LLM_CALLS, RETRIEVED_NODES, HTTP_IN_FLIGHT, CHAT_COALESCED
+    from singleflight import SingleFlight
+    from model_catalog import ModelCatalog
 
 
 
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
+
+# Chat events go to the connections waiting for that chat, never to every client;
+# tabs that opt in to observing receive every chat's events as well
+OBSERVER_ROOM = 'observers'
+
+@socketio.on('observe')
+def observe(data=None):
+    """Join (or, with {"enabled": false}, leave) the room that receives every chat's events."""
+    if isinstance(data, dict) and not data.get('enabled', True):
+        leave_room(OBSERVER_ROOM)
+    else:
+        join_room(OBSERVER_ROOM)
 
-# Get the absolute path of the application's root directory
-APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+def chat_room(key):
+    """Room of the connections waiting for chat requests with this key."""
+    return 'chat-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
 
-# Configuration
-CHAT_HISTORY_FILE = os.path.join(APP_ROOT, 'data', 'chat_history', 'chat_history.json')
-STORAGE_DIR = os.path.join(APP_ROOT, 'vector_database')
+def emit_chat_event(event, *args):
+    """Send a chat event to the room of the request being handled and to observers."""
+    rooms = [OBSERVER_ROOM]
+    if g.get('chat_room'):
+        rooms.append(g.chat_room)
+    socketio.emit(event, *args, to=rooms)
+
+# Paths (APP_ROOT, STORAGE_DIR, CHAT_HISTORY_FILE) are defined in config.py
 os.makedirs(STORAGE_DIR, exist_ok=True)
 os.makedirs(os.path.dirname(CHAT_HISTORY_FILE), exist_ok=True)  # Ensure chat history directory exists
 
 # LMStudio settings
-LMSTUDIO_BASE_URL = "http://localhost:1234/v1"
+LMSTUDIO_BASE_URL = os.environ.get('LMSTUDIO_BASE_URL', "http://localhost:1234/v1")
 DEFAULT_MODEL = "meta-llama-3.1-8b-instruct"
+LLM_TIMEOUT = 400  # seconds
+# Admission control: concurrent generations LMStudio is given, and calls allowed to wait
+LMSTUDIO_MAX_IN_FLIGHT = int(os.environ.get('LMSTUDIO_MAX_IN_FLIGHT', 1))
+LMSTUDIO_MAX_QUEUE = int(os.environ.get('LMSTUDIO_MAX_QUEUE', 16))
 
-# Global variable to store available models
+# Models reported by LMStudio, kept current in the background by model_catalog
 AVAILABLE_MODELS = [DEFAULT_MODEL]
+MODEL_CATALOG_TTL = float(os.environ.get('MODEL_CATALOG_TTL', 60))
+model_catalog = ModelCatalog(LMSTUDIO_BASE_URL, AVAILABLE_MODELS, ttl=MODEL_CATALOG_TTL)
+model_catalog.start()
+
+# PDF attachment of each citekey, resolved in the background so requests never list Zotero folders
+ATTACHMENT_INDEX_TTL = float(os.environ.get('ATTACHMENT_INDEX_TTL', 300))
+attachment_index = AttachmentIndex(ATTACHMENT_INDEX_FILE, ttl=ATTACHMENT_INDEX_TTL)
+attachment_index.start()
+
+# The embedding model is loaded by startup.ensure_embed_model (see SEMANTICYARN_STARTUP)
 
+chat_history_lock = threading.Lock()
 
+class LLMUsageHandler(BaseCallbackHandler):
+    """Callback handler that feeds LMStudio token usage into the metrics registry."""
 
-# Initialize OptimumEmbedding
-onnx_model_path = "./bge_onnx"
-if not os.path.exists(onnx_model_path):
-    OptimumEmbedding.create_and_save_optimum_model("BAAI/bge-small-en-v1.5", onnx_model_path)
-Settings.embed_model = OptimumEmbedding(folder_name=onnx_model_path)
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
 
-# Terminal output buffer
-terminal_output_buffer = []
+    def on_event_start(self, event_type, payload=None, event_id="", parent_id="", **kwargs):
+        return event_id
 
-def create_llm(model_name: str) -> LMStudio:
+    def on_event_end(self, event_type, payload=None, event_id="", **kwargs):
+        if event_type != CBEventType.LLM or not payload:
+            return
+        response = payload.get(EventPayload.RESPONSE) or payload.get(EventPayload.COMPLETION)
+        raw = getattr(response, 'raw', None)
+        if not isinstance(raw, dict):
+            return
+        model_name = raw.get('model', 'unknown')
+        LLM_CALLS.inc(model=model_name)
+        usage = raw.get('usage')
+        if isinstance(usage, dict):
+            LLM_TOKENS.inc(usage.get('prompt_tokens', 0) or 0, model=model_name, kind='prompt')
+            LLM_TOKENS.inc(usage.get('completion_tokens', 0) or 0, model=model_name, kind='completion')
+
+    def start_trace(self, trace_id=None):
+        pass
+
+    def end_trace(self, trace_id=None, trace_map=None):
+        pass
+
+# Indexes inherit this callback manager, and query engines hand it to the LLM they use
+Settings.callback_manager = CallbackManager([LLMUsageHandler()])
+
+# Every LLM call goes through this scheduler before reaching LMStudio
+llm_scheduler = LLMScheduler(max_in_flight=LMSTUDIO_MAX_IN_FLIGHT, max_queue=LMSTUDIO_MAX_QUEUE)
+
+# Identical /chat requests in flight at the same time share one computation
+chat_flights = SingleFlight()
+
+def create_llm(model_name: str):
     """Create an LMStudio instance with the specified model name."""
-    return LMStudio(
+    PooledLMStudio = timed_import('lmstudio_client').PooledLMStudio
+    return PooledLMStudio(
+        scheduler=llm_scheduler,
         base_url=LMSTUDIO_BASE_URL,
         model_name=model_name,
-        timeout=400,
+        timeout=LLM_TIMEOUT,
+        request_timeout=LLM_TIMEOUT,
         temperature=0.7,
         top_p=0.9,
         presence_penalty=0.1,
-        frequency_penalty=0.1
+        frequency_penalty=0.1,
+        callback_manager=Settings.callback_manager
     )
 
-def log_terminal(message: str):
-    """Add a message to the terminal output buffer."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    terminal_output_buffer.append(f"[{timestamp}] {message}")
+# LLM clients are shared between requests and never assigned to Settings.llm
+llm_pool = LLMPool(create_llm)
 
-def get_terminal_output() -> List[str]:
-    """Get the current terminal output and clear the buffer."""
-    output = terminal_output_buffer.copy()
-    terminal_output_buffer.clear()
-    return output
+def get_llm(model_name: str):
+    """Return the pooled LMStudio client for a model."""
+    return llm_pool.get(model_name)
 
 def load_chat_history() -> List[Dict[str, Any]]:
     """Load chat history from JSON file."""
@@ -112,6 +198,10 @@ def load_chat_history() -> List[Dict[str, Any]]:
 
 def save_chat_history(question: str, answer: str, citekeys: List[str]):
     """Save a chat entry to the history file."""
+    with chat_history_lock:
+        _save_chat_history(question, answer, citekeys)
+
+def _save_chat_history(question: str, answer: str, citekeys: List[str]):
     try:
         # Ensure directory exists
         os.makedirs(os.path.dirname(CHAT_HISTORY_FILE), exist_ok=True)
@@ -152,6 +242,29 @@ def save_chat_history(question: str, answer: str, citekeys: List[str]):
 
 
 
+def read_channel_dimensions(form, n_dims):
+    """Embedding dimension of each visual channel (see VIZ_CHANNELS) from the form, clamped to n_dims."""
+    dimensions = [
+        int(form.get('x_dimension', 0)),
+        int(form.get('y_dimension', 1)),
+        int(form.get('z_dimension', 2)),
+        int(form.get('w_dimension', 3)),  # Velocity dimension
+        int(form.get('v_dimension', 4)),  # Point size dimension
+        int(form.get('color_dimension', 5)),  # Color dimension
+        int(form.get('undulation_dimension', 6)),  # Undulation dimension
+        int(form.get('amplitude_dimension', 7)),  # Wave amplitude dimension
+        int(form.get('phase_dimension', 8)),  # Wave phase dimension
+        int(form.get('scatter_frequency', 9)),  # Scatter frequency dimension
+        int(form.get('scatter_length', 10)),  # Scatter length dimension
+        int(form.get('scatter_color', 11)),  # Scatter color dimension
+    ]
+    # Ensure all dimensions are valid
+    max_dim = n_dims - 1
+    valid_dimensions = [min(d, max_dim) for d in dimensions]
+    if valid_dimensions != dimensions:
+        print(f"Warning: Some dimensions were out of range. Max dimension is {max_dim}. Using {valid_dimensions}")
+    return valid_dimensions
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     """Render the main page."""
@@ -168,8 +281,10 @@ def index():
 
             print(f"Processing databases: {selected_dbs}")
             
-            # Get embeddings with better error handling
-            embeddings, metadata = db_manager.get_embeddings_and_metadata(selected_dbs)
+            # Embeddings are held at EMBEDDING_PRECISION; only the plotted columns are expanded.
+            # Databases already shown are served from memory, so toggling one reads only that one.
+            embeddings, metadata, stats = db_manager.get_embeddings_and_metadata(
+                selected_dbs, precision=EMBEDDING_PRECISION, with_stats=True)
             
             if embeddings is None or len(embeddings) == 0:
                 error_msg = "No embeddings found in selected databases"
@@ -178,83 +293,35 @@ def index():
                 
             print(f"Successfully retrieved {len(embeddings)} embeddings")
             
-            x_dim = int(request.form.get('x_dimension', 0))
-            y_dim = int(request.form.get('y_dimension', 1))
-            z_dim = int(request.form.get('z_dimension', 2))
-            v_dim = int(request.form.get('w_dimension', 3))  # Velocity dimension
-            p_dim = int(request.form.get('v_dimension', 4))  # Point size dimension
-            c_dim = int(request.form.get('color_dimension', 5))  # Color dimension
-            u_dim = int(request.form.get('undulation_dimension', 6))  # Undulation dimension
-            a_dim = int(request.form.get('amplitude_dimension', 7))  # Wave amplitude dimension
-            ph_dim = int(request.form.get('phase_dimension', 8))  # Wave phase dimension
-            sf_dim = int(request.form.get('scatter_frequency', 9))  # Scatter frequency dimension
-            sl_dim = int(request.form.get('scatter_length', 10))  # Scatter length dimension
-            sc_dim = int(request.form.get('scatter_color', 11))  # Scatter color dimension
             viz_type = request.form.get('viz_type', '3d')
+            dimensions = read_channel_dimensions(request.form, embeddings.shape[1])
+            print(f"Processing request: dims={tuple(dimensions)}, type={viz_type}, dbs={selected_dbs}")
             
-            print(f"Processing request: dims=({x_dim}, {y_dim}, {z_dim}, {v_dim}, {p_dim}, {c_dim}, {u_dim}, {a_dim}, {ph_dim}, {sf_dim}, {sl_dim}, {sc_dim}), type={viz_type}, dbs={selected_dbs}")
-            
-            embeddings, metadata = db_manager.get_embeddings_and_metadata(selected_dbs)
-            if embeddings is None or len(embeddings) == 0:
-                return jsonify({'error': 'No embeddings found in selected databases'}), 400
-            
-            print(f"Retrieved embeddings shape: {embeddings.shape}")
-            print(f"Sample of raw embeddings: {embeddings[:3]}")
+            print(f"Retrieved embeddings shape: {embeddings.shape} ({embeddings.precision}, {embeddings.nbytes} bytes)")
             
-            # Normalize embeddings to [-1, 1] range, handling zero division
-            embeddings_min = embeddings.min(axis=0)
-            embeddings_max = embeddings.max(axis=0)
+            with span('projection'):
+                # The selection is kept in the tab's visualization session, which normalizes
+                # columns to [-1, 1] with the combined per-database min/max and caches them
+                session = viz_sessions.open(request.form.get('session_id'), selected_dbs, embeddings, metadata, stats)
+                embeddings_norm = session.columns(dimensions)
 
-            denominator = embeddings_max - embeddings_min
-            denominator = np.where(denominator == 0, 1e-8, denominator)  # Prevent division by zero
-
-            embeddings_norm = 2 * (embeddings - embeddings_min) / denominator - 1
-
-            print(f"Sample of normalized embeddings: {embeddings_norm[:3]}")
-            
-            # Prepare points data including all required dimensions
-            dimensions = [x_dim, y_dim, z_dim, v_dim, p_dim, c_dim, u_dim, a_dim, ph_dim, sf_dim, sl_dim, sc_dim]
-            print(f"Using dimensions: {dimensions}")
-            
-            # Ensure all dimensions are valid
-            max_dim = embeddings_norm.shape[1] - 1
-            valid_dimensions = [min(d, max_dim) for d in dimensions]
-            if valid_dimensions != dimensions:
-                print(f"Warning: Some dimensions were out of range. Max dimension is {max_dim}. Using {valid_dimensions}")
-                dimensions = valid_dimensions
-            
-            points = embeddings_norm[:, dimensions].tolist()
-            
-            # Generate colors based on database
-            unique_dbs = list(set(m['db_name'] for m in metadata))
-            colors = [f'hsl({h},70%,50%)' for h in np.linspace(0, 360, len(unique_dbs))]
-            color_map = dict(zip(unique_dbs, colors))
-            point_colors = [color_map[m['db_name']] for m in metadata]
+                print(f"Sample of normalized embeddings: {embeddings_norm[:3]}")
+                
+                points = embeddings_norm.tolist()
             
-            # Prepare metadata for tooltips
-            point_metadata = [{
-                'database': m['db_name'],
-                **{k: v for k, v in m.items() if k != 'db_name'}
-            } for m in metadata]
+            # Only node ids and database indexes; texts and metadata are fetched on
+            # hover or click through /api/node
+            databases = list(dict.fromkeys(m['db_name'] for m in metadata))
+            db_positions = {name: i for i, name in enumerate(databases)}
             
             return jsonify({
                 'points': points,
-                'colors': point_colors,
-                'metadata': point_metadata,
-                'dimensions': {
-                    'x': x_dim,
-                    'y': y_dim,
-                    'z': z_dim,
-                    'v': v_dim,  # Velocity
-                    'p': p_dim,  # Point size
-                    'c': c_dim,  # Color
-                    'u': u_dim,  # Undulations
-                    'a': a_dim,  # Wave amplitude
-                    'ph': ph_dim,  # Wave phase
-                    'sf': sf_dim,  # Scatter frequency
-                    'sl': sl_dim,  # Scatter length
-                    'sc': sc_dim  # Scatter color
-                }
+                'databases': databases,
+                'node_ids': [m['node_id'] for m in metadata],
+                'db_index': [db_positions[m['db_name']] for m in metadata],
+                'session': {'id': session.id, 'version': session.version},
+                # Channel -> dimension actually used (out of range dimensions are clamped)
+                'dimensions': dict(zip(VIZ_CHANNELS, dimensions))
             })
             
         except Exception as e:
@@ -262,56 +329,37 @@ def index():
             print(error_msg)
             return jsonify({'error': error_msg}), 500
     
-    documents = []
-    response = requests.get("http://localhost:23119/api/users/0/items?format=bibtex")
-    if response.status_code == 200:
-        bibtex_data = response.content.decode("utf-8")
-        bib_database = bibtexparser.loads(bibtex_data, parser=bibtexparser.bparser.BibTexParser(common_strings=True))
-        for item in bib_database.entries:
-            citekey = item.get("ID")
-            if citekey:
-                # Check if vector database exists
-                storage_path = os.path.join(STORAGE_DIR, f"{citekey}-index.sqlite3")
-                has_vector_db = os.path.exists(storage_path)
-                documents.append({
-                    "citekey": citekey,
-                    "title": item.get("title", "Untitled").replace("{", "").replace("}", ""),
-                    "authors": item.get("author", "").replace("{", "").replace("}", ""),
-                    "year": item.get("year", ""),
-                    "folder_path": "",  # Will be fetched when needed
-                    "has_vector_db": has_vector_db
-                })
-
-    return render_template('index.html', chat_history=chat_history, documents=documents, available_dbs=available_dbs)
-
-# Global variable to store node IDs and scores
-retrieved_nodes_data = []
-
-def get_retrieved_nodes(query_engine, query_str, context="main"):
-    """Retrieves and processes nodes from a query engine."""
+    # The document panel loads its rows from /api/documents
+    return render_template('index.html', chat_history=chat_history, available_dbs=available_dbs)
+
+def get_retrieved_nodes(query_engine, query_str, context="main", retrieved_nodes_data=None):
+    """Retrieves and processes nodes from a query engine, recording them in retrieved_nodes_data."""
     nodes = []
     try:
-        if isinstance(query_engine, RetrieverQueryEngine):
-            nodes = query_engine.retriever.retrieve(query_str)
-        elif isinstance(query_engine, ComposableGraphQueryEngine):
-            all_nodes = []
-            for sub_index in query_engine.index_struct.index_ids:
-                retriever = query_engine.sub_indices[sub_index].as_retriever()
-                retrieved = retriever.retrieve(query_str)
-                all_nodes.extend(retrieved)
-            nodes = all_nodes
-        else:
-            print(f"Unsupported query engine type: {type(query_engine)}")
-            return []
+        with span('retrieval'):
+            if isinstance(query_engine, RetrieverQueryEngine):
+                # Includes node post-processing (MMR), so these are the nodes the LLM sees
+                nodes = query_engine.retrieve(QueryBundle(query_str))
+            elif isinstance(query_engine, ComposableGraphQueryEngine):
+                all_nodes = []
+                for sub_index in query_engine.index_struct.index_ids:
+                    retriever = query_engine.sub_indices[sub_index].as_retriever()
+                    retrieved = retriever.retrieve(query_str)
+                    all_nodes.extend(retrieved)
+                nodes = all_nodes
+            else:
+                print(f"Unsupported query engine type: {type(query_engine)}")
+                return []
         
         # Add detailed logging
         node_ids = [node.node.node_id for node in nodes]
+        RETRIEVED_NODES.inc(len(node_ids), context=context)
         print(f"\nRetrieved nodes for context '{context}':")
         print(f"Number of nodes: {len(node_ids)}")
         print(f"Node IDs: {node_ids}")
         
         # Emit socket event when nodes are retrieved
-        socketio.emit('nodes_retrieved', {
+        emit_chat_event('nodes_retrieved', {
             'context': context,
             'node_ids': node_ids
         })
@@ -324,7 +372,8 @@ def get_retrieved_nodes(query_engine, query_str, context="main"):
             "timestamp": datetime.now().isoformat()
         }
         
-        retrieved_nodes_data.append(node_data)
+        if retrieved_nodes_data is not None:
+            retrieved_nodes_data.append(node_data)
         #print(f"Added node data to retrieved_nodes_data: {node_data}\n")
         return nodes
         
@@ -332,10 +381,147 @@ def get_retrieved_nodes(query_engine, query_str, context="main"):
         print(f"Error retrieving nodes: {str(e)}")
         return []
 
+def create_query_engine(indexed, llm, response_mode, similarity_top_k=9):
+    """Query engine over (citekey, index) pairs.
+
+    With a lexical weight (SEMANTICYARN_LEXICAL_WEIGHT) above 0, retrieval fuses
+    vector and BM25 results across all documents (see retrieval.py). With MMR
+    (SEMANTICYARN_MMR_LAMBDA below 1), more candidates are retrieved and a diverse
+    similarity_top_k of them is kept. With neither, a single index is queried
+    directly and several are combined in a ComposableGraph.
+    """
+    use_mmr = MMR_LAMBDA < 1
+    if LEXICAL_WEIGHT > 0 or use_mmr:
+        sources = []
+        for citekey, index in indexed:
+            lexical_index = None
+            if LEXICAL_WEIGHT > 0:
+                try:
+                    lexical_index = get_lexical_index(citekey)
+                except Exception as e:
+                    print(f"Error loading lexical index for {citekey}, using vector search only: {str(e)}")
+            sources.append((index, lexical_index))
+        retriever = HybridRetriever(
+            sources,
+            similarity_top_k=similarity_top_k * MMR_CANDIDATE_FACTOR if use_mmr else similarity_top_k,
+            lexical_weight=LEXICAL_WEIGHT,
+            attach_embeddings=use_mmr,
+        )
+        postprocessors = [MMRPostprocessor(top_k=similarity_top_k, lambda_mult=MMR_LAMBDA)] if use_mmr else []
+        print(f"Using hybrid retrieval over {len(sources)} documents "
+              f"(lexical weight {LEXICAL_WEIGHT}, MMR lambda {MMR_LAMBDA})")
+        return RetrieverQueryEngine.from_args(
+            retriever, llm=llm, response_mode=response_mode, node_postprocessors=postprocessors, verbose=False)
+
+    indexes = [index for _, index in indexed]
+    # If only one document is selected, use its index directly
+    if len(indexes) == 1:
+        print("Using single index directly (bypassing ComposableGraph)")
+        return indexes[0].as_query_engine(
+            llm=llm,
+            response_mode=response_mode,
+            verbose=False,
+            similarity_top_k=similarity_top_k
+        )
+
+    # If multiple documents, use ComposableGraph
+    print("Creating ComposableGraph for multiple documents...")
+    index_summaries = [f"Document {i+1}" for i in range(len(indexes))]
+
+    # Fix: Use VectorStoreIndex as the first parameter, not a string
+    # This matches your original implementation in AISummary_citekeyQuestion.py
+    graph = ComposableGraph.from_indices(
+        VectorStoreIndex,  # Use proper class instead of string "root"
+        indexes,
+        index_summaries=index_summaries
+    )
+    print("Graph created successfully")
+
+    # Create query engine from graph
+    return graph.as_query_engine(
+        llm=llm,
+        response_mode=response_mode,
+        verbose=False,
+        similarity_top_k=similarity_top_k
+    )
+
 @app.route('/chat', methods=['POST'])
 def chat():
-    global retrieved_nodes_data
-    retrieved_nodes_data = []  # Clear previous data
+    """Answer a chat or glossary request, tracking it as an in-flight request.
+
+    Identical requests that arrive while one is running attach to it and receive
+    the same response, so LMStudio generates the answer only once.
+    """
+    data = request.get_json(silent=True) or {}
+    key = chat_request_key(data)
+    # Duplicates share the computation, so their connections share its room
+    g.chat_room = chat_room(key)
+    socket_id = data.get('socket_id')
+    # Joining with an unknown sid raises only after creating the (then empty) room
+    if socket_id and not (isinstance(socket_id, str) and socketio.server.manager.is_connected(socket_id, '/')):
+        print(f"Chat request from unknown socket {socket_id}; events go to observers only")
+        socket_id = None
+    if socket_id:
+        try:
+            join_room(g.chat_room, sid=socket_id, namespace='/')
+        except (KeyError, ValueError):
+            print(f"Chat request from unknown socket {socket_id}; events go to observers only")
+            socket_id = None
+    HTTP_IN_FLIGHT.inc(endpoint='chat')
+    try:
+        (body, status, headers), shared = chat_flights.do(key, lambda: _run_chat(data))
+        if shared:
+            CHAT_COALESCED.inc(mode='glossary' if (data.get('glossary_mode') or 0) > 0 else 'chat')
+            print(f"Coalesced duplicate chat request: {data.get('question')}")
+        return Response(body, status=status, headers=headers, mimetype='application/json')
+    finally:
+        HTTP_IN_FLIGHT.dec(endpoint='chat')
+        if socket_id:
+            try:
+                leave_room(g.chat_room, sid=socket_id, namespace='/')
+            except (KeyError, ValueError):
+                pass  # Disconnected while waiting
+
+def chat_request_key(data):
+    """Key identifying chat requests that produce the same answer."""
+    return json.dumps([
+        data.get('question'),
+        data.get('citekeys', []),
+        data.get('model_name', 'llama2'),
+        data.get('word_count', 300),
+        data.get('use_refine', False),
+        data.get('glossary_mode', 0),
+    ], sort_keys=True, default=str)
+
+def _run_chat(data):
+    """Run one chat request; returns (body, status, headers) so duplicates can share it."""
+    # Interactive chat is served before glossary batch work
+    priority = BATCH if (data.get('glossary_mode') or 0) > 0 else INTERACTIVE
+    deadline = time.monotonic() + LLM_TIMEOUT
+
+    try:
+        llm_scheduler.check_admission(priority, deadline)
+        with span('chat_request'), request_priority(priority, deadline) as state:
+            result = _handle_chat()
+        # LLM helpers swallow exceptions, so check whether a call was turned away
+        if state['rejection'] is not None:
+            emit_chat_event('chat_response_complete')
+            result = admission_rejected_response(state['rejection'])
+    except AdmissionRejected as e:
+        result = admission_rejected_response(e)
+    headers = {k: v for k, v in result.headers.items() if k == 'Retry-After'}
+    return result.get_data(), result.status_code, headers
+
+def admission_rejected_response(error: AdmissionRejected):
+    """Build the 429/503 response for a request turned away by the LLM scheduler."""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = error.status_code
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def _handle_chat():
+    retrieved_nodes_data = []  # Node IDs and scores retrieved for this request
     
     print("Chat route called")
     try:
@@ -377,28 +563,24 @@ def chat():
                     
                     for citekey in citekeys:
                         print(f"Processing citekey: {citekey}")
-                        doc_details = fetch_document_details(citekey)
-                        if not doc_details or citekey not in doc_details:
+                        with span('zotero_fetch'):
+                            metadata = attachment_index.get(citekey)
+                        if not metadata:
                             print(f"Could not fetch details for citekey: {citekey}")
                             continue
                             
-                        metadata = doc_details[citekey]
-                        folder_path = metadata.get('folder_path')
-                        if not folder_path:
-                            print(f"No folder path found for citekey: {citekey}")
-                            continue
-                            
-                        pdf_files = [f for f in os.listdir(folder_path) if f.endswith('.pdf')]
-                        if not pdf_files:
-                            print(f"No PDF files found in folder: {folder_path}")
+                        file_path = metadata['pdf_path']
+                        if not file_path:
+                            print(f"No PDF files found in folder: {metadata['folder_path']}")
                             continue
                             
-                        file_path = os.path.join(folder_path, pdf_files[0])
                         print(f"Found PDF file: {file_path}")
                         
                         # Create or get index
                         try:
-                            index = get_or_create_index(citekey, file_path, 'pdf', model_name)
+                            with span('index_load'):
+                                index = run_blocking(get_or_create_index, citekey, file_path, 'pdf', model_name,
+                                                     metadata.get('sha256'))
                             print(f"Successfully got/created index for {citekey}")
                         except Exception as e:
                             print(f"Error creating/getting index for {citekey}: {str(e)}")
@@ -407,14 +589,13 @@ def chat():
                         # Create query engine
                         try:
                             # Configure LLM for glossary mode
-                            llm = create_llm(model_name)
-                            Settings.llm = llm
+                            llm = get_llm(model_name)
                             print(f"Using model for glossary: {model_name}")
                             
-                            glossary_query_engine = index.as_query_engine(
-                                response_mode="refine",
-                                verbose=False,
-                                similarity_top_k=9  # Add topk setting
+                            glossary_query_engine = create_query_engine(
+                                [(citekey, index)],
+                                llm=llm,
+                                response_mode="refine"
                             )
                             print(f"Created query engine for {citekey}")
                             print(f"Query engine type: {type(glossary_query_engine)}")
@@ -426,14 +607,15 @@ def chat():
                         try:
                             num_keywords = glossary_mode  # Extract num_keywords from glossary_mode
                             keyword_prompt = f"Extract {num_keywords} technical keywords from the document"
-                            get_retrieved_nodes(glossary_query_engine, keyword_prompt, "keyword_extraction")
-                            keywords = extract_keywords(glossary_query_engine, num_keywords=num_keywords, metadata=metadata)
+                            get_retrieved_nodes(glossary_query_engine, keyword_prompt, "keyword_extraction", retrieved_nodes_data)
+                            with span('llm_synthesis'):
+                                keywords = extract_keywords(glossary_query_engine, num_keywords=num_keywords, metadata=metadata)
                             print(f"Extracted keywords for {citekey}: {keywords}")
                             all_keywords.extend(keywords)
                         except Exception as e:
                             print(f"Error extracting keywords for {citekey}: {str(e)}")
                             # Emit socket event when response is complete
-                            socketio.emit('chat_response_complete')
+                            emit_chat_event('chat_response_complete')
                             continue
                     
                     if not all_keywords:
@@ -446,8 +628,9 @@ def chat():
                         for keyword in all_keywords:
                             print(f"Processing keyword: {keyword}")
                             definition_prompt = f"Define and explain the term '{keyword}'"
-                            get_retrieved_nodes(glossary_query_engine, definition_prompt, f"definition_{keyword}")
-                            definition = explain_keyword(glossary_query_engine, keyword, metadata=metadata, number_of_words=word_count)
+                            get_retrieved_nodes(glossary_query_engine, definition_prompt, f"definition_{keyword}", retrieved_nodes_data)
+                            with span('llm_synthesis'):
+                                definition = explain_keyword(glossary_query_engine, keyword, metadata=metadata, number_of_words=word_count)
                             print(f"Got definition type: {type(definition)}")
                             if definition:
                                 # Ensure both keyword and definition are strings
@@ -466,7 +649,7 @@ def chat():
                         print(f"Error generating definitions: {str(e)}")
                         print(f"Error type: {type(e)}")
                         # Emit socket event when response is complete
-                        socketio.emit('chat_response_complete')
+                        emit_chat_event('chat_response_complete')
                         import traceback
                         print(f"Traceback: {traceback.format_exc()}")
                         return jsonify({'error': f'Error generating definitions: {str(e)}'})
@@ -486,15 +669,16 @@ def chat():
                         
                         # Save glossary to chat history
                         try:
-                            save_chat_history(
-                                question=f"Generate glossary {num_keywords} mode keywords",
-                                answer=response,
-                                citekeys=citekeys
-                            )
+                            with span('history_save'):
+                                save_chat_history(
+                                    question=f"Generate glossary {num_keywords} mode keywords",
+                                    answer=response,
+                                    citekeys=citekeys
+                                )
                             
                             print("Successfully saved glossary to chat history")
                             # Emit socket event when response is complete
-                            socketio.emit('chat_response_complete')
+                            emit_chat_event('chat_response_complete')
 
                         except Exception as e:
                             print(f"Error saving glossary to chat history: {str(e)}")
@@ -509,7 +693,7 @@ def chat():
                         print(f"Error type: {type(e)}")
                         import traceback
                         # Emit socket event when response is complete
-                        socketio.emit('chat_response_complete')
+                        emit_chat_event('chat_response_complete')
                         print(f"Traceback: {traceback.format_exc()}")
                         return jsonify({'error': f'Error formatting response: {str(e)}'})
                     
@@ -524,26 +708,22 @@ def chat():
             indexes = []
             for citekey in citekeys:
                 # Get document details and file path
-                item_details = fetch_document_details(citekey)
-                if not item_details or citekey not in item_details:
+                with span('zotero_fetch'):
+                    item_details = attachment_index.get(citekey)
+                if not item_details:
                     log_terminal(f"Could not fetch details for document: {citekey}")
                     continue
                     
-                folder_path = item_details[citekey].get('folder_path')
-                if not folder_path:
-                    log_terminal(f"No folder path found for document: {citekey}")
-                    continue
-                    
-                # Look for PDF files in the folder
-                pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
-                if not pdf_files:
-                    log_terminal(f"No PDF files found in folder: {folder_path}")
+                file_path = item_details['pdf_path']
+                if not file_path:
+                    log_terminal(f"No PDF files found in folder: {item_details['folder_path']}")
                     continue
                     
-                file_path = os.path.join(folder_path, pdf_files[0])
-                index = get_or_create_index(citekey, file_path, 'pdf', model_name)
+                with span('index_load'):
+                    index = run_blocking(get_or_create_index, citekey, file_path, 'pdf', model_name,
+                                         item_details.get('sha256'))
                 if index:
-                    indexes.append(index)
+                    indexes.append((citekey, index))
 
             if not indexes:
                 return jsonify({'error': 'No valid indexes found for selected documents'})
@@ -552,8 +732,7 @@ def chat():
             print(f"Creating query engine for {len(indexes)} documents...")
             try:
                 # Configure LLM explicitly
-                llm = create_llm(model_name)
-                Settings.llm = llm
+                llm = get_llm(model_name)
                 
                 # Set response mode
                 response_mode = "refine" if use_refine else "tree_summarize"
@@ -561,36 +740,8 @@ def chat():
                 print(f"Using model: {model_name}")
                 
                 
-                # If only one document is selected, use its index directly
-                if len(indexes) == 1:
-                    print("Using single index directly (bypassing ComposableGraph)")
-                    query_engine = indexes[0].as_query_engine(
-                        response_mode=response_mode,
-                        verbose=False,
-                        similarity_top_k=9  # Add topk setting
-                    )
-                    print(f"Created query engine for single document, type: {type(query_engine).__name__}")
-                # If multiple documents, use ComposableGraph
-                else:
-                    print("Creating ComposableGraph for multiple documents...")
-                    index_summaries = [f"Document {i+1}" for i in range(len(indexes))]
-                    
-                    # Fix: Use VectorStoreIndex as the first parameter, not a string
-                    # This matches your original implementation in AISummary_citekeyQuestion.py
-                    graph = ComposableGraph.from_indices(
-                        VectorStoreIndex,  # Use proper class instead of string "root"
-                        indexes,
-                        index_summaries=index_summaries
-                    )
-                    print("Graph created successfully")
-                    
-                    # Create query engine from graph
-                    query_engine = graph.as_query_engine(
-                        response_mode=response_mode,
-                        verbose=False,
-                        similarity_top_k=9  # Add topk setting
-                    )
-                    print(f"Created query engine from graph, type: {type(query_engine).__name__}")
+                query_engine = create_query_engine(indexes, llm=llm, response_mode=response_mode)
+                print(f"Created query engine, type: {type(query_engine).__name__}")
                 
                 # Execute query 
                 print(f"Executing query with question: {question}")
@@ -601,9 +752,10 @@ def chat():
                     Reply as an expert in topic. Do not simplify. Use proper terminology and be precise."""
                     
                     # Track node retrieval before query
-                    get_retrieved_nodes(query_engine, formatted_question_with_word_count, "main_query")
+                    get_retrieved_nodes(query_engine, formatted_question_with_word_count, "main_query", retrieved_nodes_data)
                     
-                    response = query_engine.query(formatted_question_with_word_count)
+                    with span('llm_synthesis'):
+                        response = query_engine.query(formatted_question_with_word_count)
                     print(f"Response received, type: {type(response).__name__}")
                     
                     # Convert to string safely
@@ -618,11 +770,12 @@ def chat():
                     print(f"Answer text length: {len(answer_text)}")
                     
                     # Save chat history
-                    save_chat_history(question, answer_text, citekeys)
+                    with span('history_save'):
+                        save_chat_history(question, answer_text, citekeys)
                     print("Chat history saved successfully")
                     
                     # Emit socket event when response is complete
-                    socketio.emit('chat_response_complete')
+                    emit_chat_event('chat_response_complete')
                     
                     return jsonify({
                         'answer': answer_text,
@@ -635,7 +788,7 @@ def chat():
                     import traceback
                     print(f"Traceback: {traceback.format_exc()}")
                     # Emit socket event when response is also failed
-                    socketio.emit('chat_response_complete')
+                    emit_chat_event('chat_response_complete')
                     return jsonify({'error': f'Error executing query: {str(e)}'})
 
             except Exception as e:
@@ -659,26 +812,49 @@ def chat():
         print("=" * 80)
         return jsonify({'error': f'Global error: {str(e)}'})
 
+@app.route('/metrics')
+def metrics():
+    """Expose latency histograms, counters and gauges in Prometheus text format."""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/startup', methods=['GET'])
+def startup_report():
+    """Report how long imports and initialization took, including deferred loading."""
+    return jsonify(STARTUP.as_dict())
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_stats():
+    """Report LMStudio queue depth, in-flight calls and wait time estimates."""
+    stats = llm_scheduler.stats()
+    stats['coalesced_waiting'] = sum(chat_flights.in_flight().values())
+    return jsonify(stats)
+
 @app.route('/api/models', methods=['GET'])
 def get_models():
-    """Returns the list of available models directly from LMStudio API."""
-    try:
-        response = requests.get(f"{LMSTUDIO_BASE_URL}/models", timeout=5)
-        if response.status_code == 200:
-            models_data = response.json()
-            if 'data' in models_data and isinstance(models_data['data'], list):
-                models = [model['id'] for model in models_data['data'] if 'id' in model]
-                if models:
-                    return jsonify({
-                        'models': models,
-                        'default': DEFAULT_MODEL,
-                        'success': True,
-                        'count': len(models)
-                    })
-        
-        return jsonify({'success': False, 'error': 'Failed to fetch models from LMStudio API'}), 500
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    """Returns the cached list of LMStudio models; ?refresh=1 schedules a refresh."""
+    if request.args.get('refresh'):
+        model_catalog.request_refresh()
+    catalog = model_catalog.snapshot()
+    if not catalog['loaded']:
+        return jsonify({
+            'success': False,
+            'error': catalog['health']['error'] or 'Model list not loaded from LMStudio yet',
+            'health': catalog['health'],
+        }), 503
+    return jsonify({
+        'models': catalog['models'],
+        'default': DEFAULT_MODEL,
+        'success': True,
+        'count': len(catalog['models']),
+        'stale': catalog['stale'],
+        'health': catalog['health'],
+    })
+
+@app.route('/api/lmstudio/health', methods=['GET'])
+def lmstudio_health():
+    """Reports the result and latency of the last LMStudio probe."""
+    catalog = model_catalog.snapshot()
+    return jsonify({**catalog['health'], 'models_loaded': catalog['loaded'], 'age_seconds': catalog['age_seconds']})
 
 # Initialize the database manager with proper path resolution
 app_dir = Path(os.path.dirname(os.path.abspath(__file__)))
@@ -686,6 +862,24 @@ print(f"App directory: {app_dir}")
 
 db_manager = VectorDBManager(app_dir)
 
+# All stores in one embedding matrix for library-wide search, loaded on first search
+library_index = LibraryIndex(db_manager.catalog, open_chroma_client, precision=EMBEDDING_PRECISION)
+
+# Zotero library for the document panel, refetched in the background after the TTL
+DOCUMENTS_CACHE_TTL = float(os.environ.get('DOCUMENTS_CACHE_TTL', 300))
+# Selections shown in the 3D view, by browser tab
+viz_sessions = VisualizationSessions()
+# Chunk texts and metadata for the 3D view's tooltips
+node_cache = NodeDetailsCache(db_manager.catalog, open_chroma_client)
+MAX_NODE_BATCH = 256
+# Clusters of the 3D view's selections for coloring points
+clustering_cache = ClusteringCache(db_manager.catalog)
+REPRESENTATIVE_CHARS = 200
+# Chunks per line of the progressive visualization stream
+STREAM_BATCH_POINTS = 2000
+
+document_table = DocumentTable(lambda: db_manager.available_dbs.keys(), ttl=DOCUMENTS_CACHE_TTL)
+
 
 
 @app.route('/db_info')
@@ -694,7 +888,330 @@ def db_info():
     available_dbs = db_manager.get_available_databases()
     return jsonify({'databases': available_dbs})
 
+@app.route('/api/documents')
+def list_documents():
+    """Search, filter and page through the Zotero library.
+
+    Query parameters: q, has_vector_db (true/false), year (2020 or 2018-2021),
+    author, sort (title, year, author), offset, limit; refresh=1 refetches the library.
+    """
+    args = request.args
+    has_vector_db = args.get('has_vector_db')
+    if has_vector_db is not None:
+        has_vector_db = has_vector_db.lower() in ('1', 'true', 'yes')
+    try:
+        if args.get('refresh'):
+            document_table.ensure_loaded(force=True)
+        return jsonify(document_table.query(
+            search=args.get('q', ''),
+            has_vector_db=has_vector_db,
+            year=args.get('year'),
+            author=args.get('author'),
+            sort=args.get('sort', 'title'),
+            offset=args.get('offset', 0, type=int),
+            limit=args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+        ))
+    except Exception as e:
+        print(f"Error listing documents: {str(e)}")
+        return jsonify({'error': f'Could not load the Zotero library: {str(e)}'}), 502
+
+@app.route('/api/viz/stream', methods=['POST'])
+def visualization_stream():
+    """Progressive form of POST /: newline-delimited JSON sent while the databases are read.
+
+    Takes the same form. The lines are {"type": "start"} with the selected
+    databases, the channel dimensions and final_values, one {"type": "points"}
+    per batch of at most STREAM_BATCH_POINTS chunks of one database (points,
+    node_ids, db_index) and {"type": "end"} with the visualization session;
+    {"type": "error"} ends a failed stream. Points are normalized with the stored
+    statistics of the whole selection, so every batch has its final values
+    (final_values true); if a database has no stored statistics yet, all points
+    are sent after the last database is read.
+    """
+    form = request.form
+    selected_dbs = form.getlist('databases[]') or form.getlist('databases')
+    if not selected_dbs:
+        return jsonify({'error': 'No databases selected'}), 400
+    print(f"Streaming databases: {selected_dbs}")
+    stats = db_manager.get_selection_stats(selected_dbs)
+    db_positions = {name: i for i, name in enumerate(selected_dbs)}
+
+    def line(message):
+        return json.dumps(message) + '\n'
+
+    def points_lines(db_name, columns, node_ids):
+        for start in range(0, len(node_ids), STREAM_BATCH_POINTS):
+            yield line({
+                'type': 'points',
+                'points': columns[start:start + STREAM_BATCH_POINTS].tolist(),
+                'node_ids': node_ids[start:start + STREAM_BATCH_POINTS],
+                'db_index': db_positions[db_name],
+            })
+
+    def generate():
+        started = time.perf_counter()
+        entries = []
+        dimensions = None
+        try:
+            for db_name, entry in db_manager.iter_databases(selected_dbs, precision=EMBEDDING_PRECISION):
+                entries.append((db_name, entry))
+                if dimensions is None:
+                    dimensions = read_channel_dimensions(form, entry['embeddings'].shape[1])
+                    yield line({
+                        'type': 'start',
+                        'databases': selected_dbs,
+                        'dimensions': dict(zip(VIZ_CHANNELS, dimensions)),
+                        # Points are final when the selection's statistics were known up front
+                        'final_values': stats is not None,
+                    })
+                if stats is not None:
+                    with span('projection'):
+                        columns = normalize_columns(
+                            entry['embeddings'].dequantize(columns=dimensions), stats, dimensions)
+                    yield from points_lines(db_name, columns, [m['node_id'] for m in entry['metadata']])
+                    print(f"Streamed {len(entry['metadata'])} points of {db_name} after {time.perf_counter() - started:.2f}s")
+
+            embeddings, metadata, combined = db_manager.stack_databases(
+                [entry for _, entry in entries], precision=EMBEDDING_PRECISION, with_stats=True)
+            if embeddings is None or len(embeddings) == 0:
+                yield line({'type': 'error', 'error': 'No embeddings found in selected databases'})
+                return
+            session = viz_sessions.open(form.get('session_id'), selected_dbs, embeddings, metadata, combined)
+            if stats is None:
+                # Statistics were only known once every database was read
+                columns = session.columns(dimensions)
+                offset = 0
+                for db_name, entry in entries:
+                    rows = entry['metadata']
+                    yield from points_lines(db_name, columns[offset:offset + len(rows)], [m['node_id'] for m in rows])
+                    offset += len(rows)
+            yield line({
+                'type': 'end',
+                'session': {'id': session.id, 'version': session.version},
+                'count': len(metadata),
+            })
+        except Exception as e:
+            error_msg = f"Error streaming visualization: {str(e)}"
+            print(error_msg)
+            yield line({'type': 'error', 'error': error_msg})
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/viz/<session_id>/columns')
+def visualization_columns(session_id):
+    """Normalized embedding columns of a visualization session.
+
+    Query parameters: dims (comma separated dimensions) and version (the session
+    version the client holds). The body is little-endian float32, one column after
+    the other, rows in the order of the session's metadata.
+    """
+    session = viz_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown visualization session'}), 404
+    version = session.version
+    if request.args.get('version', version, type=int) != version:
+        return jsonify({'error': 'Visualization session has changed', 'version': version}), 409
+    try:
+        dimensions = [int(d) for d in request.args.get('dims', '').split(',') if d.strip()]
+    except ValueError:
+        return jsonify({'error': 'Invalid dims'}), 400
+    if not dimensions or not all(0 <= d < session.dims for d in dimensions):
+        return jsonify({'error': f'dims must be between 0 and {session.dims - 1}'}), 400
+
+    columns = session.columns(dimensions)
+    return Response(
+        np.ascontiguousarray(columns.T, dtype='<f4').tobytes(),
+        mimetype='application/octet-stream',
+        headers={
+            'X-Viz-Version': str(version),
+            'X-Viz-Rows': str(len(columns)),
+            'X-Viz-Dims': ','.join(map(str, dimensions)),
+        })
+
+@app.route('/api/viz/<session_id>/graph')
+def visualization_graph(session_id):
+    """k-nearest-neighbor edges between the chunks of a visualization session.
+
+    Query parameters: k (neighbors per chunk, 1 to KNN_K) and version. The body is
+    little-endian uint32 (source, target) row pairs followed by one float32
+    cosine similarity per edge; X-Viz-Edges gives the number of edges.
+    """
+    session = viz_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown visualization session'}), 404
+    version = session.version
+    if request.args.get('version', version, type=int) != version:
+        return jsonify({'error': 'Visualization session has changed', 'version': version}), 409
+    k = max(1, min(request.args.get('k', 4, type=int), KNN_K))
+
+    with span('knn_graph'):
+        # Building a missing graph is CPU-bound
+        sources, targets, weights = run_blocking(session.knn_edges, k, db_manager.get_knn_graph)
+    body = np.stack([sources, targets], axis=1).astype('<u4').tobytes() + weights.astype('<f4').tobytes()
+    return Response(body, mimetype='application/octet-stream', headers={
+        'X-Viz-Version': str(version),
+        'X-Viz-Edges': str(len(sources)),
+    })
+
+@app.route('/api/viz/<session_id>/clusters')
+def visualization_clusters(session_id):
+    """Semantic clusters of the chunks of a visualization session.
+
+    Query parameters: k (clusters, 1 to MAX_CLUSTERS) and version. Returns one
+    cluster id per row in the order of the session's metadata, and for every
+    cluster its size and the chunks closest to its centroid.
+    """
+    session = viz_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown visualization session'}), 404
+    version = session.version
+    if request.args.get('version', version, type=int) != version:
+        return jsonify({'error': 'Visualization session has changed', 'version': version}), 409
+    k = max(1, min(request.args.get('k', 8, type=int), MAX_CLUSTERS))
+
+    with span('clustering'):
+        # Fitting and assigning are CPU-bound
+        result = run_blocking(clustering_cache.cluster, session.embeddings, session.metadata, k)
+    representatives = [(session.metadata[i]['db_name'], session.metadata[i]['node_id'])
+                       for cluster in result['clusters'] for i in cluster['representatives']]
+    found = run_blocking(node_cache.get_many, representatives)
+    clusters = []
+    for cluster in result['clusters']:
+        nodes = []
+        for i in cluster['representatives']:
+            key = (session.metadata[i]['db_name'], session.metadata[i]['node_id'])
+            nodes.append({
+                'index': i,
+                'database': key[0],
+                'node_id': key[1],
+                'text': (found.get(key) or {}).get('text', '')[:REPRESENTATIVE_CHARS],
+            })
+        clusters.append({'id': cluster['id'], 'size': cluster['size'], 'representatives': nodes})
+    return jsonify({
+        'version': version,
+        'k': result['k'],
+        'mode': result['mode'],
+        'labels': result['labels'].tolist(),
+        'clusters': clusters,
+    })
+
+@app.route('/api/node/<node_id>')
+def node_detail(node_id):
+    """Text and metadata of one chunk of the 3D view; the database is given as ?db=<citekey>."""
+    database = request.args.get('db')
+    if not database:
+        return jsonify({'error': 'Missing db'}), 400
+    found = run_blocking(node_cache.get_many, [(database, node_id)])
+    if (database, node_id) not in found:
+        return jsonify({'error': 'Unknown node'}), 404
+    return jsonify({'node_id': node_id, 'database': database, **found[(database, node_id)]})
+
+@app.route('/api/node', methods=['POST'])
+def node_details_batch():
+    """Text and metadata of several chunks, read with one Chroma query per database.
+
+    Expects JSON {"nodes": [{"node_id": ..., "database": ...}]} with at most
+    MAX_NODE_BATCH nodes; returns the found nodes and the ids of missing ones.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        wanted = list(dict.fromkeys((n['database'], n['node_id']) for n in data.get('nodes') or []))
+    except (KeyError, TypeError):
+        return jsonify({'error': 'Each node needs node_id and database'}), 400
+    if not wanted:
+        return jsonify({'error': 'No nodes requested'}), 400
+    if len(wanted) > MAX_NODE_BATCH:
+        return jsonify({'error': f'At most {MAX_NODE_BATCH} nodes per request'}), 400
+    found = run_blocking(node_cache.get_many, wanted)
+    return jsonify({
+        'nodes': [{'node_id': node_id, 'database': database, **found[(database, node_id)]}
+                  for database, node_id in wanted if (database, node_id) in found],
+        'missing': [node_id for database, node_id in wanted if (database, node_id) not in found],
+    })
+
+@app.route('/api/search', methods=['POST'])
+def library_search():
+    """Semantic search over every vector database in the library.
+
+    Expects JSON with query, optional top_k (default 20) and optional citekeys to
+    restrict the search; returns the top chunks with citekey and score.
+    """
+    data = request.get_json(silent=True) or {}
+    query = (data.get('query') or '').strip()
+    if not query:
+        return jsonify({'error': 'Missing query'}), 400
+    try:
+        top_k = max(1, min(int(data.get('top_k', 20)), 200))
+        with span('library_search'):
+            # Embedding and scoring are CPU-bound
+            return jsonify(run_blocking(_library_search, query, top_k, data.get('citekeys')))
+    except Exception as e:
+        print(f"Error in library search: {str(e)}")
+        return jsonify({'error': f'Error in library search: {str(e)}'}), 500
+
+def _library_search(query, top_k, citekeys=None):
+    timings = {}
+    start = time.perf_counter()
+    library_index.refresh()
+    timings['refresh'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ensure_embed_model()
+    query_embedding = Settings.embed_model.get_query_embedding(query)
+    timings['embed'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hits = library_index.search(query_embedding, top_k, citekeys)
+    timings['search'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    texts = library_index.fetch_texts(hits)
+    timings['fetch'] = time.perf_counter() - start
+    RETRIEVED_NODES.inc(len(hits), context='library_search')
+
+    results = [{
+        'node_id': node_id,
+        'citekey': citekey,
+        'score': score,
+        'text': (texts.get(node_id) or '')[:500],
+    } for node_id, citekey, score in hits]
+
+    # Documents ranked by their best chunk
+    documents = {}
+    details = document_table.lookup({r['citekey'] for r in results})
+    for r in results:
+        doc = documents.setdefault(r['citekey'], {
+            'citekey': r['citekey'], 'best_score': r['score'], 'hits': 0, **details.get(r['citekey'], {})})
+        doc['hits'] += 1
+
+    return {
+        'query': query,
+        'results': results,
+        'documents': list(documents.values()),
+        'index': library_index.stats(),
+        'timings': timings,
+    }
+
+@app.route('/api/db_stats')
+def db_stats():
+    """Per-database counts, dimensions, size and content hash from the store manifests"""
+    return jsonify(db_manager.get_database_stats())
 
+# Load the embedding model according to SEMANTICYARN_STARTUP (lazy, warm or eager)
+if STARTUP_MODE == 'eager':
+    ensure_embed_model()
+elif STARTUP_MODE == 'warm':
+    start_warmup([
+        ('embedding model', ensure_embed_model),
+        ('chroma', lambda: timed_import('llama_index.vector_stores.chroma')),
+        ('lmstudio client', lambda: timed_import('lmstudio_client')),
+        ('vector database scan', db_manager.get_available_databases),
+        ('library index', library_index.refresh),
+    ])
+    # Fetching the library is network-bound, so it runs on its own (green) thread
+    threading.Thread(target=document_table.ensure_loaded, name='document-table', daemon=True).start()
+STARTUP.mark_ready()
 
 if __name__ == '__main__':
     # Print startup banner only once
@@ -702,5 +1219,7 @@ if __name__ == '__main__':
     print("STARTING SEMANTIC YARN - ZOTERO CHAT")
     print("="*80 + "\n")
     
-    print("\nStarting Flask application on port 5001...")
+    STARTUP.print_summary()
+    # Requests no longer share LLM state, so they can be served on many threads
+    print(f"\nStarting Flask application on port 5001 (async mode: {ASYNC_MODE})...")
     socketio.run(app, debug=True, port=5001)
\ No newline at end of file
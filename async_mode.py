@@ -0,0 +1,70 @@
+"""Serving mode selection for the Socket.IO server.
+
+In the default "threading" mode every /chat request holds an OS thread while it
+waits for LMStudio. With SEMANTICYARN_ASYNC_MODE=eventlet (or gevent) the
+standard library is monkey-patched so requests run on green threads: a request
+waiting on an LMStudio HTTP response yields, and hundreds of in-flight chats
+share a few OS threads. The HTTP contract of /chat and the Socket.IO events are
+the same in every mode.
+
+This module must be imported before Flask, requests or httpx.
+"""
+import os
+
+ASYNC_MODE = os.environ.get('SEMANTICYARN_ASYNC_MODE', 'threading').lower()
+
+if ASYNC_MODE not in ('threading', 'eventlet', 'gevent'):
+    raise ValueError(f"Unsupported SEMANTICYARN_ASYNC_MODE: {ASYNC_MODE}")
+
+_patched = False
+
+
+def monkey_patch():
+    """Patch sockets, locks and sleep for green-thread serving; a no-op in threading mode."""
+    global _patched
+    if _patched or ASYNC_MODE == 'threading':
+        return
+    # httpcore probes for trio at import time, and trio fails to import once select.epoll
+    # has been patched away. Sockets are still looked up at call time, so they end up green.
+    try:
+        import httpcore  # noqa: F401
+    except ImportError:
+        pass
+    if ASYNC_MODE == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif ASYNC_MODE == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    _patched = True
+
+
+def run_blocking(func, *args, **kwargs):
+    """Run CPU-bound work (PDF parsing, embedding) on a real OS thread.
+
+    Green threads only switch on I/O, so long computations would otherwise stall
+    every in-flight request. In threading mode the function is simply called.
+    """
+    if ASYNC_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    if ASYNC_MODE == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+
+def native_lock():
+    """A lock that also works between the OS threads used by run_blocking.
+
+    Patched locks are green-thread primitives and must not be shared with real
+    threads, so return the unpatched implementation in eventlet and gevent modes.
+    """
+    if ASYNC_MODE == 'eventlet':
+        from eventlet import patcher
+        return patcher.original('threading').Lock()
+    if ASYNC_MODE == 'gevent':
+        from gevent import monkey
+        return monkey.get_original('_thread', 'allocate_lock')()
+    import threading
+    return threading.Lock()
@@ -0,0 +1,187 @@
+"""Persistent index of the PDF attachment of every citekey in the Zotero library.
+
+Chat and glossary requests used to fetch the whole BibTeX export from Zotero
+and list the item's storage folder before every answer, which dominates request
+setup when Zotero storage is on a network mount. The index keeps each citekey's
+metadata, PDF path, size, modification time and SHA-256 in memory and in a JSON
+file, and a background thread refreshes it from one library fetch every `ttl`
+seconds. Folders are only listed again when their modification time changed and
+PDFs are only hashed again when their size or modification time changed.
+
+Requests read the index without touching the filesystem; a citekey the index
+has not seen yet (added to Zotero since the last refresh) is resolved once and
+remembered, and so is a citekey without an attachment folder or not in Zotero,
+until the next refresh.
+"""
+import json
+import os
+import threading
+import time
+
+from async_mode import run_blocking
+from fetchDocuments import entry_details, fetch_document_details, fetch_library_entries
+from metrics import ATTACHMENT_INDEX
+from parse_cache import file_hash
+
+ATTACHMENT_INDEX_VERSION = 1
+
+
+def find_pdf(folder_path):
+    """First PDF in the folder by name (case-insensitive extension), or None."""
+    pdf_files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith('.pdf'))
+    return os.path.join(folder_path, pdf_files[0]) if pdf_files else None
+
+
+def resolve_attachment(details, previous=None):
+    """Index entry for an entry_details() dict, reusing what is still valid in `previous`."""
+    entry = dict(details, pdf_path=None, size=None, mtime=None, folder_mtime=None, sha256=None)
+    try:
+        entry['folder_mtime'] = os.stat(details['folder_path']).st_mtime
+        if (previous and previous.get('folder_path') == details['folder_path']
+                and previous.get('folder_mtime') == entry['folder_mtime']):
+            pdf_path = previous.get('pdf_path')
+        else:
+            pdf_path = find_pdf(details['folder_path'])
+        if pdf_path:
+            stat = os.stat(pdf_path)
+            entry.update(pdf_path=pdf_path, size=stat.st_size, mtime=stat.st_mtime)
+    except OSError:
+        return entry
+    if previous and all(previous.get(k) == entry[k] for k in ('pdf_path', 'size', 'mtime')):
+        entry['sha256'] = previous.get('sha256')
+    return entry
+
+
+class AttachmentIndex:
+    """citekey -> {metadata, folder_path, pdf_path, size, mtime, sha256}, refreshed in the background."""
+
+    def __init__(self, path, ttl=300.0, fetch_entries=fetch_library_entries, fetch_details=fetch_document_details):
+        self.path = path
+        self.ttl = ttl
+        self._fetch_entries = fetch_entries
+        self._fetch_details = fetch_details
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._entries = {}
+        # Citekeys without a storage folder or not in Zotero, remembered until the next refresh
+        self._missing = set()
+        self.loaded = False
+        self.updated_at = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != ATTACHMENT_INDEX_VERSION:
+                return
+            self._entries = data['entries']
+            self.updated_at = data.get('updated_at')
+            self.loaded = True
+            print(f"Loaded attachment index with {len(self._entries)} entries")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring attachment index {self.path}: {str(e)}")
+
+    def _save(self):
+        with self._lock:
+            data = {'version': ATTACHMENT_INDEX_VERSION, 'updated_at': self.updated_at, 'entries': self._entries}
+            text = json.dumps(data, ensure_ascii=False)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _resolve_all(details, previous):
+        return {d['citekey']: resolve_attachment(d, previous.get(d['citekey'])) for d in details}
+
+    def _hash_pending(self):
+        """Hash PDFs that are new or changed since they were last hashed."""
+        with self._lock:
+            pending = [(citekey, dict(entry)) for citekey, entry in self._entries.items()
+                       if entry.get('pdf_path') and not entry.get('sha256')]
+        for citekey, entry in pending:
+            try:
+                digest = run_blocking(file_hash, entry['pdf_path'])
+            except OSError as e:
+                print(f"Could not hash {entry['pdf_path']}: {str(e)}")
+                continue
+            with self._lock:
+                current = self._entries.get(citekey)
+                # Skip entries replaced by a refresh or fallback while hashing
+                if current and all(current.get(k) == entry[k] for k in ('pdf_path', 'size', 'mtime')):
+                    current['sha256'] = digest
+        return len(pending)
+
+    def refresh(self):
+        """Fetch the library once, resolve every attachment, persist, then hash changed PDFs."""
+        start = time.perf_counter()
+        details = [d for d in map(entry_details, self._fetch_entries()) if d and d['citekey']]
+        with self._lock:
+            previous = dict(self._entries)
+        entries = run_blocking(self._resolve_all, details, previous)
+        with self._lock:
+            self._entries = entries
+            self._missing = set()
+            self.loaded = True
+            self.updated_at = time.time()
+        run_blocking(self._save)
+        print(f"Resolved {len(entries)} attachments in {time.perf_counter() - start:.2f}s")
+        if self._hash_pending():
+            run_blocking(self._save)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing attachment index: {str(e)}")
+            # Retry sooner while the library has never been fetched
+            self._wake.wait(self.ttl if self.loaded else min(self.ttl, 30.0))
+            self._wake.clear()
+
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='attachment-index', daemon=True)
+                self._thread.start()
+
+    def request_refresh(self):
+        """Ask the background thread to refresh now instead of waiting for the TTL."""
+        self._wake.set()
+
+    def entries(self):
+        """Copies of every index entry, by citekey."""
+        with self._lock:
+            return {citekey: dict(entry) for citekey, entry in self._entries.items()}
+
+    def get(self, citekey):
+        """Index entry of a citekey (pdf_path is None without a PDF), or None if not in Zotero."""
+        with self._lock:
+            entry = self._entries.get(citekey)
+            missing = citekey in self._missing
+        if entry is not None:
+            ATTACHMENT_INDEX.inc(result='hit')
+            return dict(entry)
+        if missing:
+            ATTACHMENT_INDEX.inc(result='missing')
+            return None
+        ATTACHMENT_INDEX.inc(result='miss')
+        # Not seen by a refresh yet: resolve it the slow way once and remember the result
+        doc_details = self._fetch_details(citekey)
+        details = doc_details.get(citekey) if doc_details else None
+        if not details:
+            with self._lock:
+                self._missing.add(citekey)
+            return None
+        entry = run_blocking(resolve_attachment, details)
+        with self._lock:
+            self._entries.setdefault(citekey, entry)
+        return dict(entry)
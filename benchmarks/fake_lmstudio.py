@@ -0,0 +1,197 @@
+"""OpenAI-compatible stand-in for LMStudio, for load testing without a GPU.
+
+Implements GET /v1/models, POST /v1/chat/completions and POST /v1/completions,
+including server-sent-event streaming. Latency is simulated with a configurable
+time-to-first-token and token rate, and at most --max-concurrency generations
+run at once (further requests queue, or get 429 with --reject-when-busy), which
+mirrors one model loaded on one machine.
+
+Usage:
+    python benchmarks/fake_lmstudio.py --port 1234 --ttft 0.3 --tokens-per-second 40
+    LMSTUDIO_BASE_URL=http://localhost:1234/v1 python app.py
+"""
+import json
+import time
+import uuid
+import argparse
+import threading
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+config = {
+    'models': ['meta-llama-3.1-8b-instruct'],
+    'ttft': 0.3,
+    'tokens_per_second': 40.0,
+    'completion_tokens': 64,
+    'max_concurrency': 1,
+    'reject_when_busy': False,
+}
+
+_slots = threading.BoundedSemaphore(config['max_concurrency'])
+_stats_lock = threading.Lock()
+stats = {'requests': 0, 'rejected': 0, 'active': 0, 'max_active': 0, 'queued': 0, 'tokens': 0}
+
+FILLER = ("the proposed method improves retrieval quality by combining dense embeddings "
+          "with sparse lexical signals while keeping latency low on commodity hardware").split()
+TERMS = ["semantic chunking", "vector retrieval", "reciprocal rank fusion", "embedding drift",
+         "latent manifold", "spectral clustering", "query expansion", "cross-encoder reranking"]
+
+
+def _update(**deltas):
+    with _stats_lock:
+        for key, delta in deltas.items():
+            stats[key] += delta
+        stats['max_active'] = max(stats['max_active'], stats['active'])
+
+
+def _prompt_text(payload):
+    if 'messages' in payload:
+        return ' '.join(str(m.get('content', '')) for m in payload['messages'])
+    return str(payload.get('prompt', ''))
+
+
+def _generate_tokens(payload):
+    """Produce deterministic fake output shaped like what the app asks for."""
+    prompt = _prompt_text(payload)
+    n_tokens = int(payload.get('max_tokens') or config['completion_tokens'])
+    if 'semicolon' in prompt.lower():
+        text = '; '.join(TERMS)
+        return [word + ' ' for word in text.split(' ')]
+    return [FILLER[i % len(FILLER)] + ' ' for i in range(max(1, n_tokens))]
+
+
+def _acquire_slot():
+    if config['reject_when_busy']:
+        return _slots.acquire(blocking=False)
+    _update(queued=1)
+    _slots.acquire()
+    _update(queued=-1)
+    return True
+
+
+def _chunk(model, content, chat, finish_reason=None):
+    choice = {'index': 0, 'finish_reason': finish_reason}
+    if chat:
+        choice['delta'] = {'role': 'assistant', 'content': content} if content is not None else {}
+    else:
+        choice['text'] = content or ''
+    return {
+        'id': f"cmpl-{uuid.uuid4().hex[:12]}",
+        'object': 'chat.completion.chunk' if chat else 'text_completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [choice],
+    }
+
+
+def _complete(chat):
+    payload = request.get_json(force=True) or {}
+    model = payload.get('model', config['models'][0])
+    _update(requests=1)
+
+    if not _acquire_slot():
+        _update(rejected=1)
+        return jsonify({'error': {'message': 'Model is busy', 'type': 'rate_limit'}}), 429
+
+    tokens = _generate_tokens(payload)
+    prompt_tokens = len(_prompt_text(payload).split())
+    delay = 1.0 / config['tokens_per_second'] if config['tokens_per_second'] > 0 else 0.0
+
+    if payload.get('stream'):
+        def stream():
+            _update(active=1)
+            try:
+                time.sleep(config['ttft'])
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(delay)
+                    yield f"data: {json.dumps(_chunk(model, token, chat))}\n\n"
+                yield f"data: {json.dumps(_chunk(model, None, chat, finish_reason='stop'))}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                _update(active=-1, tokens=len(tokens))
+                _slots.release()
+        return Response(stream(), mimetype='text/event-stream')
+
+    _update(active=1)
+    try:
+        time.sleep(config['ttft'] + delay * (len(tokens) - 1))
+    finally:
+        _update(active=-1, tokens=len(tokens))
+        _slots.release()
+
+    text = ''.join(tokens).strip()
+    choice = {'index': 0, 'finish_reason': 'stop'}
+    if chat:
+        choice['message'] = {'role': 'assistant', 'content': text}
+    else:
+        choice['text'] = text
+    return jsonify({
+        'id': f"cmpl-{uuid.uuid4().hex[:12]}",
+        'object': 'chat.completion' if chat else 'text_completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [choice],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(tokens),
+            'total_tokens': prompt_tokens + len(tokens),
+        },
+    })
+
+
+@app.route('/v1/models', methods=['GET'])
+def models():
+    return jsonify({'object': 'list', 'data': [
+        {'id': name, 'object': 'model', 'owned_by': 'fake-lmstudio'} for name in config['models']
+    ]})
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    return _complete(chat=True)
+
+
+@app.route('/v1/completions', methods=['POST'])
+def completions():
+    return _complete(chat=False)
+
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    with _stats_lock:
+        return jsonify(dict(stats))
+
+
+def configure(**overrides):
+    """Update the simulation parameters; used by the CLI and by tests of the load driver."""
+    global _slots
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    _slots = threading.BoundedSemaphore(config['max_concurrency'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible LMStudio server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1234)
+    parser.add_argument('--models', nargs='+', help="model ids reported by /v1/models")
+    parser.add_argument('--ttft', type=float, help="time to first token in seconds")
+    parser.add_argument('--tokens-per-second', type=float, help="generation speed after the first token")
+    parser.add_argument('--completion-tokens', type=int, help="tokens per answer when max_tokens is not set")
+    parser.add_argument('--max-concurrency', type=int, help="generations served at the same time")
+    parser.add_argument('--reject-when-busy', action='store_true', default=None,
+                        help="answer 429 instead of queueing when all slots are busy")
+    args = parser.parse_args()
+
+    configure(
+        models=args.models,
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        max_concurrency=args.max_concurrency,
+        reject_when_busy=args.reject_when_busy,
+    )
+    print(f"Fake LMStudio on http://{args.host}:{args.port}/v1 with {config}")
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,109 @@
+"""Local stand-in for the Zotero (Better BibTeX) API.
+
+Serves /api/users/0/items?format=bibtex with one entry per citekey and creates a
+matching Zotero-style storage folder with a PDF attachment for each entry, so
+that fetch_document_details and the /chat PDF lookup work without Zotero.
+
+By default the citekeys are taken from the vector stores in --vector-dir, which
+lets /chat load the existing (e.g. synthetic) stores without parsing any PDF.
+
+Usage:
+    python benchmarks/fake_zotero.py --vector-dir /tmp/stores --zotero-storage /tmp/zotero
+    ZOTERO_API_URL=http://localhost:23119/api/users/0/items?format=bibtex \\
+    ZOTERO_STORAGE_DIR=/tmp/zotero SEMANTICYARN_STORAGE_DIR=/tmp/stores python app.py
+"""
+import os
+import shutil
+import argparse
+
+from flask import Flask, Response
+
+app = Flask(__name__)
+
+entries = []
+
+# Smallest well-formed PDF: one empty page
+MINIMAL_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def citekeys_from_vector_dir(vector_dir):
+    return sorted(
+        name[:-len('-index.sqlite3')]
+        for name in os.listdir(vector_dir)
+        if name.endswith('-index.sqlite3')
+    )
+
+
+def build_library(citekeys, zotero_storage, source_pdf=None):
+    """Create storage folders and return BibTeX-ready entry dictionaries."""
+    library = []
+    for i, citekey in enumerate(citekeys):
+        item_id = f"FAKE{i:06d}"
+        folder = os.path.join(zotero_storage, item_id)
+        os.makedirs(folder, exist_ok=True)
+        pdf_path = os.path.join(folder, f"{citekey}.pdf")
+        if not os.path.exists(pdf_path):
+            if source_pdf:
+                shutil.copyfile(source_pdf, pdf_path)
+            else:
+                with open(pdf_path, 'wb') as f:
+                    f.write(MINIMAL_PDF)
+        library.append({
+            'citekey': citekey,
+            'title': f"Synthetic Paper {i}: A Study of {citekey}",
+            'author': f"Author, Ada and Writer, Bob{i % 7}",
+            'year': str(2000 + i % 25),
+            'keywords': 'synthetic, benchmark',
+            # fetchDocuments.extract_folder looks for /Zotero/storage/<item_id>/
+            'file': f"/fake/Zotero/storage/{item_id}/{citekey}.pdf",
+        })
+    return library
+
+
+def to_bibtex(library):
+    records = []
+    for entry in library:
+        records.append(
+            f"@article{{{entry['citekey']},\n"
+            f"  title = {{{entry['title']}}},\n"
+            f"  author = {{{entry['author']}}},\n"
+            f"  year = {{{entry['year']}}},\n"
+            f"  keywords = {{{entry['keywords']}}},\n"
+            f"  file = {{{entry['file']}}}\n"
+            f"}}\n"
+        )
+    return '\n'.join(records)
+
+
+@app.route('/api/users/0/items', methods=['GET'])
+def items():
+    return Response(to_bibtex(entries), mimetype='application/x-bibtex')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake Zotero BibTeX API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=23119)
+    parser.add_argument('--vector-dir', help="take citekeys from the stores in this directory")
+    parser.add_argument('--citekeys', nargs='+', help="explicit citekeys to serve")
+    parser.add_argument('--count', type=int, default=0,
+                        help="number of generated citekeys when neither --vector-dir nor --citekeys is given")
+    parser.add_argument('--zotero-storage', required=True, help="directory to create attachment folders in")
+    parser.add_argument('--source-pdf', help="copy this PDF as every attachment instead of an empty one")
+    args = parser.parse_args()
+
+    if args.citekeys:
+        keys = args.citekeys
+    elif args.vector_dir:
+        keys = citekeys_from_vector_dir(args.vector_dir)
+    else:
+        keys = [f"synthetic{i:05d}" for i in range(args.count)]
+
+    entries.extend(build_library(keys, args.zotero_storage, args.source_pdf))
+    print(f"Fake Zotero serving {len(entries)} items on http://{args.host}:{args.port}/api/users/0/items")
+    app.run(host=args.host, port=args.port, threaded=True)
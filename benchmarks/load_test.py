@@ -0,0 +1,165 @@
+"""Concurrent load driver for the /chat endpoint.
+
+Fires a mix of chat and glossary requests at a running app and reports latency
+percentiles and throughput. Intended to run against fake_lmstudio.py and
+fake_zotero.py so that it works on machines without a GPU.
+
+Usage:
+    python benchmarks/load_test.py --app-url http://localhost:5001 \\
+        --citekeys synthetic00000 synthetic00001 --requests 200 --concurrency 16 --glossary-ratio 0.2
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+QUESTIONS = [
+    "What is the main contribution of this work?",
+    "Which evaluation metrics are used?",
+    "How does the method compare to the baseline?",
+    "What are the limitations discussed by the authors?",
+    "Describe the dataset used in the experiments.",
+]
+
+_local = threading.local()
+
+
+def _session():
+    # One keep-alive connection per worker thread
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def build_request(rng, args):
+    glossary = rng.random() < args.glossary_ratio
+    if glossary:
+        return 'glossary', {
+            'question': 'Generate glossary',
+            'citekeys': [rng.choice(args.citekeys)],
+            'model_name': args.model,
+            'word_count': args.word_count,
+            'use_refine': False,
+            'glossary_mode': args.glossary_terms,
+        }
+    n_docs = rng.randint(1, min(args.max_docs, len(args.citekeys)))
+    return 'chat', {
+        'question': rng.choice(QUESTIONS),
+        'citekeys': rng.sample(args.citekeys, n_docs),
+        'model_name': args.model,
+        'word_count': args.word_count,
+        'use_refine': args.use_refine,
+        'glossary_mode': 0,
+    }
+
+
+def send(url, kind, payload, timeout):
+    start = time.perf_counter()
+    try:
+        response = _session().post(url, json=payload, timeout=timeout)
+        elapsed = time.perf_counter() - start
+        ok = response.status_code == 200
+        error = None
+        if ok:
+            body = response.json()
+            if body.get('error'):
+                ok, error = False, body['error']
+        else:
+            error = f"HTTP {response.status_code}"
+        return {'kind': kind, 'latency': elapsed, 'ok': ok, 'error': error, 'status': response.status_code}
+    except requests.RequestException as e:
+        return {'kind': kind, 'latency': time.perf_counter() - start, 'ok': False, 'error': str(e), 'status': None}
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None}
+    values = np.array(latencies)
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'mean': float(values.mean()),
+    }
+
+
+def report(results, wall_time):
+    summary = {'wall_time': wall_time, 'requests': len(results),
+               'requests_per_second': len(results) / wall_time if wall_time else 0.0, 'by_kind': {}}
+    for kind in ('all', 'chat', 'glossary'):
+        subset = [r for r in results if kind == 'all' or r['kind'] == kind]
+        if not subset:
+            continue
+        ok = [r['latency'] for r in subset if r['ok']]
+        errors = {}
+        for r in subset:
+            if not r['ok']:
+                errors[r['error']] = errors.get(r['error'], 0) + 1
+        summary['by_kind'][kind] = {
+            'count': len(subset),
+            'succeeded': len(ok),
+            'failed': len(subset) - len(ok),
+            'latency': percentiles(ok),
+            'errors': errors,
+        }
+    return summary
+
+
+def print_report(summary):
+    print(f"\n{summary['requests']} requests in {summary['wall_time']:.2f}s "
+          f"({summary['requests_per_second']:.2f} req/s)")
+    print(f"{'kind':10} {'ok':>6} {'failed':>7} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9}")
+    for kind, stats in summary['by_kind'].items():
+        lat = stats['latency']
+        fmt = lambda v: f"{v:9.3f}" if v is not None else f"{'-':>9}"
+        print(f"{kind:10} {stats['succeeded']:>6} {stats['failed']:>7} "
+              f"{fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])}")
+        for error, count in list(stats['errors'].items())[:5]:
+            print(f"    {count} x {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /chat endpoint")
+    parser.add_argument('--app-url', default='http://localhost:5001')
+    parser.add_argument('--citekeys', nargs='+', help="citekeys with vector databases (default: /db_info)")
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--glossary-ratio', type=float, default=0.2, help="fraction of glossary requests")
+    parser.add_argument('--glossary-terms', type=int, default=2)
+    parser.add_argument('--max-docs', type=int, default=2, help="maximum documents per chat request")
+    parser.add_argument('--model', default='meta-llama-3.1-8b-instruct')
+    parser.add_argument('--word-count', type=int, default=100)
+    parser.add_argument('--use-refine', action='store_true')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    if not args.citekeys:
+        args.citekeys = requests.get(f"{args.app_url}/db_info", timeout=30).json()['databases']
+    if not args.citekeys:
+        parser.error("No citekeys given and the app reports no databases")
+
+    rng = random.Random(args.seed)
+    planned = [build_request(rng, args) for _ in range(args.requests)]
+    url = f"{args.app_url}/chat"
+
+    print(f"Sending {args.requests} requests with concurrency {args.concurrency} to {url}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda item: send(url, item[0], item[1], args.timeout), planned))
+    summary = report(results, time.perf_counter() - start)
+
+    print_report(summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Reproducible offline benchmark suite.
+
+Generates a synthetic library of Chroma stores, points the application at it and
+times the hot paths of the server. No network access is needed: retrieval uses a
+precomputed query embedding, and no LMStudio or Zotero calls are made. app.py
+loads the embedding model lazily, so importing it costs no model load; the ONNX
+model (./bge_onnx) is only needed by the index-loading benchmarks, unless
+Settings.embed_model is configured beforehand.
+
+Usage:
+    python benchmarks/run_benchmarks.py --docs 20 --chunks 300
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<old>.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+sys.path.insert(0, APP_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_stores import generate_library
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def summarize(durations):
+    values = np.array(durations, dtype=np.float64)
+    return {
+        'runs': len(durations),
+        'min': float(values.min()),
+        'median': float(np.median(values)),
+        'mean': float(values.mean()),
+        'p95': float(np.percentile(values, 95)),
+        'max': float(values.max()),
+    }
+
+
+def measure(func, repeat, setup=None):
+    """Call func repeat times and return the wall-clock duration of each call."""
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def clear_chroma_cache():
+    """Drop Chroma's cached clients so the next load starts cold."""
+    from chromadb.api.client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()
+
+
+def run_suite(args, storage_dir, citekeys):
+    # The app reads its storage location at import time
+    os.environ['SEMANTICYARN_STORAGE_DIR'] = storage_dir
+    os.chdir(APP_ROOT)
+    import app as app_module
+    from llama_index.core import QueryBundle
+    from db_utils import get_or_create_index
+
+    manager = app_module.db_manager
+    client = app_module.app.test_client()
+    rng = np.random.default_rng(args.seed)
+    results = {}
+
+    print("Timing VectorDBManager._scan_for_dbs")
+    results['scan_for_dbs'] = summarize(measure(manager._scan_for_dbs, args.repeat))
+
+    def clear_embedding_cache():
+        """Read the stores from disk again, as before the in-memory embedding cache."""
+        manager._embedding_cache.clear()
+        clear_chroma_cache()
+
+    # Cold runs keep the names of earlier results so they stay comparable
+    print("Timing get_embeddings_and_metadata (cold and warm)")
+    results['get_embeddings_and_metadata'] = summarize(measure(
+        lambda: manager.get_embeddings_and_metadata(citekeys), args.repeat, setup=clear_embedding_cache))
+    results['get_embeddings_and_metadata_warm'] = summarize(
+        measure(lambda: manager.get_embeddings_and_metadata(citekeys), args.repeat))
+
+    # Memory, reconstruction error and top-k recall of the compact formats against float32
+    from quantization import quantization_report
+    embeddings, _ = manager.get_embeddings_and_metadata(citekeys)
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    for precision in ('float16', 'int8'):
+        report = quantization_report(normalized, precision, top_k=args.top_k, seed=args.seed)
+        print(f"Quantization {precision}: {report}")
+        results[f'quantization_{precision}'] = report
+
+    from knn_graph import build_knn
+    print("Timing kNN graph build")
+    results['knn_graph_build'] = summarize(measure(lambda: build_knn(normalized), args.repeat))
+
+    from clustering import minibatch_kmeans, assign
+    print("Timing semantic clustering (k=16)")
+    results['clustering'] = summarize(measure(
+        lambda: assign(normalized, minibatch_kmeans(normalized, np.arange(len(normalized)), 16)[0]), args.repeat))
+
+    form = {'databases[]': citekeys}
+    for dim, name in enumerate(['x', 'y', 'z', 'w', 'v', 'color', 'undulation', 'amplitude',
+                                'phase', 'scatter_frequency', 'scatter_length', 'scatter_color']):
+        form[f'{name}_dimension'] = str(dim)
+
+    def post_visualization():
+        response = client.post('/', data=form)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST / failed with {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    print("Timing POST / visualization (cold and warm)")
+    results['visualization_post'] = summarize(
+        measure(post_visualization, args.repeat, setup=clear_embedding_cache))
+    results['visualization_post_warm'] = summarize(measure(post_visualization, args.repeat))
+
+    # get_or_create_index only loads existing stores here; file_path is never read
+    target = citekeys[0]
+
+    def load_index():
+        return get_or_create_index(target, '', 'pdf', 'benchmark')
+
+    print("Timing get_or_create_index (cold and warm)")
+    results['get_or_create_index_cold'] = summarize(measure(load_index, args.repeat, setup=clear_chroma_cache))
+    load_index()
+    results['get_or_create_index_warm'] = summarize(measure(load_index, args.repeat))
+
+    index = load_index()
+    retriever = index.as_retriever(similarity_top_k=args.top_k)
+    query_embeddings = rng.standard_normal((args.repeat, args.dims)).astype(np.float32)
+    query_embeddings /= np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+    queries = iter(query_embeddings.tolist())
+
+    def retrieve():
+        nodes = retriever.retrieve(QueryBundle(query_str='benchmark query', embedding=next(queries)))
+        if len(nodes) != min(args.top_k, args.chunks):
+            raise RuntimeError(f"Expected {args.top_k} nodes, got {len(nodes)}")
+
+    print(f"Timing retrieval top-{args.top_k}")
+    results['retrieval_top_k'] = summarize(measure(retrieve, args.repeat))
+
+    return results
+
+
+def compare(current, baseline_path, threshold):
+    """Print median ratios against a baseline file; return True if nothing regressed."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    print(f"\nComparison against {baseline_path} (commit {baseline['meta'].get('git_commit')})")
+    print(f"{'benchmark':32} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    ok = True
+    for name, stats in current['results'].items():
+        if 'median' not in stats:
+            continue  # not a timing (e.g. quantization reports)
+        old = baseline['results'].get(name)
+        if not old:
+            print(f"{name:32} {'-':>12} {stats['median']:>12.6f} {'new':>8}")
+            continue
+        ratio = stats['median'] / old['median'] if old['median'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            ok = False
+        print(f"{name:32} {old['median']:>12.6f} {stats['median']:>12.6f} {ratio:>8.2f}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline Semantic Yarn benchmark suite")
+    parser.add_argument('--docs', type=int, default=10, help="number of synthetic documents")
+    parser.add_argument('--chunks', type=int, default=200, help="chunks per document")
+    parser.add_argument('--dims', type=int, default=384, help="embedding dimensions")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per benchmark")
+    parser.add_argument('--top-k', type=int, default=9, help="retrieval top-k")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--storage-dir', help="reuse or keep synthetic stores in this directory")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument('--compare', help="baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=1.10,
+                        help="median ratio above which a benchmark counts as a regression")
+    args = parser.parse_args()
+
+    storage_dir = args.storage_dir or tempfile.mkdtemp(prefix='semanticyarn-bench-')
+    generated = not os.path.exists(os.path.join(storage_dir, '.synthetic'))
+    if generated:
+        print(f"Generating {args.docs} x {args.chunks} x {args.dims} synthetic stores in {storage_dir}")
+        start = time.perf_counter()
+        citekeys = generate_library(storage_dir, args.docs, args.chunks, args.dims, args.seed)
+        print(f"Generated stores in {time.perf_counter() - start:.2f}s")
+        with open(os.path.join(storage_dir, '.synthetic'), 'w') as f:
+            json.dump(citekeys, f)
+    else:
+        with open(os.path.join(storage_dir, '.synthetic')) as f:
+            citekeys = json.load(f)
+
+    try:
+        results = run_suite(args, storage_dir, citekeys)
+    finally:
+        if not args.storage_dir:
+            shutil.rmtree(storage_dir, ignore_errors=True)
+
+    import chromadb
+    report = {
+        'meta': {
+            'git_commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'chromadb': chromadb.__version__,
+            'params': {
+                'docs': args.docs, 'chunks': args.chunks, 'dims': args.dims,
+                'repeat': args.repeat, 'top_k': args.top_k, 'seed': args.seed,
+            },
+        },
+        'results': results,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{report['meta']['git_commit']}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'benchmark':32} {'median (s)':>12} {'p95 (s)':>12}")
+    for name, stats in results.items():
+        if 'median' in stats:
+            print(f"{name:32} {stats['median']:>12.6f} {stats['p95']:>12.6f}")
+    print(f"\nResults written to {output}")
+
+    if args.compare and not compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Generate synthetic Chroma vector databases for offline benchmarking.
+
+Stores are written in the same layout the application uses:
+``{STORAGE_DIR}/{citekey}-index.sqlite3`` containing a ``pdf_index`` collection
+whose metadata is produced by llama-index, so that ``VectorStoreIndex.from_vector_store``
+and the visualization path read them exactly like real stores.
+"""
+import os
+import argparse
+
+import numpy as np
+import chromadb
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+# Small technical vocabulary so that chunk text has realistic token statistics
+VOCABULARY = (
+    "embedding vector retrieval transformer attention gradient descent loss "
+    "convolution recurrent network bayesian inference posterior prior sampling "
+    "markov chain monte carlo variational autoencoder latent manifold spectral "
+    "clustering eigenvalue regression classifier entropy kernel regularization "
+    "dropout benchmark dataset evaluation precision recall f1 baseline ablation "
+    "hypothesis experiment measurement calibration sensor signal frequency"
+).split()
+
+
+def synthetic_citekey(i):
+    return f"synthetic{i:05d}"
+
+
+def random_text(rng, n_words=120):
+    return ' '.join(rng.choice(VOCABULARY, size=n_words))
+
+
+def generate_store(storage_dir, citekey, n_chunks, dims=384, seed=0):
+    """Create one store with n_chunks unit-norm random embeddings of size dims."""
+    rng = np.random.default_rng(seed)
+    storage_path = os.path.join(storage_dir, f"{citekey}-index.sqlite3")
+    client = chromadb.PersistentClient(path=storage_path)
+    collection = client.get_or_create_collection("pdf_index")
+
+    embeddings = rng.standard_normal((n_chunks, dims)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    ids, documents, metadatas = [], [], []
+    for i in range(n_chunks):
+        text = random_text(rng)
+        node = TextNode(text=text, id_=f"{citekey}-node-{i:06d}")
+        ids.append(node.node_id)
+        documents.append(text)
+        metadatas.append(node_to_metadata_dict(node, remove_text=True, flat_metadata=True))
+
+    # Chroma limits the batch size per add call
+    batch = 5000
+    for start in range(0, n_chunks, batch):
+        end = start + batch
+        collection.add(
+            ids=ids[start:end],
+            embeddings=embeddings[start:end].tolist(),
+            documents=documents[start:end],
+            metadatas=metadatas[start:end],
+        )
+    return storage_path
+
+
+def generate_library(storage_dir, n_docs, n_chunks, dims=384, seed=0):
+    """Create n_docs stores of n_chunks each; returns the list of citekeys."""
+    os.makedirs(storage_dir, exist_ok=True)
+    citekeys = []
+    for i in range(n_docs):
+        citekey = synthetic_citekey(i)
+        generate_store(storage_dir, citekey, n_chunks, dims=dims, seed=seed + i)
+        citekeys.append(citekey)
+    return citekeys
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic Chroma stores")
+    parser.add_argument('storage_dir')
+    parser.add_argument('--docs', type=int, default=10)
+    parser.add_argument('--chunks', type=int, default=200)
+    parser.add_argument('--dims', type=int, default=384)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    keys = generate_library(args.storage_dir, args.docs, args.chunks, args.dims, args.seed)
+    print(f"Generated {len(keys)} stores in {args.storage_dir}")
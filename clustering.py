@@ -0,0 +1,185 @@
+"""Semantic clusters of the chunks shown in the 3D view, for coloring points.
+
+Clusters are found by mini-batch spherical k-means (cosine similarity) over
+the selected databases' embeddings: each step updates the centroids from a
+random batch of BATCH_SIZE rows, so fitting costs O(batches x batch x k)
+regardless of the number of chunks, and the final assignment is a blocked
+matrix product. Rows are expanded from the in-memory (possibly quantized)
+matrix one block at a time.
+
+Results are cached by the set of (database, content hash) and k. When a
+database is added to a cached selection, the cached centroids are refined
+with batches of the new rows only and every row is reassigned, which also
+keeps cluster ids stable between the two selections.
+"""
+import time
+from collections import OrderedDict
+from itertools import groupby
+
+import numpy as np
+
+from async_mode import native_lock
+from db_catalog import cacheable_hash
+from quantization import QuantizedMatrix
+
+BATCH_SIZE = 1024
+# Passes over the rows being fitted, bounded by MIN_BATCHES and MAX_BATCHES
+EPOCHS = 3
+MIN_BATCHES = 20
+MAX_BATCHES = 300
+ASSIGN_ROWS = 4096
+# Rows k-means++ picks the initial centroids from
+SEED_SAMPLE = 4096
+REPRESENTATIVES = 3
+MAX_CLUSTERS = 64
+MAX_CACHED_CLUSTERINGS = 16
+
+
+def _normalized(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+
+
+def _take(embeddings, indices):
+    """Normalized float32 rows of a QuantizedMatrix (or array) at the given indices."""
+    # An ndarray has a .data memoryview too, so check the type rather than the attribute
+    quantized = isinstance(embeddings, QuantizedMatrix)
+    data = embeddings.data if quantized else embeddings
+    rows = data[indices].astype(np.float32)
+    scale = embeddings.scale if quantized else None
+    if scale is not None:
+        rows *= scale
+    return _normalized(rows)
+
+
+def assign(embeddings, centroids, start=0, end=None):
+    """Nearest centroid and its cosine similarity for rows start:end, one block at a time."""
+    end = len(embeddings) if end is None else end
+    labels = np.empty(end - start, dtype=np.int32)
+    scores = np.empty(end - start, dtype=np.float32)
+    for block in range(start, end, ASSIGN_ROWS):
+        similarities = _take(embeddings, slice(block, min(block + ASSIGN_ROWS, end))) @ centroids.T
+        labels[block - start:block - start + len(similarities)] = similarities.argmax(axis=1)
+        scores[block - start:block - start + len(similarities)] = similarities.max(axis=1)
+    return labels, scores
+
+
+def kmeans_plus_plus(embeddings, rows, k, rng):
+    """k-means++ seeds (cosine distance) from a sample of SEED_SAMPLE rows."""
+    sample = _take(embeddings, np.sort(rng.choice(rows, size=min(SEED_SAMPLE, len(rows)), replace=False)))
+    seeds = [rng.integers(len(sample))]
+    distances = 1 - sample @ sample[seeds[0]]
+    for _ in range(1, k):
+        weights = np.maximum(distances, 0) ** 2
+        total = weights.sum()
+        seed = rng.choice(len(sample), p=weights / total) if total > 0 else rng.integers(len(sample))
+        seeds.append(seed)
+        distances = np.minimum(distances, 1 - sample @ sample[seed])
+    return sample[seeds].copy()
+
+
+def minibatch_kmeans(embeddings, rows, k, centroids=None, counts=None, seed=0):
+    """Fit (or refine) k centroids on the given row indices; returns (centroids, counts)."""
+    rng = np.random.default_rng(seed)
+    if centroids is None:
+        centroids = kmeans_plus_plus(embeddings, rows, k, rng)
+        counts = np.zeros(k, dtype=np.float64)
+    else:
+        centroids, counts = centroids.copy(), counts.copy()
+
+    batches = int(np.clip(EPOCHS * len(rows) / BATCH_SIZE, MIN_BATCHES, MAX_BATCHES))
+    for _ in range(batches):
+        batch = _take(embeddings, np.sort(rows[rng.integers(len(rows), size=min(BATCH_SIZE, len(rows)))]))
+        labels = (batch @ centroids.T).argmax(axis=1)
+        one_hot = np.zeros((len(batch), k), dtype=np.float32)
+        one_hot[np.arange(len(batch)), labels] = 1
+        sums = one_hot.T @ batch
+        sizes = one_hot.sum(axis=0).astype(np.float64)
+        counts += sizes
+        # Per-center learning rate 1 / count (Sculley 2010), then back onto the sphere
+        updated = sizes > 0
+        rate = (1.0 / counts[updated])[:, None].astype(np.float32)
+        centroids[updated] += rate * (sums[updated] - sizes[updated, None].astype(np.float32) * centroids[updated])
+        centroids[updated] = _normalized(centroids[updated])
+    return centroids, counts
+
+
+def database_ranges(metadata):
+    """[(database, start, end)] of the contiguous rows of each database."""
+    ranges = []
+    start = 0
+    for database, rows in groupby(metadata, key=lambda m: m['db_name']):
+        end = start + sum(1 for _ in rows)
+        ranges.append((database, start, end))
+        start = end
+    return ranges
+
+
+class ClusteringCache:
+    """Clusterings of selections by (database, content hash) set and k, refined incrementally."""
+
+    def __init__(self, catalog, max_entries=MAX_CACHED_CLUSTERINGS):
+        self._catalog = catalog
+        self.max_entries = max_entries
+        # Clustering runs on OS threads (run_blocking), so use a real lock
+        self._lock = native_lock()
+        self._entries = OrderedDict()
+
+    def _lookup(self, key, k):
+        """Exact entry for key, else the cached entry with the largest subset of its databases."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key], 'cached'
+            best = None
+            for (databases, entry_k), entry in self._entries.items():
+                if entry_k == k and databases < key[0] and (best is None or len(databases) > len(best[0][0])):
+                    best = ((databases, entry_k), entry)
+            return (best[1], 'incremental') if best else (None, 'full')
+
+    def cluster(self, embeddings, metadata, k):
+        """Cluster id and centroid similarity of every row, plus per-cluster sizes and representatives."""
+        start = time.perf_counter()
+        ranges = database_ranges(metadata)
+        manifests = self._catalog.manifests()
+        hashes = {database: cacheable_hash(manifests, database) for database, _, _ in ranges}
+        k = max(1, min(k, MAX_CLUSTERS, len(embeddings)))
+        key = (frozenset(hashes.items()), k)
+        cacheable = all(hashes.values())
+
+        entry, mode = self._lookup(key, k) if cacheable else (None, 'full')
+        if mode == 'cached':
+            labels = {database: entry['labels'][database] for database in hashes}
+            scores = {database: entry['scores'][database] for database in hashes}
+            centroids = entry['centroids']
+        else:
+            if mode == 'incremental':
+                known = {database for database, _ in entry['labels'].items()}
+                new_rows = np.concatenate([np.arange(s, e) for database, s, e in ranges if database not in known])
+                centroids, counts = minibatch_kmeans(embeddings, new_rows, k, entry['centroids'], entry['counts'])
+            else:
+                centroids, counts = minibatch_kmeans(embeddings, np.arange(len(embeddings)), k)
+            labels, scores = {}, {}
+            for database, s, e in ranges:
+                labels[database], scores[database] = assign(embeddings, centroids, s, e)
+            if cacheable:
+                with self._lock:
+                    self._entries[key] = {'centroids': centroids, 'counts': counts, 'labels': labels, 'scores': scores}
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+
+        all_labels = np.concatenate([labels[database] for database, _, _ in ranges])
+        all_scores = np.concatenate([scores[database] for database, _, _ in ranges])
+        # Representatives: the rows closest to their cluster's centroid
+        order = np.lexsort((-all_scores, all_labels))
+        boundaries = np.searchsorted(all_labels[order], np.arange(k + 1))
+        clusters = []
+        for cluster in range(k):
+            members = order[boundaries[cluster]:boundaries[cluster + 1]]
+            clusters.append({
+                'id': cluster,
+                'size': int(len(members)),
+                'representatives': [int(i) for i in members[:REPRESENTATIVES]],
+            })
+        print(f"Clustered {len(all_labels)} chunks into {k} clusters ({mode}) in {time.perf_counter() - start:.2f}s")
+        return {'labels': all_labels, 'clusters': clusters, 'k': k, 'mode': mode}
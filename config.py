@@ -0,0 +1,51 @@
+"""Paths and settings shared by app.py and the modules it uses.
+
+This module has no heavy imports, so db_utils and the other helpers read their
+configuration from here instead of importing app (which, when started as
+``python app.py``, would import and initialize the whole application twice).
+"""
+import os
+
+# Get the absolute path of the application's root directory
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+CHAT_HISTORY_FILE = os.path.join(APP_ROOT, 'data', 'chat_history', 'chat_history.json')
+STORAGE_DIR = os.environ.get('SEMANTICYARN_STORAGE_DIR', os.path.join(APP_ROOT, 'vector_database'))
+
+# Embedding model, exported to ONNX on first use if the folder does not exist
+EMBED_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+ONNX_MODEL_PATH = os.environ.get('SEMANTICYARN_ONNX_MODEL_PATH', "./bge_onnx")
+
+# Share of BM25 in hybrid retrieval (0 = vector search only, 1 = BM25 only)
+LEXICAL_WEIGHT = float(os.environ.get('SEMANTICYARN_LEXICAL_WEIGHT', 0.5))
+
+# Relevance vs. diversity when selecting retrieved chunks by MMR (1 = relevance only, no MMR)
+MMR_LAMBDA = float(os.environ.get('SEMANTICYARN_MMR_LAMBDA', 0.7))
+
+# Precision of in-memory embedding copies for library search and visualization:
+# float32, float16 (half the memory) or int8 (a quarter); see quantization.py
+EMBEDDING_PRECISION = os.environ.get('SEMANTICYARN_EMBEDDING_PRECISION', 'float32').lower()
+
+# Memory for embeddings kept per database between visualization requests
+EMBEDDING_CACHE_BYTES = int(float(os.environ.get('SEMANTICYARN_EMBEDDING_CACHE_MB', 512)) * 1024 * 1024)
+
+# Parsed PDF markdown kept between ingestion runs (see parse_cache.py)
+PARSE_CACHE_DIR = os.environ.get('SEMANTICYARN_PARSE_CACHE_DIR', os.path.join(APP_ROOT, 'data', 'parse_cache'))
+PARSE_CACHE_BYTES = int(float(os.environ.get('SEMANTICYARN_PARSE_CACHE_MB', 256)) * 1024 * 1024)
+
+# Resolved Zotero PDF attachments by citekey (see attachment_index.py)
+ATTACHMENT_INDEX_FILE = os.environ.get('SEMANTICYARN_ATTACHMENT_INDEX', os.path.join(APP_ROOT, 'data', 'attachment_index.json'))
+
+# lazy: load the embedding model on first use
+# warm: start serving immediately and load it on a background thread
+# eager: load it before the server starts (the original behaviour)
+STARTUP_MODE = os.environ.get('SEMANTICYARN_STARTUP', 'warm').lower()
+
+if STARTUP_MODE not in ('lazy', 'warm', 'eager'):
+    raise ValueError(f"Unsupported SEMANTICYARN_STARTUP: {STARTUP_MODE}")
+if EMBEDDING_PRECISION not in ('float32', 'float16', 'int8'):
+    raise ValueError(f"Unsupported SEMANTICYARN_EMBEDDING_PRECISION: {EMBEDDING_PRECISION}")
+if not 0 <= LEXICAL_WEIGHT <= 1:
+    raise ValueError(f"SEMANTICYARN_LEXICAL_WEIGHT must be between 0 and 1, got {LEXICAL_WEIGHT}")
+if not 0 <= MMR_LAMBDA <= 1:
+    raise ValueError(f"SEMANTICYARN_MMR_LAMBDA must be between 0 and 1, got {MMR_LAMBDA}")
@@ -0,0 +1,289 @@
+"""Catalog of the vector databases in STORAGE_DIR, backed by per-store manifests.
+
+Each ``{citekey}-index.sqlite3`` store carries a ``manifest.json`` with its chunk
+count, embedding dimensions, embedding model, size on disk, modification time
+and a hash of its content. Ingestion writes the manifest when it builds a store;
+stores created before manifests existed get one the first time they are seen.
+
+The catalog rescans STORAGE_DIR when the directory's mtime changes (a store was
+added or removed), when the manifest of a known store was written or deleted
+(for instance by ingest_library.py in another process), or every few seconds
+while a store is still being ingested. Checking for changes only stats the
+directory and the manifests, so listing databases and reporting their
+statistics no longer opens a Chroma client per store. Manifests of older stores
+are built on a background thread.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+from async_mode import native_lock, run_blocking
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+STORE_SUFFIX = '-index.sqlite3'
+COLLECTION_NAME = 'pdf_index'
+# Stores without a manifest whose Chroma files changed this recently are assumed to be mid-ingestion
+INGESTION_GRACE_SECONDS = 60
+# How often a scan looks again at stores that are mid-ingestion
+PENDING_RECHECK_SECONDS = 5
+
+
+def manifest_path(store_path):
+    return os.path.join(store_path, MANIFEST_NAME)
+
+
+def manifest_mtime(store_path):
+    """Modification time of a store's manifest in nanoseconds, or None without one."""
+    try:
+        return os.stat(manifest_path(store_path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def store_size(store_path):
+    """Total size in bytes of the files of a store."""
+    total = 0
+    for root, _, files in os.walk(store_path):
+        for name in files:
+            if name == MANIFEST_NAME:
+                continue
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def latest_mtime(store_path):
+    """Most recent modification time of the Chroma files of a store.
+
+    Sidecars next to them (manifest, statistics, neighbor graph, BM25 index) are
+    left out: read paths write them lazily, which would make an old store look
+    like it is being ingested.
+    """
+    latest = None
+    for root, _, files in os.walk(store_path):
+        for name in files:
+            # Chroma's segment files live in subdirectories, next to chroma.sqlite3
+            if root == store_path and not name.startswith('chroma.sqlite3'):
+                continue
+            try:
+                mtime = os.path.getmtime(os.path.join(root, name))
+                latest = mtime if latest is None else max(latest, mtime)
+            except OSError:
+                pass
+    # A store directory Chroma has not written to yet
+    return os.path.getmtime(store_path) if latest is None else latest
+
+
+def content_hash(texts):
+    """Order-independent hash of the chunk texts of a store."""
+    digest = hashlib.sha256()
+    for text in sorted(t or '' for t in texts):
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def cacheable_hash(manifests, name):
+    """Content hash to key a cache of store `name` on, or None if it must not be cached.
+
+    Stores without a complete manifest may still be written to (mid-ingestion, or
+    created before manifests existed), so nothing read from them is cached.
+    """
+    manifest = manifests.get(name) or {}
+    if manifest.get('pending') or 'error' in manifest:
+        return None
+    return manifest.get('content_hash')
+
+
+def read_manifest(store_path):
+    try:
+        with open(manifest_path(store_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('manifest_version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def write_manifest(store_path, citekey, collection, embed_model=None, source_sha256=None):
+    """Describe a store from its Chroma collection and write its manifest.
+
+    Reads every chunk text once to hash the content; called when a store is
+    created, not on the request path. source_sha256 is the hash of the PDF the
+    store was built from, when ingestion knows it.
+    """
+    count = collection.count()
+    dims = 0
+    texts = []
+    if count:
+        sample = collection.get(limit=1, include=['embeddings'])
+        embeddings = sample.get('embeddings')
+        if embeddings is not None and len(embeddings):
+            dims = len(embeddings[0])
+        texts = collection.get(limit=count, include=['documents']).get('documents') or []
+
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'citekey': citekey,
+        'count': count,
+        'dims': dims,
+        'embed_model': embed_model,
+        'size_bytes': store_size(store_path),
+        'mtime': latest_mtime(store_path),
+        'content_hash': content_hash(texts),
+        'source_sha256': source_sha256,
+        'updated_at': time.time(),
+    }
+    tmp_path = manifest_path(store_path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(store_path))
+    return manifest
+
+
+def build_manifest(store_path, citekey, embed_model=None):
+    """Open a store without a manifest and write one for it."""
+    import chromadb
+    client = chromadb.PersistentClient(path=store_path)
+    collection = client.get_or_create_collection(COLLECTION_NAME)
+    return write_manifest(store_path, citekey, collection, embed_model)
+
+
+class DatabaseCatalog:
+    """In-memory view of the stores in a directory, refreshed when the directory changes."""
+
+    def __init__(self, storage_dir, embed_model=None):
+        self.storage_dir = storage_dir
+        self.embed_model = embed_model
+        # Also taken by warm-up scans running on OS threads
+        self._lock = native_lock()
+        self._dir_mtime = None
+        self._recheck_at = None
+        self._building = set()
+        self._paths = {}
+        self._manifests = {}
+        # Manifest mtime of every known store when it was last read, None without a manifest
+        self._manifest_mtimes = {}
+
+    def refresh(self, force=False):
+        """Rescan the directory if it changed since the last scan; returns True if it did."""
+        try:
+            mtime = os.stat(self.storage_dir).st_mtime_ns
+        except OSError:
+            print(f"Warning: vector-database directory not found at {self.storage_dir}")
+            with self._lock:
+                self._paths, self._manifests, self._dir_mtime = {}, {}, None
+                self._manifest_mtimes = {}
+            return True
+
+        with self._lock:
+            if not force and mtime == self._dir_mtime and (
+                    self._recheck_at is None or time.time() < self._recheck_at) and all(
+                    manifest_mtime(path) == self._manifest_mtimes.get(citekey)
+                    for citekey, path in self._paths.items()):
+                return False
+            print(f"Scanning directory: {self.storage_dir}")
+            paths = {}
+            for entry in os.scandir(self.storage_dir):
+                if entry.is_dir() and entry.name.endswith(STORE_SUFFIX):
+                    paths[entry.name[:-len(STORE_SUFFIX)]] = entry.path
+
+            manifests = {}
+            manifest_mtimes = {}
+            pending = False
+            legacy = []
+            for citekey, path in paths.items():
+                manifest_mtimes[citekey] = manifest_mtime(path)
+                manifest = self._manifests.get(citekey) if not force else None
+                # Re-read manifests rewritten or deleted since the last scan
+                if manifest is None or manifest.get('pending') \
+                        or manifest_mtimes[citekey] != self._manifest_mtimes.get(citekey):
+                    manifest = read_manifest(path)
+                if manifest is None and citekey in self._building:
+                    manifest = {'citekey': citekey, 'pending': True}
+                elif manifest is None and time.time() - latest_mtime(path) < INGESTION_GRACE_SECONDS:
+                    # Ingestion writes the manifest once the store is complete
+                    manifest = {'citekey': citekey, 'pending': True}
+                    pending = True
+                elif manifest is None:
+                    # Store created before manifests existed; pending until its manifest is built
+                    manifest = {'citekey': citekey, 'pending': True}
+                    legacy.append((citekey, path))
+                manifests[citekey] = manifest
+
+            added = set(paths) - set(self._paths)
+            removed = set(self._paths) - set(paths)
+            if added or removed:
+                print(f"Databases added: {sorted(added)}, removed: {sorted(removed)}")
+            self._paths = paths
+            self._manifests = manifests
+            self._manifest_mtimes = manifest_mtimes
+            self._dir_mtime = mtime
+            # Look again shortly while a store is still being written
+            self._recheck_at = time.time() + PENDING_RECHECK_SECONDS if pending else None
+            if legacy:
+                self._building.update(citekey for citekey, _ in legacy)
+                threading.Thread(target=self._build_manifests, args=(legacy,),
+                                 name='manifest-builder', daemon=True).start()
+            return True
+
+    def _build_manifests(self, stores):
+        """Write manifests for stores created before manifests existed, outside the scan lock."""
+        for citekey, path in stores:
+            try:
+                print(f"Writing manifest for {citekey}")
+                manifest = run_blocking(build_manifest, path, citekey, self.embed_model)
+            except Exception as e:
+                print(f"Error building manifest for {citekey}: {str(e)}")
+                manifest = {'citekey': citekey, 'error': str(e)}
+            with self._lock:
+                self._building.discard(citekey)
+                if citekey in self._paths:
+                    self._manifests[citekey] = manifest
+                    self._manifest_mtimes[citekey] = manifest_mtime(self._paths[citekey])
+
+    def update(self, citekey, manifest):
+        """Record a manifest written by ingestion without waiting for the next scan."""
+        with self._lock:
+            self._paths[citekey] = os.path.join(self.storage_dir, f"{citekey}{STORE_SUFFIX}")
+            self._manifests[citekey] = manifest
+            self._manifest_mtimes[citekey] = manifest_mtime(self._paths[citekey])
+
+    def paths(self):
+        self.refresh()
+        with self._lock:
+            return dict(self._paths)
+
+    def manifests(self):
+        self.refresh()
+        with self._lock:
+            return dict(self._manifests)
+
+    def complete_manifests(self, poll=0.1):
+        """Manifests once those of older stores are built; only stores mid-ingestion stay pending."""
+        self.refresh()
+        while True:
+            with self._lock:
+                if not self._building:
+                    return dict(self._manifests)
+            time.sleep(poll)
+
+    def stats(self):
+        """Per-store manifests plus library totals."""
+        manifests = self.manifests()
+        valid = [m for m in manifests.values() if 'error' not in m and not m.get('pending')]
+        return {
+            'databases': manifests,
+            'total': {
+                'databases': len(manifests),
+                'embeddings': sum(m.get('count', 0) for m in valid),
+                'size_bytes': sum(m.get('size_bytes', 0) for m in valid),
+                'dims': sorted({m.get('dims') for m in valid if m.get('dims')}),
+            },
+        }
@@ -1,24 +1,86 @@
 import os
-import pymupdf4llm
-import chromadb
 import numpy as np
+from collections import OrderedDict
 from typing import List
 from pathlib import Path
 
-from llama_index.core import Document, StorageContext, VectorStoreIndex
-from llama_index.core.node_parser import SemanticSplitterNodeParser
-from llama_index.vector_stores.chroma import ChromaVectorStore
+from llama_index.core import Document, Settings, StorageContext, VectorStoreIndex
 
-def process_document(file_path: str, file_type: str) -> List[Document]:
-    """Process a document using LlamaMarkdownReader and return LlamaIndex documents."""
-    from app import log_terminal  # Import here to avoid circular dependency
+from config import STORAGE_DIR, EMBED_MODEL_NAME, EMBEDDING_CACHE_BYTES, PARSE_CACHE_DIR, PARSE_CACHE_BYTES
+from async_mode import native_lock
+from db_catalog import DatabaseCatalog, cacheable_hash, manifest_path, write_manifest
+from embedding_stats import combine_stats, compute_stats, read_stats, write_stats
+from knn_graph import build_knn, read_graph, write_graph, write_store_graph
+from lexical_index import LexicalIndexCache, write_lexical_index
+from parse_cache import ParseCache
+from quantization import QuantizedMatrix
+from metrics import traced, INDEX_CACHE, EMBEDDINGS_LOADED, EMBEDDING_CACHE
+from startup import ensure_embed_model, timed_import
+from terminal_log import log_terminal
+
+# chromadb, the Chroma vector store and pymupdf4llm take seconds to import, so they
+# are imported on first use rather than when the app starts.
+
+# Stores in STORAGE_DIR and their manifests; ingestion keeps it current
+catalog = DatabaseCatalog(STORAGE_DIR, embed_model=EMBED_MODEL_NAME)
+
+def open_chroma_client(path: str):
+    """Open the Chroma database stored at path."""
+    chromadb = timed_import('chromadb')
+    return chromadb.PersistentClient(path=path)
+
+# BM25 indexes of the stores, loaded on first use
+lexical_indexes = LexicalIndexCache(open_chroma_client)
+
+# Markdown of parsed PDFs, so re-chunking or re-embedding skips parsing
+parse_cache = ParseCache(PARSE_CACHE_DIR, PARSE_CACHE_BYTES)
+
+def get_lexical_index(citekey: str):
+    """The BM25 index of a store, rebuilt if it does not match the store's content.
+
+    None while the store has no complete manifest (mid-ingestion, or its manifest
+    is still being built or failed): a stored index could not be checked against
+    the content, so retrieval uses vector search only.
+    """
+    content_hash = cacheable_hash(catalog.manifests(), citekey)
+    if not content_hash:
+        print(f"No manifest for {citekey} yet, skipping its lexical index")
+        return None
+    storage_path = os.path.join(STORAGE_DIR, f"{citekey}-index.sqlite3")
+    return lexical_indexes.get(storage_path, content_hash)
+
+def load_vector_store(storage_path: str):
+    """Open the pdf_index collection of a database as a llama-index vector store."""
+    ChromaVectorStore = timed_import('llama_index.vector_stores.chroma').ChromaVectorStore
+    chroma_collection = open_chroma_client(storage_path).get_or_create_collection("pdf_index")
+    return ChromaVectorStore(chroma_collection=chroma_collection)
+
+def process_document(file_path: str, file_type: str, sha256: str = None) -> List[Document]:
+    """Process a document using LlamaMarkdownReader and return LlamaIndex documents.
+
+    Parsed pages are cached by PDF content and parser version (see parse_cache.py);
+    pass the SHA-256 of the PDF if it is already known to skip hashing it.
+    """
     log_terminal(f"Processing document: {file_path}")
     
     try:
         if file_type == 'pdf':
+            key = parse_cache.key(file_path, sha256)
+            pages = parse_cache.get(key)
+            if pages is not None:
+                log_terminal(f"Loaded {len(pages)} parsed pages from cache: {file_path}")
+                # The same PDF may have been parsed from another path
+                return [Document(text=page['text'], metadata={**page['metadata'], 'file_path': file_path})
+                        for page in pages]
+
+            pymupdf4llm = timed_import('pymupdf4llm')
             llama_reader = pymupdf4llm.LlamaMarkdownReader()
             documents = llama_reader.load_data(file_path)
             log_terminal(f"Successfully loaded document: {file_path}")
+            try:
+                parse_cache.put(key, [{'text': doc.text, 'metadata': doc.metadata} for doc in documents])
+            except (OSError, TypeError, ValueError) as e:
+                log_terminal(f"Error caching parsed document: {str(e)}")
             return documents
         else:
             log_terminal(f"Unsupported file type: {file_type}")
@@ -29,10 +91,11 @@ def process_document(file_path: str, file_type: str) -> List[Document]:
 
 def create_chunks(documents: List[Document]) -> List[Document]:
     """Create chunks using SemanticSplitterNodeParser."""
-    from app import Settings, log_terminal  # Import here to avoid circular dependency
     log_terminal("Creating text chunks...")
     
     try:
+        from llama_index.core.node_parser import SemanticSplitterNodeParser
+        ensure_embed_model()
         semantic_chunker = SemanticSplitterNodeParser(
             buffer_size=1,
             breakpoint_percentile_threshold=70,
@@ -48,61 +111,108 @@ def create_chunks(documents: List[Document]) -> List[Document]:
         log_terminal(f"Error creating chunks: {str(e)}")
         return []
 
-def create_vector_index(documents: List[Document], citekey: str, model_name: str):
-    """Create a vector index from documents."""
-    from app import Settings, log_terminal, STORAGE_DIR, create_llm  # Import here to avoid circular dependency
-    log_terminal(f"Creating vector index for {citekey}...")
+def create_vector_index(documents: List[Document], citekey: str, model_name: str, source_sha256: str = None):
+    """Create a vector index from documents.
+
+    Indexing only embeds chunks, so no LLM is configured here; model_name is the
+    model of the request that triggered ingestion and is only logged.
+    """
+    log_terminal(f"Creating vector index for {citekey} (requested by model {model_name})...")
     
     try:
-        # Configure LMStudio LLM with original settings
-        llm = create_llm(model_name)
-        # Set up settings
-        Settings.llm = llm
-        
         # Create Chroma vector store
         storage_path = os.path.join(STORAGE_DIR, f"{citekey}-index.sqlite3")
-        chroma_client = chromadb.PersistentClient(path=storage_path)
-        chroma_collection = chroma_client.get_or_create_collection("pdf_index")
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        vector_store = load_vector_store(storage_path)
         
         # Create and store the index
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
         index = VectorStoreIndex.from_documents(documents, storage_context=storage_context)
+        finish_store(storage_path, citekey, source_sha256)
         
         log_terminal(f"Successfully created and stored index for {citekey}")
     except Exception as e:
         log_terminal(f"Error creating vector index: {str(e)}")
         raise
 
-def get_or_create_index(citekey: str, file_path: str, file_type: str, model_name: str):
-    """Get an existing index or create a new one."""
-    from app import log_terminal, STORAGE_DIR  # Import here to avoid circular dependency
+def finish_store(storage_path: str, citekey: str, source_sha256: str = None):
+    """Build the BM25 index, embedding statistics and neighbor graph of a written store,
+    then record it in its manifest and the catalog."""
+    collection = open_chroma_client(storage_path).get_or_create_collection("pdf_index")
+    write_lexical_index(storage_path, collection)
+    manifest = write_manifest(storage_path, citekey, collection, EMBED_MODEL_NAME, source_sha256=source_sha256)
+    stored = collection.get(include=['embeddings'])
+    write_stats(storage_path, compute_stats(stored['embeddings']), manifest['content_hash'])
+    write_store_graph(storage_path, stored['ids'], stored['embeddings'], manifest['content_hash'])
+    catalog.update(citekey, manifest)
+    return manifest
+
+# create_vector_index in separate steps, so bulk ingestion (ingest_library.py) can
+# run them as pipeline stages
+
+def split_nodes(chunks: List[Document]):
+    """Nodes of the chunks, split by the same transformations as VectorStoreIndex.from_documents."""
+    from llama_index.core.ingestion import run_transformations
+    return run_transformations(chunks, Settings.transformations)
+
+def embed_nodes(nodes):
+    """Set the embedding of every node in batches."""
+    from llama_index.core.schema import MetadataMode
+    ensure_embed_model()
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    for node, embedding in zip(nodes, Settings.embed_model.get_text_embedding_batch(texts)):
+        node.embedding = embedding
+    return nodes
+
+def write_vector_store(nodes, citekey: str, source_sha256: str = None):
+    """Store embedded nodes as the vector index of citekey; returns its manifest."""
+    storage_path = os.path.join(STORAGE_DIR, f"{citekey}-index.sqlite3")
+    storage_context = StorageContext.from_defaults(vector_store=load_vector_store(storage_path))
+    # Nodes that already have an embedding are not embedded again
+    VectorStoreIndex(nodes=nodes, storage_context=storage_context)
+    return finish_store(storage_path, citekey, source_sha256)
+
+def clear_vector_store(citekey: str):
+    """Empty the store of citekey before it is rebuilt, so chunks are not added twice."""
+    storage_path = os.path.join(STORAGE_DIR, f"{citekey}-index.sqlite3")
+    if not os.path.exists(storage_path):
+        return
+    # Without a manifest the catalog treats the store as being ingested
+    if os.path.exists(manifest_path(storage_path)):
+        os.remove(manifest_path(storage_path))
+    client = open_chroma_client(storage_path)
+    try:
+        client.delete_collection("pdf_index")
+    except Exception:
+        pass  # No collection yet
+
+def get_or_create_index(citekey: str, file_path: str, file_type: str, model_name: str, sha256: str = None):
+    """Get an existing index or create a new one (sha256: hash of the file, if known)."""
     storage_path = os.path.join(STORAGE_DIR, f"{citekey}-index.sqlite3")
+    # Indexes embed queries with the global embedding model, so it must be loaded first
+    ensure_embed_model()
     
     try:
         # Try to load existing index first
         if os.path.exists(storage_path):
-            chroma_client = chromadb.PersistentClient(path=storage_path)
-            chroma_collection = chroma_client.get_or_create_collection("pdf_index")
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+            vector_store = load_vector_store(storage_path)
             storage_context = StorageContext.from_defaults(vector_store=vector_store)
             index = VectorStoreIndex.from_vector_store(vector_store=vector_store, storage_context=storage_context)
+            INDEX_CACHE.inc(result='hit')
             return index
     except Exception as e:
         log_terminal(f"Error loading existing index: {str(e)}")
     
+    INDEX_CACHE.inc(result='miss')
     # If loading fails or index doesn't exist, create new one
-    documents = process_document(file_path, file_type)
+    documents = process_document(file_path, file_type, sha256)
     if not documents:
         raise ValueError(f"Failed to process document: {file_path}")
     
     chunks = create_chunks(documents)
-    create_vector_index(chunks, citekey, model_name)
+    create_vector_index(chunks, citekey, model_name, sha256)
     
     # Load the newly created index
-    chroma_client = chromadb.PersistentClient(path=storage_path)
-    chroma_collection = chroma_client.get_or_create_collection("pdf_index")
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+    vector_store = load_vector_store(storage_path)
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
     return VectorStoreIndex.from_vector_store(vector_store=vector_store, storage_context=storage_context)
 
@@ -110,31 +220,22 @@ def get_or_create_index(citekey: str, file_path: str, file_type: str, model_name
 class VectorDBManager:
     def __init__(self, app_directory):
         self.app_directory = Path(app_directory)
-        # Import STORAGE_DIR from app to use the centralized storage location
-        from app import STORAGE_DIR
         self.vector_db_directory = Path(STORAGE_DIR)
         print(f"Looking for databases in: {self.vector_db_directory}")
-        self.available_dbs = self._scan_for_dbs()
-
-    def _scan_for_dbs(self):
-        """Scan for Chroma databases in the specified directory only."""
-        db_files = {}
+        self.catalog = catalog
+        # db_name -> embeddings, metadata and statistics, least recently used first
+        self._embedding_cache = OrderedDict()
+        self._cache_lock = native_lock()
 
-        if not self.vector_db_directory.exists():
-            print(f"Warning: vector-database directory not found at {self.vector_db_directory}")
-            return db_files
-
-        print(f"Scanning directory: {self.vector_db_directory}")
-
-        # Only iterate through direct children of the directory.
-        for item in self.vector_db_directory.iterdir():
-            # Check if it is a directory and ends with -index.sqlite3.
-            if item.is_dir() and item.name.endswith('-index.sqlite3'):
-                db_name = item.name.replace('-index.sqlite3', '')
-                db_path = str(item)
-                db_files[db_name] = db_path
-                print(f"Found database: {db_name} at {db_path}")
+    @property
+    def available_dbs(self):
+        """{db_name: path} of the stores in the storage directory, rescanned when it changes."""
+        return self.catalog.paths()
 
+    def _scan_for_dbs(self):
+        """Force a full rescan of the storage directory."""
+        self.catalog.refresh(force=True)
+        db_files = self.catalog.paths()
         print(f"Found {len(db_files)} databases: {list(db_files.keys())}")
         return db_files
 
@@ -144,109 +245,194 @@ class VectorDBManager:
         print(f"Available databases: {dbs}")
         return dbs
 
-    def get_embeddings_and_metadata(self, db_names):
-        """Get embeddings and metadata from specified Chroma databases"""
-        all_embeddings = []
-        all_metadata = []
+    def _load_database(self, db_name):
+        """Read the valid embeddings (float32) of one database with their node ids, or None."""
+        try:
+            print(f"\nProcessing database: {db_name}")
+            if db_name not in self.available_dbs:
+                print(f"Database {db_name} not found in available databases")
+                return None
 
-        for db_name in db_names:
+            db_path = self.available_dbs[db_name]
+            chroma_client = open_chroma_client(db_path)
+            
             try:
-                print(f"\nProcessing database: {db_name}")
-                if db_name not in self.available_dbs:
-                    print(f"Database {db_name} not found in available databases")
-                    continue
+                chroma_collection = chroma_client.get_collection(name="pdf_index")
+                count = chroma_collection.count()
+                print(f"Found {count} items in collection")
+                
+                if count == 0:
+                    print(f"Collection is empty for {db_name}")
+                    return None
 
-                db_path = self.available_dbs[db_name]
-                chroma_client = chromadb.PersistentClient(path=db_path)
+                # Get all items; chunk texts and metadata are read on demand (node_details.py)
+                results = chroma_collection.get(
+                    limit=count,
+                    include=["embeddings"]
+                )
                 
-                try:
-                    chroma_collection = chroma_client.get_collection(name="pdf_index")
-                    count = chroma_collection.count()
-                    print(f"Found {count} items in collection")
-                    
-                    if count == 0:
-                        print(f"Collection is empty for {db_name}")
-                        continue
-
-                    # Get all items
-                    results = chroma_collection.get(
-                        limit=count,
-                        include=["embeddings", "metadatas", "documents"]
-                    )
-                    
-                    if not results or "embeddings" not in results:
-                        print(f"No results or embeddings for {db_name}")
-                        continue
-
-                    embeddings = results["embeddings"]
-                    metadatas = results.get("metadatas", [{}] * len(embeddings))
-                    ids = results.get("ids", [f"{db_name}_{i}" for i in range(len(embeddings))])
-
-                    # Process embeddings one by one
-                    for i, (embedding, metadata, id_) in enumerate(zip(embeddings, metadatas, ids)):
-                        try:
-                            # Convert to numpy array first
-                            emb_array = np.array(embedding, dtype=np.float32)
-                            
-                            # Check if embedding is valid using proper numpy comparisons
-                            if emb_array.size > 0 and np.any(~np.isnan(emb_array)) and np.any(~np.isinf(emb_array)):
-                                # Create metadata dictionary
-                                meta_dict = metadata if isinstance(metadata, dict) else {}
-                                meta_dict["db_name"] = db_name
-                                meta_dict["node_id"] = id_
-                                
-                                # Store valid embedding and metadata
-                                all_embeddings.append(emb_array)
-                                all_metadata.append(meta_dict)
-                            else:
-                                print(f"Skipping invalid embedding at index {i}")
-
-                        except Exception as e:
-                            print(f"Error processing embedding {i}: {str(e)}")
-                            continue
-
-                    print(f"Successfully processed {len(all_embeddings)} embeddings from {db_name}")
-
-                except Exception as e:
-                    print(f"Error accessing collection: {str(e)}")
-                    continue
+                if not results or "embeddings" not in results:
+                    print(f"No results or embeddings for {db_name}")
+                    return None
+
+                embeddings = results["embeddings"]
+                ids = results.get("ids", [f"{db_name}_{i}" for i in range(len(embeddings))])
+
+                # Validate all embeddings of the database at once
+                emb_array = np.asarray(embeddings, dtype=np.float32)
+                valid = np.any(~np.isnan(emb_array), axis=1) & np.any(~np.isinf(emb_array), axis=1)
+                for i in np.flatnonzero(~valid):
+                    print(f"Skipping invalid embedding at index {i}")
+                if not valid.all():
+                    emb_array = emb_array[valid]
+
+                metadata_list = [{"db_name": db_name, "node_id": ids[i]} for i in np.flatnonzero(valid)]
+
+                print(f"Successfully processed {len(emb_array)} embeddings from {db_name}")
+                return emb_array, metadata_list
 
             except Exception as e:
-                print(f"Error processing database {db_name}: {str(e)}")
+                print(f"Error accessing collection: {str(e)}")
+                return None
+
+        except Exception as e:
+            print(f"Error processing database {db_name}: {str(e)}")
+            return None
+
+    def _get_database(self, db_name, precision):
+        """Embeddings, metadata and statistics of one database, from the cache if current."""
+        content_hash = cacheable_hash(self.catalog.manifests(), db_name)
+        key = (content_hash, precision)
+        with self._cache_lock:
+            entry = self._embedding_cache.get(db_name)
+            if entry is not None and content_hash and entry['key'] == key:
+                self._embedding_cache.move_to_end(db_name)
+                EMBEDDING_CACHE.inc(result='hit')
+                return entry
+        EMBEDDING_CACHE.inc(result='miss')
+
+        loaded = self._load_database(db_name)
+        if loaded is None:
+            return None
+        emb_array, metadata_list = loaded
+
+        db_path = self.available_dbs[db_name]
+        stats = read_stats(db_path, content_hash)
+        if stats is None:
+            # Stores created before statistics existed; they are computed from the rows just read
+            stats = compute_stats(emb_array)
+            try:
+                write_stats(db_path, stats, content_hash)
+            except OSError as e:
+                print(f"Error writing embedding statistics for {db_name}: {str(e)}")
+
+        embeddings = emb_array if precision is None else QuantizedMatrix.from_float(emb_array, precision)
+        entry = {'key': key, 'embeddings': embeddings, 'metadata': metadata_list, 'stats': stats}
+        if content_hash:
+            with self._cache_lock:
+                self._embedding_cache[db_name] = entry
+                self._evict()
+        return entry
+
+    def _evict(self):
+        """Evict least recently used databases above EMBEDDING_CACHE_BYTES; call with the lock held."""
+        total = sum(e['embeddings'].nbytes for e in self._embedding_cache.values())
+        while total > EMBEDDING_CACHE_BYTES and len(self._embedding_cache) > 1:
+            _, evicted = self._embedding_cache.popitem(last=False)
+            total -= evicted['embeddings'].nbytes
+
+    def iter_databases(self, db_names, precision=None):
+        """(db_name, {embeddings, metadata, stats}) of each readable database, as it is read."""
+        for db_name in db_names:
+            entry = self._get_database(db_name, precision)
+            if entry is not None:
+                yield db_name, entry
+
+    def get_selection_stats(self, db_names):
+        """Combined embedding statistics of the databases from their stored files, without
+        reading embeddings; None if any database has no current statistics yet."""
+        manifests = self.catalog.manifests()
+        parts = []
+        for db_name in db_names:
+            db_path = self.available_dbs.get(db_name)
+            if db_path is None:
                 continue
+            content_hash = (manifests.get(db_name) or {}).get('content_hash')
+            stats = read_stats(db_path, content_hash) if content_hash else None
+            if stats is None:
+                return None
+            parts.append(stats)
+        return combine_stats(parts)
+
+    @traced('db_read')
+    def get_embeddings_and_metadata(self, db_names, precision=None, with_stats=False):
+        """Get embeddings and metadata from specified Chroma databases.
+
+        Returns a float32 array, or with a precision (see quantization.py) a
+        QuantizedMatrix; metadata holds the node_id and db_name of each row
+        (chunk texts are read on demand through node_details.py). Databases
+        are cached in memory per content hash, so changing the selection only
+        reads the newly selected ones. With with_stats, the combined embedding
+        statistics of the databases (see embedding_stats.py) are returned as a
+        third value.
+        """
+        entries = [entry for _, entry in self.iter_databases(db_names, precision)]
+        return self.stack_databases(entries, precision, with_stats)
+
+    def stack_databases(self, entries, precision=None, with_stats=False):
+        """Stack entries of iter_databases() as get_embeddings_and_metadata() returns them."""
+        all_embeddings = [entry['embeddings'] for entry in entries]
+        all_metadata = [m for entry in entries for m in entry['metadata']]
+        all_stats = [entry['stats'] for entry in entries]
 
         if not all_embeddings:
             print("No valid embeddings collected")
-            return None, None
+            return (None, None, None) if with_stats else (None, None)
 
         try:
             # Stack embeddings into a single array
-            stacked = np.vstack(all_embeddings)
+            if precision is None:
+                stacked = np.vstack(all_embeddings)
+            else:
+                stacked = QuantizedMatrix.concatenate(all_embeddings)
+            EMBEDDINGS_LOADED.inc(len(stacked))
             print(f"Final embeddings shape: {stacked.shape}")
+            if with_stats:
+                return stacked, all_metadata, combine_stats(all_stats)
             return stacked, all_metadata
 
         except Exception as e:
             print(f"Error stacking embeddings: {str(e)}")
-            return None, None
+            return (None, None, None) if with_stats else (None, None)
 
-    def get_database_stats(self):
-        """Get statistics about each database"""
-        stats = {}
-        for db_name in self.available_dbs.keys():
-            try:
-                db_path = self.available_dbs[db_name]
-                chroma_client = chromadb.PersistentClient(path=db_path)
-                chroma_collection = chroma_client.get_or_create_collection("pdf_index")
+    def get_knn_graph(self, db_name):
+        """Stored kNN graph of one database ({ids, indices, scores}, see knn_graph.py), or None.
 
-                results = chroma_collection.count()
-                stats[db_name] = {
-                    'embedding_count': results,
-                    'embedding_dimensions': len(chroma_collection.get(ids=[chroma_collection.peek()['ids'][0]])['embeddings'][0]) if results else 0,
-                }
-
-            except Exception as e:
-                print(f"Error analyzing database {db_name}: {str(e)}")
-                stats[db_name] = {'error': str(e)}
-
-        return stats
+        Stores created before graphs existed get theirs built and written here. Stores
+        without a complete manifest get a graph built from their current rows, without
+        reading or writing the stored one.
+        """
+        db_path = self.available_dbs.get(db_name)
+        if db_path is None:
+            return None
+        content_hash = cacheable_hash(self.catalog.manifests(), db_name)
+        if content_hash:
+            graph = read_graph(db_path, content_hash)
+            if graph is not None:
+                return graph
+        loaded = self._load_database(db_name)
+        if loaded is None:
+            return None
+        emb_array, metadata_list = loaded
+        ids = [m['node_id'] for m in metadata_list]
+        indices, scores = build_knn(emb_array)
+        if content_hash:
+            try:
+                write_graph(db_path, ids, indices, scores, content_hash)
+            except OSError as e:
+                print(f"Error writing neighbor graph for {db_name}: {str(e)}")
+        return {'ids': ids, 'indices': indices, 'scores': scores}
 
+    def get_database_stats(self):
+        """Get statistics about each database from the store manifests"""
+        return self.catalog.stats()
@@ -0,0 +1,149 @@
+"""Cached, pre-sorted table of the Zotero library for the document panel.
+
+The library is fetched and parsed once and kept in memory; it is refetched in
+the background when older than the TTL while the previous table keeps serving.
+Whether a document has a vector database is looked up from the database catalog
+at query time, so new indexes show up without refetching the library.
+"""
+import threading
+import time
+
+from fetchDocuments import clean_field, fetch_library_entries
+
+SORT_KEYS = ('title', 'year', 'author')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def parse_year_filter(value):
+    """'2020' -> (2020, 2020); '2018-2021' -> (2018, 2021); invalid -> None."""
+    try:
+        if '-' in value:
+            start, end = value.split('-', 1)
+            return int(start or 0), int(end or 9999)
+        year = int(value)
+        return year, year
+    except ValueError:
+        return None
+
+
+def parse_year(value):
+    try:
+        return int(str(value)[:4])
+    except ValueError:
+        return None
+
+
+class DocumentTable:
+    """In-memory document rows with search, filters and pagination."""
+
+    def __init__(self, vector_db_citekeys, ttl=300.0, fetch_entries=fetch_library_entries):
+        self._vector_db_citekeys = vector_db_citekeys
+        self._fetch_entries = fetch_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._rows = None
+        self._orders = {}
+        self.loaded_at = None
+        self.version = 0
+
+    def _build(self):
+        start = time.perf_counter()
+        rows = []
+        for item in self._fetch_entries():
+            citekey = item.get("ID")
+            if not citekey:
+                continue
+            title = clean_field(item.get("title", "Untitled"))
+            authors = clean_field(item.get("author", ""))
+            year = item.get("year", "")
+            rows.append({
+                "citekey": citekey,
+                "title": title,
+                "authors": authors,
+                "year": year,
+                "_year": parse_year(year),
+                "_authors": authors.lower(),
+                "_search": f"{title} {authors} {citekey} {year}".lower(),
+            })
+        orders = {
+            'title': sorted(rows, key=lambda r: r['title'].lower()),
+            'year': sorted(rows, key=lambda r: (-(r['_year'] or 0), r['title'].lower())),
+            'author': sorted(rows, key=lambda r: (r['_authors'], r['title'].lower())),
+        }
+        print(f"Loaded {len(rows)} library entries in {time.perf_counter() - start:.2f}s")
+        return rows, orders
+
+    def _refresh_in_background(self):
+        try:
+            rows, orders = self._build()
+            with self._lock:
+                self._rows, self._orders = rows, orders
+                self.loaded_at = time.time()
+                self.version += 1
+        except Exception as e:
+            print(f"Error refreshing document table: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    def ensure_loaded(self, force=False):
+        """Load the table on first use; refresh stale tables without blocking readers."""
+        if self._rows is None or force:
+            with self._lock:
+                if self._rows is None or force:
+                    self._rows, self._orders = self._build()
+                    self.loaded_at = time.time()
+                    self.version += 1
+            return
+        if time.time() - self.loaded_at > self.ttl and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, name='document-table', daemon=True).start()
+
+    def lookup(self, citekeys):
+        """Title, authors and year of the given citekeys, if the table is loaded (never fetches)."""
+        rows = self._rows or []
+        wanted = set(citekeys)
+        return {
+            row['citekey']: {'title': row['title'], 'authors': row['authors'], 'year': row['year']}
+            for row in rows if row['citekey'] in wanted
+        }
+
+    def query(self, search='', has_vector_db=None, year=None, author=None, sort='title', offset=0, limit=DEFAULT_PAGE_SIZE):
+        """Return one page of matching rows and the total number of matches."""
+        self.ensure_loaded()
+        rows = self._orders.get(sort if sort in SORT_KEYS else 'title', [])
+        vector_dbs = set(self._vector_db_citekeys())
+        search = (search or '').strip().lower()
+        author = (author or '').strip().lower()
+        year_range = parse_year_filter(year.strip()) if year and year.strip() else None
+
+        matches = []
+        for row in rows:
+            if search and search not in row['_search']:
+                continue
+            if author and author not in row['_authors']:
+                continue
+            if year_range and not (row['_year'] and year_range[0] <= row['_year'] <= year_range[1]):
+                continue
+            if has_vector_db is not None and (row['citekey'] in vector_dbs) != has_vector_db:
+                continue
+            matches.append(row)
+
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
+        page = [{
+            "citekey": row['citekey'],
+            "title": row['title'],
+            "authors": row['authors'],
+            "year": row['year'],
+            "has_vector_db": row['citekey'] in vector_dbs,
+        } for row in matches[offset:offset + limit]]
+        return {
+            'documents': page,
+            'total': len(matches),
+            'offset': offset,
+            'limit': limit,
+            'library_size': len(rows),
+            'version': self.version,
+        }
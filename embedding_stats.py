@@ -0,0 +1,74 @@
+"""Per-database embedding statistics for the visualization.
+
+Each store keeps the count, per-dimension minimum, maximum, mean and sum of
+squared deviations of its embeddings in ``embedding_stats.npz`` next to the
+Chroma files. The statistics of any selection of databases are combined from
+these in O(databases x dimensions) (Chan et al.'s parallel variance), so the 3D
+view never rescans the selected embeddings to normalize them.
+"""
+import os
+
+import numpy as np
+
+STATS_NAME = 'embedding_stats.npz'
+STATS_VERSION = 1
+
+
+def stats_path(store_path):
+    return os.path.join(store_path, STATS_NAME)
+
+
+def compute_stats(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    mean = embeddings.mean(axis=0)
+    return {
+        'count': len(embeddings),
+        'min': embeddings.min(axis=0),
+        'max': embeddings.max(axis=0),
+        'mean': mean,
+        'm2': ((embeddings - mean) ** 2).sum(axis=0),
+    }
+
+
+def combine_stats(parts):
+    """Statistics of the union of the databases the parts describe."""
+    parts = [p for p in parts if p and p['count']]
+    if not parts:
+        return None
+    count = sum(p['count'] for p in parts)
+    mean = sum(p['count'] * p['mean'] for p in parts) / count
+    m2 = sum(p['m2'] + p['count'] * (p['mean'] - mean) ** 2 for p in parts)
+    return {
+        'count': count,
+        'min': np.min([p['min'] for p in parts], axis=0),
+        'max': np.max([p['max'] for p in parts], axis=0),
+        'mean': mean,
+        'm2': m2,
+        'variance': m2 / count,
+    }
+
+
+def write_stats(store_path, stats, content_hash=None):
+    tmp_path = stats_path(store_path) + '.tmp.npz'
+    np.savez(tmp_path, version=STATS_VERSION, content_hash=str(content_hash or ''), count=stats['count'],
+             min=stats['min'], max=stats['max'], mean=stats['mean'], m2=stats['m2'])
+    os.replace(tmp_path, stats_path(store_path))
+
+
+def read_stats(store_path, content_hash=None):
+    """Stored statistics, or None if missing, outdated or written for other content."""
+    try:
+        with np.load(stats_path(store_path)) as data:
+            if int(data['version']) != STATS_VERSION:
+                return None
+            if content_hash and str(data['content_hash']) != content_hash:
+                return None
+            return {
+                'count': int(data['count']),
+                'min': data['min'],
+                'max': data['max'],
+                'mean': data['mean'],
+                'm2': data['m2'],
+            }
+    except (OSError, KeyError, ValueError):
+        return None
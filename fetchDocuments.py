@@ -5,7 +5,8 @@ import bibtexparser
 
 
 
-ZOTERO_API_URL = "http://localhost:23119/api/users/0/items?format=bibtex"
+ZOTERO_API_URL = os.environ.get('ZOTERO_API_URL', "http://localhost:23119/api/users/0/items?format=bibtex")
+ZOTERO_STORAGE_DIR = os.environ.get('ZOTERO_STORAGE_DIR', "~/Zotero/storage")
 
 
 def clean_field(field):
@@ -25,16 +26,10 @@ def fetch_document_details(citekey):
     bib_database = bibtexparser.loads(bibtex_data, parser=bibtexparser.bparser.BibTexParser(common_strings=True))
     for item in bib_database.entries:
         if item.get("ID") == citekey:
-            folder_path = extract_folder(item.get("file", ""))
-            if folder_path:
-                document_details[citekey] = {
-                    "citekey": citekey,
-                    "title": clean_field(item.get("title", "Untitled")),
-                    "item_type": item.get("itemType", item.get("ENTRYTYPE", "Unknown")),
-                    "tags": clean_field(item.get("keywords", "")).replace(",", ", "),
-                    "authors": clean_field(item.get("author", "")),
-                    "folder_path": folder_path
-                }
+            details = entry_details(item)
+            if details:
+                print(f"folder: {details['folder_path']}")
+                document_details[citekey] = details
             else:
                 print(f"No folder path found for citekey: {citekey}")
                 document_details[citekey] = None
@@ -46,13 +41,35 @@ def fetch_document_details(citekey):
     return document_details
 
 
+def entry_details(item):
+    """Metadata and attachment folder of a BibTeX entry, or None without a folder."""
+    folder_path = extract_folder(item.get("file", ""))
+    if not folder_path:
+        return None
+    return {
+        "citekey": item.get("ID"),
+        "title": clean_field(item.get("title", "Untitled")),
+        "item_type": item.get("itemType", item.get("ENTRYTYPE", "Unknown")),
+        "tags": clean_field(item.get("keywords", "")).replace(",", ", "),
+        "authors": clean_field(item.get("author", "")),
+        "folder_path": folder_path
+    }
+
+
+def fetch_library_entries():
+    """Fetches every BibTeX entry of the Zotero library; raises on HTTP errors."""
+    response = requests.get(ZOTERO_API_URL, timeout=60)
+    response.raise_for_status()
+    bibtex_data = response.content.decode("utf-8")
+    bib_database = bibtexparser.loads(bibtex_data, parser=bibtexparser.bparser.BibTexParser(common_strings=True))
+    return bib_database.entries
+
+
 def extract_folder(fileAttribute):
     """Fetch PDF attachment key from json response."""
     match = re.search(r"/Zotero/storage/(?P<item_id>[^/]+)/", fileAttribute)
     if match:
-        folder_path = os.path.expanduser(f"~/Zotero/storage/{match.group('item_id')}")
-        print(f"folder: {folder_path}")
-        return folder_path
+        return os.path.join(os.path.expanduser(ZOTERO_STORAGE_DIR), match.group('item_id'))
     return None
 
 
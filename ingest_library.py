@@ -0,0 +1,304 @@
+"""Build the vector databases of a whole Zotero library offline.
+
+Without this, a document is only indexed when it is first asked about. The
+command enumerates the library through the attachment index, skips documents
+whose store is current, and runs parse -> chunk -> embed -> write as a pipeline
+of worker threads joined by bounded queues, so one document is parsed while
+another is embedded and a third is written. Each stage has its own worker count.
+
+A store is current when it has a manifest built with the configured embedding
+model from the same PDF (stores without a recorded PDF hash are kept). Progress
+is checkpointed in a JSON file: documents that were in flight when a run was
+killed are cleared and rebuilt by the next run, documents that failed are not
+retried unless asked, and PDFs that were already parsed come from the parse
+cache. Throughput and an ETA are printed after every document.
+
+Usage:
+    python ingest_library.py                      # ingest everything missing or stale
+    python ingest_library.py --dry-run            # only list what would be ingested
+    python ingest_library.py --citekeys smith2020 doe2021 --force
+
+Works with benchmarks/fake_zotero.py in place of Zotero through ZOTERO_API_URL
+and ZOTERO_STORAGE_DIR.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+from config import APP_ROOT, ATTACHMENT_INDEX_FILE, EMBED_MODEL_NAME
+from attachment_index import AttachmentIndex
+from db_utils import (catalog, clear_vector_store, create_chunks, embed_nodes, process_document,
+                      split_nodes, write_vector_store)
+from terminal_log import get_terminal_output
+
+CHECKPOINT_FILE = os.path.join(APP_ROOT, 'data', 'ingest_checkpoint.json')
+CHECKPOINT_VERSION = 1
+STAGES = ('parse', 'chunk', 'embed', 'write')
+
+
+class Checkpoint:
+    """Documents in flight and failed documents of the last runs, saved after every change."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.in_progress = {}
+        self.failed = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CHECKPOINT_VERSION:
+                self.in_progress = data['in_progress']
+                self.failed = data['failed']
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring checkpoint {path}: {str(e)}")
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CHECKPOINT_VERSION, 'in_progress': self.in_progress, 'failed': self.failed},
+                      f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def start(self, citekey, sha256):
+        with self._lock:
+            self.in_progress[citekey] = sha256
+            self.failed.pop(citekey, None)
+            self._save()
+
+    def finish(self, citekey, error=None):
+        with self._lock:
+            sha256 = self.in_progress.pop(citekey, None)
+            if error:
+                self.failed[citekey] = {'sha256': sha256, 'error': error}
+            self._save()
+
+
+def store_state(entry, manifest, checkpoint):
+    """'current', or why the store of an attachment index entry has to be built."""
+    citekey = entry['citekey']
+    if citekey in checkpoint.in_progress:
+        return 'interrupted'
+    if manifest is None:
+        return 'missing'
+    # Pending here means another process is writing the store right now
+    if manifest.get('pending') or 'error' in manifest or not manifest.get('count'):
+        return 'incomplete'
+    if manifest.get('embed_model') != EMBED_MODEL_NAME:
+        return 'other model'
+    if manifest.get('source_sha256') and entry.get('sha256') and manifest['source_sha256'] != entry['sha256']:
+        return 'pdf changed'
+    return 'current'
+
+
+def plan(entries, checkpoint, force=False, retry_failed=False):
+    """Split index entries into jobs and skip counts."""
+    # Stores created before manifests existed are only pending until theirs is built
+    manifests = catalog.complete_manifests()
+    jobs = []
+    skipped = {}
+    for citekey in sorted(entries):
+        entry = entries[citekey]
+        if not entry.get('pdf_path'):
+            reason = 'no pdf'
+        elif not retry_failed and citekey in checkpoint.failed \
+                and checkpoint.failed[citekey].get('sha256') == entry.get('sha256'):
+            reason = 'failed before'
+        else:
+            state = store_state(entry, manifests.get(citekey), checkpoint)
+            if force or state != 'current':
+                jobs.append({'citekey': citekey, 'entry': entry, 'seconds': {},
+                             'reason': 'forced' if state == 'current' else state})
+                continue
+            reason = 'current'
+        skipped[reason] = skipped.get(reason, 0) + 1
+    return jobs, skipped
+
+
+class Progress:
+    """Counts finished documents and chunks and prints throughput and ETA."""
+
+    def __init__(self, total, verbose=False):
+        self.total = total
+        self.verbose = verbose
+        self.done = 0
+        self.failed = 0
+        self.chunks = 0
+        self.busy = {stage: 0.0 for stage in STAGES}
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def report(self, job, error=None):
+        with self._lock:
+            for stage, seconds in job['seconds'].items():
+                self.busy[stage] += seconds
+            if error:
+                self.failed += 1
+            else:
+                self.done += 1
+                self.chunks += job['count']
+            finished = self.done + self.failed
+            elapsed = max(time.perf_counter() - self.start, 1e-6)
+            rate = finished / elapsed
+            eta = (self.total - finished) / rate if rate else 0
+            result = f"FAILED: {error}" if error else f"{job['count']} chunks"
+            print(f"[{finished}/{self.total}] {job['citekey']}: {result} | "
+                  f"{rate * 60:.1f} docs/min, {self.chunks / elapsed:.1f} chunks/s | "
+                  f"ETA {time.strftime('%H:%M:%S', time.gmtime(eta))}")
+            # db_utils logs to the terminal buffer of the UI; show or drop it here
+            lines = get_terminal_output()
+            if self.verbose:
+                for line in lines:
+                    print(f"    {line}")
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        busy = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in self.busy.items())
+        print(f"Ingested {self.done} documents ({self.chunks} chunks), {self.failed} failed, "
+              f"in {elapsed:.1f}s; stage busy time: {busy}")
+
+
+def parse(job):
+    entry = job['entry']
+    job['documents'] = process_document(entry['pdf_path'], 'pdf', entry.get('sha256'))
+    if not job['documents']:
+        raise ValueError(f"Failed to process document: {entry['pdf_path']}")
+
+
+def chunk(job):
+    chunks = create_chunks(job.pop('documents'))
+    if not chunks:
+        raise ValueError("No chunks created")
+    job['nodes'] = split_nodes(chunks)
+
+
+def embed(job):
+    embed_nodes(job['nodes'])
+
+
+def write(job):
+    # Drops a stale or partly written store; no-op for new documents
+    clear_vector_store(job['citekey'])
+    nodes = job.pop('nodes')
+    write_vector_store(nodes, job['citekey'], job['entry'].get('sha256'))
+    job['count'] = len(nodes)
+
+
+class Pipeline:
+    """Stages of worker threads joined by bounded queues; a failed job leaves the pipeline."""
+
+    def __init__(self, stages, checkpoint, progress, queue_size=2):
+        self.stages = stages
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    def _work(self, index, name, func):
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.queues) else None
+        while True:
+            job = inbox.get()
+            if job is None:
+                return
+            start = time.perf_counter()
+            error = None
+            try:
+                func(job)
+            except Exception as e:
+                error = f"{name}: {str(e)}"
+            job['seconds'][name] = time.perf_counter() - start
+            if error:
+                self.checkpoint.finish(job['citekey'], error=error)
+                self.progress.report(job, error=error)
+            elif outbox is not None:
+                outbox.put(job)
+            else:
+                self.checkpoint.finish(job['citekey'])
+                self.progress.report(job)
+
+    def run(self, jobs):
+        threads = []
+        for index, (name, func, workers) in enumerate(self.stages):
+            threads.append([threading.Thread(target=self._work, args=(index, name, func),
+                                             name=f"ingest-{name}-{i}", daemon=True) for i in range(workers)])
+            for thread in threads[-1]:
+                thread.start()
+        for job in jobs:
+            self.checkpoint.start(job['citekey'], job['entry'].get('sha256'))
+            self.queues[0].put(job)  # Blocks while the parse queue is full
+        # Stop each stage once the one before it has drained
+        for index, workers in enumerate(threads):
+            for _ in workers:
+                self.queues[index].put(None)
+            for thread in workers:
+                thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the vector databases of the Zotero library")
+    parser.add_argument('--citekeys', nargs='+', help="only ingest these citekeys")
+    parser.add_argument('--limit', type=int, default=0, help="ingest at most this many documents")
+    parser.add_argument('--force', action='store_true', help="rebuild stores that are current")
+    parser.add_argument('--retry-failed', action='store_true', help="retry documents that failed before")
+    parser.add_argument('--dry-run', action='store_true', help="list the documents to ingest and stop")
+    parser.add_argument('--parse-workers', type=int, default=2)
+    parser.add_argument('--chunk-workers', type=int, default=1)
+    parser.add_argument('--embed-workers', type=int, default=1)
+    parser.add_argument('--write-workers', type=int, default=1)
+    parser.add_argument('--queue-size', type=int, default=2, help="documents waiting between two stages")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE)
+    parser.add_argument('--verbose', action='store_true', help="print the log of every document")
+    args = parser.parse_args()
+
+    attachments = AttachmentIndex(ATTACHMENT_INDEX_FILE)
+    try:
+        attachments.refresh()
+    except Exception as e:
+        if not attachments.loaded:
+            raise
+        print(f"Could not fetch the Zotero library ({str(e)}); using the saved attachment index")
+    entries = attachments.entries()
+    if args.citekeys:
+        entries = {c: entries[c] for c in args.citekeys if c in entries}
+        missing = set(args.citekeys) - set(entries)
+        if missing:
+            print(f"Not in the Zotero library: {sorted(missing)}")
+
+    checkpoint = Checkpoint(args.checkpoint)
+    jobs, skipped = plan(entries, checkpoint, force=args.force, retry_failed=args.retry_failed)
+    if args.limit:
+        jobs = jobs[:args.limit]
+    print(f"{len(entries)} documents: {len(jobs)} to ingest, skipped {skipped or 'none'}")
+    if args.dry_run:
+        for job in jobs:
+            print(f"  {job['citekey']} ({job['reason']}): {job['entry']['pdf_path']}")
+        return
+    if not jobs:
+        return
+
+    progress = Progress(len(jobs), verbose=args.verbose)
+    pipeline = Pipeline([
+        ('parse', parse, args.parse_workers),
+        ('chunk', chunk, args.chunk_workers),
+        ('embed', embed, args.embed_workers),
+        ('write', write, args.write_workers),
+    ], checkpoint, progress, queue_size=args.queue_size)
+    try:
+        pipeline.run(jobs)
+    except KeyboardInterrupt:
+        print("Interrupted; documents in flight are rebuilt by the next run")
+        raise
+    finally:
+        progress.summary()
+
+
+if __name__ == '__main__':
+    main()
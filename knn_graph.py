@@ -0,0 +1,195 @@
+"""k-nearest-neighbor graphs over chunk embeddings, drawn as threads in the 3D view.
+
+Each store keeps the cosine kNN graph of its chunks in ``knn_graph.npz`` next
+to the Chroma files; ingestion writes it and older stores get theirs on first
+use. Up to EXACT_LIMIT chunks the graph is exact and computed with blocked
+matrix products, so only BLOCK_ROWS x n similarities are held at a time.
+Larger sets use an inverted-file approximation: chunks are grouped into
+sqrt(n) k-means lists and each chunk is compared only with the members of its
+N_PROBE nearest lists, which costs O(n^1.5) instead of O(n^2).
+
+The graph of a selection of several databases merges the stored graphs with
+the neighbors found over the combined embeddings, and is sent to the client
+as an undirected edge list.
+"""
+import os
+
+import numpy as np
+
+KNN_NAME = 'knn_graph.npz'
+KNN_VERSION = 1
+# Neighbors stored per chunk; the client asks for at most this many
+KNN_K = 8
+EXACT_LIMIT = 4096
+BLOCK_ROWS = 1024
+N_PROBE = 3
+KMEANS_ITERATIONS = 5
+
+
+def knn_path(store_path):
+    return os.path.join(store_path, KNN_NAME)
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def _sorted_top_k(similarities, k):
+    """Column positions and values of the k largest similarities of each row, best first."""
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def merge_top_k(indices, scores, other_indices, other_scores, k):
+    """Best k distinct neighbors of each row from two candidate sets (-1 marks no neighbor)."""
+    merged = np.concatenate([indices, other_indices], axis=1)
+    merged_scores = np.concatenate([scores, other_scores], axis=1)
+    order = np.argsort(merged, axis=1, kind='stable')
+    merged = np.take_along_axis(merged, order, axis=1)
+    merged_scores = np.take_along_axis(merged_scores, order, axis=1)
+    duplicate = np.zeros(merged.shape, dtype=bool)
+    duplicate[:, 1:] = merged[:, 1:] == merged[:, :-1]
+    merged_scores = np.where(duplicate | (merged < 0), -np.inf, merged_scores)
+    top, top_scores = _sorted_top_k(merged_scores, k)
+    top_indices = np.take_along_axis(merged, top, axis=1)
+    return np.where(np.isfinite(top_scores), top_indices, -1).astype(np.int32), top_scores.astype(np.float32)
+
+
+def knn_exact(matrix, k):
+    """Exact neighbors of normalized rows, one block of rows at a time."""
+    n = len(matrix)
+    k = min(k, n - 1)
+    indices = np.empty((n, max(k, 0)), dtype=np.int32)
+    scores = np.empty((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+    for start in range(0, n, BLOCK_ROWS):
+        similarities = matrix[start:start + BLOCK_ROWS] @ matrix.T
+        rows = np.arange(len(similarities))
+        similarities[rows, start + rows] = -np.inf  # not its own neighbor
+        indices[start:start + len(rows)], scores[start:start + len(rows)] = _sorted_top_k(similarities, k)
+    return indices, scores
+
+
+def _nearest_lists(matrix, centroids, n):
+    lists = np.empty((len(matrix), n), dtype=np.int32)
+    for start in range(0, len(matrix), BLOCK_ROWS):
+        lists[start:start + BLOCK_ROWS] = _sorted_top_k(matrix[start:start + BLOCK_ROWS] @ centroids.T, n)[0]
+    return lists
+
+
+def kmeans_centroids(matrix, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means centroids, starting from a sample of the rows."""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_lists(matrix, centroids, 1)[:, 0]
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, matrix)
+        filled = np.bincount(assignment, minlength=n_lists) > 0
+        centroids[filled] = normalize_rows(sums[filled])
+    return centroids
+
+
+def knn_approximate(matrix, k, n_probe=N_PROBE, seed=0):
+    """Inverted-file neighbors: each row is compared with the members of its n_probe nearest lists."""
+    n = len(matrix)
+    k = min(k, n - 1)
+    n_lists = max(1, int(np.sqrt(n)))
+    centroids = kmeans_centroids(matrix, n_lists, seed=seed)
+    probes = _nearest_lists(matrix, centroids, min(n_probe, n_lists))
+
+    # Members are the rows whose nearest list it is; queries every row probing it
+    members = np.split(np.argsort(probes[:, 0], kind='stable'),
+                       np.cumsum(np.bincount(probes[:, 0], minlength=n_lists))[:-1])
+    probe_rows = np.repeat(np.arange(n, dtype=np.int32), probes.shape[1])
+    probe_order = np.argsort(probes.ravel(), kind='stable')
+    queries = np.split(probe_rows[probe_order],
+                       np.cumsum(np.bincount(probes.ravel(), minlength=n_lists))[:-1])
+
+    indices = np.full((n, k), -1, dtype=np.int32)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    for candidates, list_queries in zip(members, queries):
+        if len(candidates) == 0:
+            continue
+        candidate_matrix = matrix[candidates]
+        for start in range(0, len(list_queries), BLOCK_ROWS):
+            rows = list_queries[start:start + BLOCK_ROWS]
+            similarities = matrix[rows] @ candidate_matrix.T
+            similarities[rows[:, None] == candidates[None, :]] = -np.inf
+            top, top_scores = _sorted_top_k(similarities, min(k, len(candidates)))
+            indices[rows], scores[rows] = merge_top_k(
+                indices[rows], scores[rows], candidates[top].astype(np.int32), top_scores, k)
+    return indices, scores
+
+
+def build_knn(matrix, k=KNN_K):
+    """(indices, scores) of the k nearest neighbors of every row; exact up to EXACT_LIMIT rows."""
+    matrix = normalize_rows(matrix)
+    if len(matrix) <= EXACT_LIMIT:
+        return knn_exact(matrix, k)
+    return knn_approximate(matrix, k)
+
+
+def selection_graph(parts, matrix, n_databases, k=KNN_K):
+    """Neighbors of a selection of databases whose rows are stacked in matrix.
+
+    parts are the stored graphs as (row offset, indices, scores). A single
+    database with its stored graph is served as is; otherwise neighbors over the
+    combined rows are merged in, which adds the edges between databases.
+    """
+    n = len(matrix)
+    indices = np.full((n, k), -1, dtype=np.int32)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    for offset, part_indices, part_scores in parts:
+        width = min(k, part_indices.shape[1])
+        rows = slice(offset, offset + len(part_indices))
+        indices[rows, :width] = np.where(part_indices[:, :width] >= 0, part_indices[:, :width] + offset, -1)
+        scores[rows, :width] = part_scores[:, :width]
+    if n_databases == 1 and len(parts) == 1:
+        return indices, scores
+    combined_indices, combined_scores = build_knn(matrix, k)
+    return merge_top_k(indices, scores, combined_indices, combined_scores, k)
+
+
+def edge_list(indices, scores, k):
+    """Undirected edges (source, target, similarity) of each row's k nearest neighbors."""
+    n = len(indices)
+    k = min(k, indices.shape[1])
+    sources = np.repeat(np.arange(n, dtype=np.int64), k)
+    targets = indices[:, :k].ravel().astype(np.int64)
+    weights = scores[:, :k].ravel()
+    keep = targets >= 0
+    low = np.minimum(sources[keep], targets[keep])
+    high = np.maximum(sources[keep], targets[keep])
+    _, first = np.unique(low * n + high, return_index=True)
+    return low[first].astype(np.uint32), high[first].astype(np.uint32), weights[keep][first].astype(np.float32)
+
+
+def write_graph(store_path, ids, indices, scores, content_hash=None):
+    tmp_path = knn_path(store_path) + '.tmp.npz'
+    np.savez(tmp_path, version=KNN_VERSION, content_hash=str(content_hash or ''),
+             ids=np.asarray(ids, dtype=str), indices=indices, scores=scores)
+    os.replace(tmp_path, knn_path(store_path))
+
+
+def read_graph(store_path, content_hash=None):
+    """Stored graph ({ids, indices, scores}), or None if missing, outdated or for other content."""
+    try:
+        with np.load(knn_path(store_path)) as data:
+            if int(data['version']) != KNN_VERSION:
+                return None
+            if content_hash and str(data['content_hash']) != content_hash:
+                return None
+            return {'ids': data['ids'].tolist(), 'indices': data['indices'], 'scores': data['scores']}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def write_store_graph(store_path, ids, embeddings, content_hash=None):
+    indices, scores = build_knn(embeddings)
+    write_graph(store_path, ids, indices, scores, content_hash)
+    return {'ids': list(ids), 'indices': indices, 'scores': scores}
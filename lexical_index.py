@@ -0,0 +1,151 @@
+"""BM25 inverted index over the chunk texts of a vector database.
+
+Dense retrieval alone tends to miss exact technical terms, acronyms and equation
+names. Ingestion therefore also builds an inverted index of each store's chunks
+and writes it next to the Chroma files as ``lexical_index.json``. Stores created
+before this get theirs on first use. Loaded indexes are cached in memory per
+store and content hash; a lookup only touches the postings of the query terms,
+so it stays well under a millisecond for a single document.
+"""
+import os
+import re
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+from async_mode import native_lock
+from db_catalog import content_hash
+
+LEXICAL_INDEX_NAME = 'lexical_index.json'
+LEXICAL_INDEX_VERSION = 1
+COLLECTION_NAME = 'pdf_index'
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have he her his how i if in into is it
+its of on or our she so such than that the their them then there these they this those to was we were
+what when where which who why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords; numbers and acronyms are kept."""
+    return [t for t in TOKEN_PATTERN.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+def lexical_index_path(store_path):
+    return os.path.join(store_path, LEXICAL_INDEX_NAME)
+
+
+class LexicalIndex:
+    """BM25 scoring over postings of (chunk position, term frequency) arrays."""
+
+    def __init__(self, ids, doc_lengths, postings, content_hash=None):
+        self.ids = list(ids)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.content_hash = content_hash
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        n = len(self.ids)
+        # Precompute per-term IDF and the length normalization of every chunk
+        self._norms = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / (self.avg_length or 1.0))
+        self._postings = {}
+        for term, (docs, tfs) in postings.items():
+            docs = np.asarray(docs, dtype=np.int32)
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            self._postings[term] = (docs, np.asarray(tfs, dtype=np.float32), idf)
+
+    @classmethod
+    def build(cls, ids, texts):
+        doc_lengths = []
+        postings = {}
+        for position, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                entry = postings.setdefault(term, ([], []))
+                entry[0].append(position)
+                entry[1].append(tf)
+        return cls(ids, doc_lengths, postings, content_hash(texts))
+
+    def search(self, query, top_k=10):
+        """Return [(node_id, score)] of the top_k chunks by BM25 score."""
+        terms = [t for t in set(tokenize(query)) if t in self._postings]
+        if not terms or not self.ids:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            docs, tfs, idf = self._postings[term]
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + self._norms[docs])
+
+        matched = np.flatnonzero(scores)
+        k = min(top_k, len(matched))
+        if k == 0:
+            return []
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def to_dict(self):
+        return {
+            'version': LEXICAL_INDEX_VERSION,
+            'content_hash': self.content_hash,
+            'ids': self.ids,
+            'doc_lengths': self.doc_lengths.astype(int).tolist(),
+            'postings': {term: [docs.tolist(), tfs.astype(int).tolist()]
+                         for term, (docs, tfs, _) in self._postings.items()},
+        }
+
+    def stats(self):
+        return {'chunks': len(self.ids), 'terms': len(self._postings), 'avg_length': self.avg_length}
+
+
+def write_lexical_index(store_path, collection):
+    """Build the lexical index of a Chroma collection and write it next to the store."""
+    start = time.perf_counter()
+    result = collection.get(include=['documents'])
+    index = LexicalIndex.build(result['ids'], result['documents'])
+    tmp_path = lexical_index_path(store_path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index.to_dict(), f)
+    os.replace(tmp_path, lexical_index_path(store_path))
+    stats = index.stats()
+    print(f"Built lexical index for {os.path.basename(store_path)}: {stats['chunks']} chunks, "
+          f"{stats['terms']} terms in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def read_lexical_index(store_path):
+    try:
+        with open(lexical_index_path(store_path), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != LEXICAL_INDEX_VERSION:
+        return None
+    return LexicalIndex(data['ids'], data['doc_lengths'], data['postings'], data.get('content_hash'))
+
+
+class LexicalIndexCache:
+    """Loaded lexical indexes by store, rebuilt when the store's content hash changes."""
+
+    def __init__(self, open_client):
+        self._open_client = open_client
+        # Retrieval runs on OS threads (run_blocking), so use a real lock
+        self._lock = native_lock()
+        self._indexes = {}
+
+    def get(self, store_path, expected_hash=None):
+        with self._lock:
+            index = self._indexes.get(store_path)
+            if index is not None and (expected_hash is None or index.content_hash == expected_hash):
+                return index
+            index = read_lexical_index(store_path)
+            if index is None or (expected_hash is not None and index.content_hash != expected_hash):
+                collection = self._open_client(store_path).get_collection(name=COLLECTION_NAME)
+                index = write_lexical_index(store_path, collection)
+            self._indexes[store_path] = index
+            return index
@@ -0,0 +1,176 @@
+"""Library-wide semantic search across every vector database.
+
+Chat retrieval only looks at the documents the user selected. This module keeps
+the embeddings of all stores in one in-memory matrix (L2-normalized, one row per
+chunk) so a query is embedded once and scored against the whole library with a
+single matrix-vector product. Stores are (re)loaded only when their manifest
+changes, so after the first search the cost per query is the product plus a
+top-k selection, which grows linearly and stays in the milliseconds for
+hundreds of thousands of chunks. The matrix can be held as float16 or int8
+(see quantization.py) to cut its memory by 2 or 4 times.
+"""
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from async_mode import ASYNC_MODE, native_lock
+from quantization import QuantizedMatrix
+
+COLLECTION_NAME = 'pdf_index'
+LOAD_WORKERS = 8
+
+
+def store_version(manifest):
+    """Identifies the content of a store; a change means its rows must be reloaded."""
+    return manifest.get('content_hash'), manifest.get('count'), manifest.get('mtime')
+
+
+class LibraryIndex:
+    """Consolidated embedding matrix of all stores listed in a DatabaseCatalog."""
+
+    def __init__(self, catalog, open_client, precision='float32'):
+        self.catalog = catalog
+        self._open_client = open_client
+        self.precision = precision
+        # Searches run on OS threads (run_blocking), so use a real lock
+        self._lock = native_lock()
+        self._blocks = {}
+        self._matrix = None
+        self._row_ids = None
+        self._row_store = None
+        self._store_citekeys = []
+
+    def _load_block(self, citekey, path, version):
+        collection = self._open_client(path).get_collection(name=COLLECTION_NAME)
+        result = collection.get(include=['embeddings'])
+        embeddings = np.asarray(result['embeddings'], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings = QuantizedMatrix.from_float(embeddings / norms, self.precision)
+        return {'version': version, 'ids': list(result['ids']), 'embeddings': embeddings}
+
+    def _load_blocks(self, stale, paths, manifests):
+        def load(citekey):
+            try:
+                return citekey, self._load_block(citekey, paths[citekey], store_version(manifests[citekey]))
+            except Exception as e:
+                print(f"Error loading {citekey} into the library index: {str(e)}")
+                return citekey, None
+
+        # Green threads cannot be started from the OS thread a search runs on
+        if ASYNC_MODE != 'threading' or len(stale) < 2:
+            return [load(citekey) for citekey in stale]
+        # The first store is opened alone: it may import chromadb, which is not
+        # safe to do from several threads at once
+        results = [load(stale[0])]
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+            results.extend(pool.map(load, stale[1:]))
+        return results
+
+    def _build_matrix(self):
+        blocks = {ck: b for ck, b in self._blocks.items() if len(b['ids'])}
+        if not blocks:
+            self._matrix, self._row_ids, self._row_store, self._store_citekeys = None, None, None, []
+            return
+        # Stores embedded with a different model cannot be compared with the rest
+        dims = Counter(b['embeddings'].shape[1] for b in blocks.values()).most_common(1)[0][0]
+        skipped = sorted(ck for ck, b in blocks.items() if b['embeddings'].shape[1] != dims)
+        if skipped:
+            print(f"Library index skips stores with dimensions other than {dims}: {skipped}")
+        citekeys = sorted(ck for ck in blocks if ck not in skipped)
+        self._store_citekeys = citekeys
+        self._matrix = QuantizedMatrix.concatenate([blocks[ck]['embeddings'] for ck in citekeys])
+        self._row_ids = np.concatenate([np.asarray(blocks[ck]['ids'], dtype=object) for ck in citekeys])
+        self._row_store = np.concatenate([
+            np.full(len(blocks[ck]['ids']), i, dtype=np.int32) for i, ck in enumerate(citekeys)
+        ])
+        # Point the blocks at their rows of the matrix so embeddings are held only once
+        offset = 0
+        for ck in citekeys:
+            n = len(blocks[ck]['ids'])
+            blocks[ck]['embeddings'] = self._matrix.rows(offset, offset + n)
+            offset += n
+
+    def refresh(self):
+        """Load new or changed stores and drop removed ones; returns the number of stores loaded."""
+        manifests = self.catalog.manifests()
+        paths = self.catalog.paths()
+        wanted = {
+            ck: m for ck, m in manifests.items()
+            if ck in paths and not m.get('pending') and 'error' not in m and m.get('count')
+        }
+        with self._lock:
+            stale = [ck for ck, m in wanted.items()
+                     if self._blocks.get(ck, {}).get('version') != store_version(m)]
+            removed = [ck for ck in self._blocks if ck not in wanted]
+            if not stale and not removed:
+                return 0
+            start = time.perf_counter()
+            for citekey, block in self._load_blocks(stale, paths, wanted):
+                if block is not None:
+                    self._blocks[citekey] = block
+            for citekey in removed:
+                del self._blocks[citekey]
+            self._build_matrix()
+            rows = 0 if self._matrix is None else len(self._matrix)
+            print(f"Library index: loaded {len(stale)} stores, dropped {len(removed)}, "
+                  f"{rows} chunks in {time.perf_counter() - start:.2f}s")
+            return len(stale)
+
+    def search(self, query_embedding, top_k=20, citekeys=None):
+        """Return [(node_id, citekey, score)] of the top_k chunks by cosine similarity."""
+        with self._lock:
+            matrix, row_ids, row_store, store_citekeys = (
+                self._matrix, self._row_ids, self._row_store, self._store_citekeys)
+        if matrix is None:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != matrix.shape[1]:
+            raise ValueError(f"Query has {query.shape[0]} dimensions, the library index {matrix.shape[1]}")
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        scores = matrix.dot(query)
+        if citekeys:
+            wanted = set(citekeys)
+            allowed = [i for i, ck in enumerate(store_citekeys) if ck in wanted]
+            scores = np.where(np.isin(row_store, allowed), scores, -np.inf)
+
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(row_ids[i], store_citekeys[row_store[i]], float(scores[i]))
+                for i in top if np.isfinite(scores[i])]
+
+    def fetch_texts(self, hits):
+        """Return {node_id: text} for the hits, read from their stores."""
+        by_store = {}
+        for node_id, citekey, _ in hits:
+            by_store.setdefault(citekey, []).append(node_id)
+        paths = self.catalog.paths()
+        texts = {}
+        for citekey, ids in by_store.items():
+            try:
+                collection = self._open_client(paths[citekey]).get_collection(name=COLLECTION_NAME)
+                result = collection.get(ids=ids, include=['documents'])
+                texts.update(zip(result['ids'], result['documents']))
+            except Exception as e:
+                print(f"Error reading hits from {citekey}: {str(e)}")
+        return texts
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self._store_citekeys),
+                'chunks': 0 if self._matrix is None else int(self._matrix.shape[0]),
+                'dims': 0 if self._matrix is None else int(self._matrix.shape[1]),
+                'precision': self.precision,
+                'memory_bytes': 0 if self._matrix is None else self._matrix.nbytes,
+                'float32_bytes': 0 if self._matrix is None else self._matrix.float32_nbytes,
+            }
@@ -0,0 +1,39 @@
+"""Pool of LMStudio clients keyed by model name.
+
+Request handlers get their LLM from the pool and pass it explicitly to query
+engines instead of assigning llama-index's global ``Settings.llm``, so concurrent
+requests for different models never see each other's client. The clients
+themselves (lmstudio_client.PooledLMStudio) are created by the factory on first
+use, so importing the pool does not import the LMStudio integration.
+"""
+import threading
+from typing import Any, Callable, Dict
+
+
+class LLMPool:
+    """Thread-safe cache of LLM clients, created on first use per model name."""
+
+    def __init__(self, factory: Callable[[str], Any]):
+        self._factory = factory
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str) -> Any:
+        with self._lock:
+            client = self._clients.get(model_name)
+            if client is None:
+                client = self._factory(model_name)
+                self._clients[model_name] = client
+            return client
+
+    def models(self):
+        with self._lock:
+            return list(self._clients)
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            if hasattr(client, 'close'):
+                client.close()
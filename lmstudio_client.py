@@ -0,0 +1,99 @@
+"""LMStudio client that reuses keep-alive HTTP connections between calls."""
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import nullcontext
+from typing import Any, Sequence
+
+import httpx
+from httpx import Timeout
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse
+from llama_index.core.llms.callbacks import llm_chat_callback
+from llama_index.llms.lmstudio import LMStudio
+
+from scheduler import AdmissionRejected, current_request, llm_slot
+
+# Keep-alive limits per model; LMStudio serves a handful of requests at a time
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 8
+KEEPALIVE_EXPIRY = 120.0
+
+
+class PooledLMStudio(LMStudio):
+    """LMStudio client that reuses keep-alive HTTP connections between calls.
+
+    The upstream client opens and closes an httpx.Client for every request; this
+    one keeps a single connection pool per instance (and one per event loop for
+    async calls). When a scheduler is given, every call waits for an LMStudio slot.
+    """
+
+    _http_client: Any = PrivateAttr(default=None)
+    _async_http_clients: Any = PrivateAttr(default=None)
+    _client_lock: Any = PrivateAttr(default=None)
+    _scheduler: Any = PrivateAttr(default=None)
+
+    def __init__(self, scheduler: Any = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._client_lock = threading.Lock()
+        self._async_http_clients = weakref.WeakKeyDictionary()
+        self._scheduler = scheduler
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+
+    def _get_http_client(self) -> httpx.Client:
+        with self._client_lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(timeout=Timeout(self.request_timeout), limits=self._limits())
+            return self._http_client
+
+    def _get_async_http_client(self) -> httpx.AsyncClient:
+        # httpx.AsyncClient is bound to the loop it was first used on
+        loop = asyncio.get_running_loop()
+        with self._client_lock:
+            client = self._async_http_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(timeout=Timeout(self.request_timeout), limits=self._limits())
+                self._async_http_clients[loop] = client
+            return client
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        payload = self._create_payload_from_messages(messages, **kwargs)
+        with llm_slot(self._scheduler) if self._scheduler else nullcontext():
+            response = self._get_http_client().post(url=f"{self.base_url}/chat/completions", json=payload)
+        response.raise_for_status()
+        return self._create_chat_response_from_http_response(response)
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        payload = self._create_payload_from_messages(messages, **kwargs)
+        if self._scheduler is None:
+            response = await self._get_async_http_client().post(url=f"{self.base_url}/chat/completions", json=payload)
+        else:
+            state = current_request()
+            try:
+                # Waiting for a slot blocks, so keep it off the event loop
+                await asyncio.to_thread(self._scheduler.acquire, state['priority'], state['deadline'])
+            except AdmissionRejected as e:
+                state['rejection'] = e
+                raise
+            start = time.monotonic()
+            try:
+                response = await self._get_async_http_client().post(url=f"{self.base_url}/chat/completions", json=payload)
+            finally:
+                self._scheduler.release(time.monotonic() - start)
+        response.raise_for_status()
+        return self._create_chat_response_from_http_response(response)
+
+    def close(self) -> None:
+        with self._client_lock:
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
@@ -0,0 +1,228 @@
+"""Lightweight tracing spans and Prometheus text-format metrics.
+
+Kept free of Flask/llama-index imports so that app.py and db_utils.py can both
+import it without creating a circular dependency.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency buckets in seconds, covering fast DB reads up to the 400s LLM timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, dict(state, counts=list(state['counts'])))
+                           for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process and renders them for /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    'semanticyarn_stage_duration_seconds', 'Latency of traced request stages', ['stage'])
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    'semanticyarn_stage_in_flight', 'Number of traced stages currently executing', ['stage'])
+STAGE_ERRORS = REGISTRY.counter(
+    'semanticyarn_stage_errors_total', 'Traced stages that raised an exception', ['stage'])
+INDEX_CACHE = REGISTRY.counter(
+    'semanticyarn_index_cache_total', 'get_or_create_index lookups by outcome', ['result'])
+EMBEDDING_CACHE = REGISTRY.counter(
+    'semanticyarn_embedding_cache_total', 'Per-database embedding cache lookups by outcome', ['result'])
+NODE_CACHE = REGISTRY.counter(
+    'semanticyarn_node_cache_total', 'Chunk detail lookups for the 3D view by outcome', ['result'])
+PARSE_CACHE = REGISTRY.counter(
+    'semanticyarn_parse_cache_total', 'Parsed PDF cache lookups by outcome', ['result'])
+ATTACHMENT_INDEX = REGISTRY.counter(
+    'semanticyarn_attachment_index_total', 'Citekey attachment lookups by outcome', ['result'])
+LLM_TOKENS = REGISTRY.counter(
+    'semanticyarn_llm_tokens_total', 'Tokens reported by LMStudio', ['model', 'kind'])
+LLM_CALLS = REGISTRY.counter(
+    'semanticyarn_llm_calls_total', 'Completed LLM calls', ['model'])
+RETRIEVED_NODES = REGISTRY.counter(
+    'semanticyarn_retrieved_nodes_total', 'Nodes returned by retrieval', ['context'])
+EMBEDDINGS_LOADED = REGISTRY.counter(
+    'semanticyarn_embeddings_loaded_total', 'Embeddings read from Chroma for visualization')
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'semanticyarn_http_in_flight', 'HTTP requests currently being served', ['endpoint'])
+CHAT_COALESCED = REGISTRY.counter(
+    'semanticyarn_chat_coalesced_total', 'Chat requests answered by an identical in-flight request', ['mode'])
+
+
+@contextmanager
+def span(stage):
+    """Time a stage of request handling and record it in the stage histogram."""
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+        STAGE_IN_FLIGHT.dec(stage=stage)
+
+
+def traced(stage):
+    """Decorator form of span()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_prometheus():
+    """Return all registered metrics in Prometheus text exposition format."""
+    return REGISTRY.render()
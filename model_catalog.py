@@ -0,0 +1,108 @@
+"""Cached catalog of LMStudio models with a background refresh and health probe.
+
+Listing models used to be a synchronous LMStudio call on every page load, which
+stalls while LMStudio is busy generating. The catalog polls LMStudio in a
+background thread, keeps the last good model list in memory and records how
+quickly LMStudio answered so the UI can show its health.
+"""
+import threading
+import time
+
+import requests
+
+from metrics import REGISTRY
+
+LMSTUDIO_UP = REGISTRY.gauge(
+    'semanticyarn_lmstudio_up', 'Whether the last LMStudio probe succeeded')
+LMSTUDIO_PROBE_LATENCY = REGISTRY.histogram(
+    'semanticyarn_lmstudio_probe_seconds', 'Latency of the LMStudio /models probe')
+
+
+class ModelCatalog:
+    """Model list refreshed every `ttl` seconds; reads never touch the network.
+
+    `models` is updated in place so callers holding a reference to the list
+    (such as app.AVAILABLE_MODELS) always see the latest catalog.
+    """
+
+    def __init__(self, base_url, models, ttl=60.0, timeout=5.0, slow_threshold=2.0):
+        self.base_url = base_url
+        self.models = models
+        self.ttl = ttl
+        self.timeout = timeout
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.loaded = False
+        self.updated_at = None
+        self.health = {'status': 'unknown', 'latency_ms': None, 'checked_at': None, 'error': None}
+
+    def refresh(self):
+        """Probe LMStudio once and update the model list and health."""
+        start = time.perf_counter()
+        error = None
+        models = None
+        try:
+            response = requests.get(f"{self.base_url}/models", timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json().get('data')
+            if isinstance(data, list):
+                models = [model['id'] for model in data if 'id' in model]
+            if not models:
+                error = 'LMStudio returned no models'
+        except Exception as e:
+            error = str(e)
+        latency = time.perf_counter() - start
+        LMSTUDIO_PROBE_LATENCY.observe(latency)
+
+        with self._lock:
+            if models:
+                self.models[:] = models
+                self.loaded = True
+                self.updated_at = time.time()
+            if error:
+                status = 'down'
+            elif latency > self.slow_threshold:
+                status = 'slow'
+            else:
+                status = 'ok'
+            self.health = {
+                'status': status,
+                'latency_ms': round(latency * 1000, 1),
+                'checked_at': time.time(),
+                'error': error,
+            }
+        LMSTUDIO_UP.set(0 if error else 1)
+        if error:
+            print(f"LMStudio probe failed after {latency:.2f}s: {error}")
+        return not error
+
+    def _run(self):
+        while True:
+            self.refresh()
+            # Retry sooner while LMStudio has never answered
+            self._wake.wait(self.ttl if self.loaded else min(self.ttl, 5.0))
+            self._wake.clear()
+
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='model-catalog', daemon=True)
+                self._thread.start()
+
+    def request_refresh(self):
+        """Ask the background thread to refresh now instead of waiting for the TTL."""
+        self._wake.set()
+
+    def snapshot(self):
+        with self._lock:
+            age = time.time() - self.updated_at if self.updated_at else None
+            return {
+                'models': list(self.models),
+                'loaded': self.loaded,
+                'age_seconds': age,
+                'stale': age is None or age > self.ttl * 2,
+                'health': dict(self.health),
+            }
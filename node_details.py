@@ -0,0 +1,82 @@
+"""Text and metadata of single chunks, fetched on demand for the 3D view.
+
+The visualization response carries only node ids and database indexes; the
+client asks for a chunk's text and metadata when the user hovers or clicks its
+point. Lookups are batched into one Chroma read per store and kept in an LRU
+cache keyed by the store's content hash, so showing a point again never reads
+the store and a re-indexed store never serves stale text.
+"""
+import json
+from collections import OrderedDict
+
+from async_mode import native_lock
+from db_catalog import cacheable_hash
+from metrics import NODE_CACHE
+
+COLLECTION_NAME = 'pdf_index'
+# Chunks whose details are kept in memory
+MAX_CACHED_NODES = 4096
+# llama-index bookkeeping stored with every chunk; not shown to the user
+INTERNAL_KEYS = frozenset(('_node_content', '_node_type', 'doc_id', 'document_id', 'ref_doc_id'))
+
+
+def node_details(text, metadata):
+    """Display fields of a chunk from its Chroma document and metadata."""
+    metadata = metadata or {}
+    if text is None and metadata.get('_node_content'):
+        try:
+            text = json.loads(metadata['_node_content']).get('text')
+        except ValueError:
+            text = None
+    return {
+        'text': text or '',
+        'metadata': {k: v for k, v in metadata.items() if k not in INTERNAL_KEYS},
+    }
+
+
+class NodeDetailsCache:
+    """Chunk details by (database, node id), least recently used evicted first."""
+
+    def __init__(self, catalog, open_client, max_nodes=MAX_CACHED_NODES):
+        self._catalog = catalog
+        self._open_client = open_client
+        self.max_nodes = max_nodes
+        # Lookups run on OS threads (run_blocking), so use a real lock
+        self._lock = native_lock()
+        self._nodes = OrderedDict()
+
+    def get_many(self, nodes):
+        """{(database, node_id): details} for the found nodes of [(database, node_id)]."""
+        manifests = self._catalog.manifests()
+        paths = self._catalog.paths()
+        found = {}
+        missing = {}
+        with self._lock:
+            for database, node_id in nodes:
+                content_hash = cacheable_hash(manifests, database)
+                key = (database, content_hash, node_id)
+                if content_hash and key in self._nodes:
+                    self._nodes.move_to_end(key)
+                    found[(database, node_id)] = self._nodes[key]
+                elif database in paths:
+                    missing.setdefault(database, []).append(node_id)
+        NODE_CACHE.inc(len(found), result='hit')
+        NODE_CACHE.inc(sum(len(ids) for ids in missing.values()), result='miss')
+
+        for database, node_ids in missing.items():
+            try:
+                collection = self._open_client(paths[database]).get_collection(name=COLLECTION_NAME)
+                result = collection.get(ids=node_ids, include=['documents', 'metadatas'])
+            except Exception as e:
+                print(f"Error reading chunk details from {database}: {str(e)}")
+                continue
+            content_hash = cacheable_hash(manifests, database)
+            with self._lock:
+                for node_id, text, metadata in zip(result['ids'], result['documents'], result['metadatas']):
+                    details = node_details(text, metadata)
+                    found[(database, node_id)] = details
+                    if content_hash:
+                        self._nodes[(database, content_hash, node_id)] = details
+                while len(self._nodes) > self.max_nodes:
+                    self._nodes.popitem(last=False)
+        return found
@@ -0,0 +1,112 @@
+"""Parsed PDF pages, cached on disk by file content and parser version.
+
+Converting a PDF to markdown with pymupdf4llm is the slowest step of ingestion
+that does not depend on chunking or embedding, so each conversion is kept as a
+gzip-compressed JSON file of per-page markdown and metadata, named after the
+SHA-256 of the PDF bytes and the pymupdf4llm/PyMuPDF versions. Re-chunking or
+re-embedding a document reads this file instead of parsing the PDF again; a
+renamed or moved PDF still hits, and upgrading the parser misses.
+
+Files are touched on every hit, and the least recently used are deleted once
+the cache exceeds its size limit.
+"""
+import gzip
+import hashlib
+import json
+import os
+from importlib import metadata as package_metadata
+
+from async_mode import native_lock
+from metrics import PARSE_CACHE
+
+PARSE_CACHE_VERSION = 1
+HASH_BLOCK_BYTES = 1024 * 1024
+PARSER_PACKAGES = ('pymupdf4llm', 'pymupdf')
+
+
+def parser_version():
+    """Versions of the packages whose output is cached, without importing them."""
+    versions = []
+    for package in PARSER_PACKAGES:
+        try:
+            versions.append(f"{package} {package_metadata.version(package)}")
+        except package_metadata.PackageNotFoundError:
+            versions.append(f"{package} missing")
+    return f"v{PARSE_CACHE_VERSION}; " + '; '.join(versions)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Per-page markdown of parsed PDFs in a directory bounded to max_bytes."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.parser = parser_version()
+        # Ingestion runs on OS threads (run_blocking), so use a real lock
+        self._lock = native_lock()
+
+    def key(self, file_path, sha256=None):
+        """Cache key of a PDF: its content hash (computed unless given) and the parser version."""
+        parser = hashlib.sha1(self.parser.encode('utf-8')).hexdigest()[:12]
+        return f"{sha256 or file_hash(file_path)}-{parser}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key):
+        """[{text, metadata}] of each page, or None if the PDF was not parsed with this parser."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != PARSE_CACHE_VERSION or data.get('parser') != self.parser:
+                raise ValueError('outdated entry')
+            os.utime(path)  # Most recently used
+        except (OSError, ValueError) as e:
+            if os.path.exists(path):
+                print(f"Discarding parse cache entry {key}: {str(e)}")
+            PARSE_CACHE.inc(result='miss')
+            return None
+        PARSE_CACHE.inc(result='hit')
+        return data['pages']
+
+    def put(self, key, pages):
+        """Store [{text, metadata}] of each page, then evict down to max_bytes."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'version': PARSE_CACHE_VERSION, 'parser': self.parser, 'pages': pages}, f,
+                      ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries while the cache exceeds max_bytes."""
+        with self._lock:
+            try:
+                entries = []
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith('.json.gz'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                return
+            total = sum(size for _, size, _ in entries)
+            # Keep the newest entry even if it alone exceeds the limit
+            for _, size, path in sorted(entries)[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,143 @@
+"""Compact in-memory embedding matrices.
+
+Embeddings are held as float32 (4 bytes per value), float16 (2 bytes) or int8
+(1 byte) with a per-dimension scale. Only the in-memory copies used for library
+search and visualization are quantized; the Chroma stores keep full precision.
+Products with a query vector are computed in row chunks, so a float32 copy of
+the whole matrix is never materialized. int8 is the faster of the two compact
+formats: NumPy converts float16 to float32 slowly, so float16 search costs
+roughly ten times a float32 product while int8 costs about twice as much.
+
+quantization_report measures the reconstruction error and the top-k recall of a
+quantized matrix against float32.
+"""
+import numpy as np
+
+PRECISIONS = ('float32', 'float16', 'int8')
+INT8_MAX = 127
+# Rows converted to float32 at a time when multiplying a quantized matrix; small
+# enough for the conversion buffer to stay in cache
+CHUNK_ROWS = 4096
+
+
+class QuantizedMatrix:
+    """Row-major embedding matrix stored at a given precision."""
+
+    def __init__(self, data, precision='float32', scale=None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported precision: {precision} (expected one of {PRECISIONS})")
+        self.data = data
+        self.precision = precision
+        self.scale = scale
+
+    @classmethod
+    def from_float(cls, matrix, precision='float32'):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if precision == 'float32':
+            return cls(matrix, precision)
+        if precision == 'float16':
+            return cls(matrix.astype(np.float16), precision)
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported precision: {precision} (expected one of {PRECISIONS})")
+        # Symmetric int8 codes with one scale per dimension
+        scale = np.abs(matrix).max(axis=0) / INT8_MAX if len(matrix) else np.ones(matrix.shape[1], np.float32)
+        scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(matrix / scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+        return cls(codes, precision, scale)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Stack matrices of the same precision; int8 parts are rescaled to a common scale."""
+        precision = parts[0].precision
+        if any(p.precision != precision for p in parts):
+            raise ValueError("Cannot concatenate matrices of different precisions")
+        if precision != 'int8':
+            return cls(np.vstack([p.data for p in parts]), precision)
+        scale = np.max([p.scale for p in parts], axis=0)
+        codes = []
+        for p in parts:
+            if np.array_equal(p.scale, scale):
+                codes.append(p.data)
+            else:
+                # One extra rounding step, only in dimensions where the scale grew
+                codes.append(np.rint(p.data.astype(np.float32) * (p.scale / scale)).astype(np.int8))
+        return cls(np.vstack(codes), precision, scale)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return int(self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0))
+
+    @property
+    def float32_nbytes(self):
+        return int(self.data.size * 4)
+
+    def rows(self, start, end):
+        """View of a range of rows sharing this matrix's scale."""
+        return QuantizedMatrix(self.data[start:end], self.precision, self.scale)
+
+    def dequantize(self, columns=None):
+        """float32 values of all columns, or only of the given column indices."""
+        data = self.data if columns is None else self.data[:, columns]
+        values = data.astype(np.float32)
+        if self.scale is not None:
+            values *= self.scale if columns is None else self.scale[columns]
+        return values
+
+    def dot(self, vector):
+        """Matrix-vector product in float32."""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.precision == 'float32':
+            return self.data @ vector
+        if self.scale is not None:
+            vector = vector * self.scale
+        out = np.empty(len(self.data), dtype=np.float32)
+        buffer = np.empty((min(CHUNK_ROWS, len(self.data)), self.data.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.data), CHUNK_ROWS):
+            part = self.data[start:start + CHUNK_ROWS]
+            chunk = buffer[:len(part)]
+            chunk[...] = part
+            np.matmul(chunk, vector, out=out[start:start + len(part)])
+        return out
+
+
+def quantization_report(matrix, precision, top_k=10, queries=None, sample=200, seed=0):
+    """Compare a quantized copy of matrix with float32: memory, error and top-k recall.
+
+    Without queries, a sample of (normalized) rows of the matrix is used.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    quantized = QuantizedMatrix.from_float(matrix, precision)
+    error = np.abs(quantized.dequantize() - matrix)
+
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        queries = matrix[rng.choice(len(matrix), size=min(sample, len(matrix)), replace=False)]
+    queries = np.asarray(queries, dtype=np.float32)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    k = min(top_k, len(matrix))
+    recalls = []
+    for query in queries:
+        exact = np.argpartition(-(matrix @ query), k - 1)[:k]
+        approx = np.argpartition(-quantized.dot(query), k - 1)[:k]
+        recalls.append(len(np.intersect1d(exact, approx)) / k)
+
+    return {
+        'precision': precision,
+        'rows': int(matrix.shape[0]),
+        'dims': int(matrix.shape[1]),
+        'bytes': quantized.nbytes,
+        'float32_bytes': int(matrix.nbytes),
+        'compression': matrix.nbytes / quantized.nbytes,
+        'mean_abs_error': float(error.mean()),
+        'max_abs_error': float(error.max()),
+        'relative_error': float(np.linalg.norm(error) / max(np.linalg.norm(matrix), 1e-12)),
+        f'recall_at_{k}': float(np.mean(recalls)),
+    }
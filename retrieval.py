@@ -0,0 +1,172 @@
+"""Hybrid retrieval: vector similarity fused with BM25 by reciprocal rank fusion.
+
+Each source is a vector index with the lexical index of its store. Both
+retrievers return a candidate list per source; candidates are ranked by score
+across all sources within each list and fused as
+
+    score = (1 - w) / (k + vector_rank) + w / (k + lexical_rank)
+
+where w is the lexical weight. Chunks found only by BM25 are read from their
+vector store so the response synthesizer receives their text and metadata.
+
+Neighbouring semantic chunks are often near-duplicates, and with the refine
+response mode each of them costs an LLM call. MMRPostprocessor therefore picks
+a diverse top-k from an over-fetched candidate list by maximal marginal
+relevance, using the chunk embeddings stored in Chroma.
+"""
+from typing import Optional
+
+import numpy as np
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+
+RRF_K = 60
+# Each retriever returns this many times top_k candidates before fusion
+CANDIDATE_FACTOR = 3
+# Candidates retrieved per chunk kept by MMR
+MMR_CANDIDATE_FACTOR = 3
+
+
+def reciprocal_rank_fusion(vector_ranking, lexical_ranking, lexical_weight, k=RRF_K):
+    """Fuse two rankings of node ids; returns {node_id: fused score}."""
+    fused = {}
+    for rank, node_id in enumerate(vector_ranking):
+        fused[node_id] = fused.get(node_id, 0.0) + (1 - lexical_weight) / (k + rank + 1)
+    for rank, node_id in enumerate(lexical_ranking):
+        fused[node_id] = fused.get(node_id, 0.0) + lexical_weight / (k + rank + 1)
+    return fused
+
+
+class HybridRetriever(BaseRetriever):
+    """Retrieve from one or more (vector index, lexical index) sources with RRF."""
+
+    def __init__(self, sources, similarity_top_k=9, lexical_weight=0.5, attach_embeddings=False):
+        self._sources = sources
+        self._top_k = similarity_top_k
+        self._lexical_weight = lexical_weight
+        self._attach_embeddings = attach_embeddings
+        super().__init__()
+
+    def _retrieve(self, query_bundle):
+        candidates = self._top_k * CANDIDATE_FACTOR
+        vector_hits = []   # (score, node_with_score)
+        lexical_hits = []  # (score, node_id, source)
+        node_sources = {}  # node_id -> index it came from
+        for index, lexical_index in self._sources:
+            retriever = index.as_retriever(similarity_top_k=candidates)
+            for n in retriever.retrieve(query_bundle):
+                vector_hits.append((n.score or 0.0, n))
+                node_sources[n.node.node_id] = index
+            if lexical_index is not None and self._lexical_weight > 0:
+                lexical_hits.extend((score, node_id, index)
+                                    for node_id, score in lexical_index.search(query_bundle.query_str, candidates))
+
+        vector_hits.sort(key=lambda hit: hit[0], reverse=True)
+        lexical_hits.sort(key=lambda hit: hit[0], reverse=True)
+        nodes = {n.node.node_id: n.node for _, n in vector_hits}
+        fused = reciprocal_rank_fusion(
+            [n.node.node_id for _, n in vector_hits],
+            [node_id for _, node_id, _ in lexical_hits],
+            self._lexical_weight,
+        )
+        top = sorted(fused, key=fused.get, reverse=True)[:self._top_k]
+
+        # Read the chunks only BM25 found from their stores
+        missing = {}
+        for _, node_id, index in lexical_hits:
+            node_sources.setdefault(node_id, index)
+            if node_id in top and node_id not in nodes:
+                missing.setdefault(id(index), (index, []))[1].append(node_id)
+        for index, node_ids in missing.values():
+            for node in index.vector_store.get_nodes(node_ids=node_ids):
+                nodes[node.node_id] = node
+
+        results = [NodeWithScore(node=nodes[node_id], score=fused[node_id])
+                   for node_id in top if node_id in nodes]
+        if self._attach_embeddings:
+            self._load_embeddings(results, node_sources)
+        return results
+
+    def _load_embeddings(self, results, node_sources):
+        """Set node.embedding from the stores, one Chroma read per document."""
+        by_source = {}
+        for n in results:
+            if n.node.embedding is None and n.node.node_id in node_sources:
+                index = node_sources[n.node.node_id]
+                by_source.setdefault(id(index), (index, []))[1].append(n.node)
+        for index, source_nodes in by_source.values():
+            try:
+                stored = index.vector_store.client.get(
+                    ids=[node.node_id for node in source_nodes], include=['embeddings'])
+                embeddings = dict(zip(stored['ids'], stored['embeddings']))
+                for node in source_nodes:
+                    if node.node_id in embeddings:
+                        node.embedding = list(embeddings[node.node_id])
+            except Exception as e:
+                print(f"Error reading chunk embeddings for MMR: {str(e)}")
+
+
+def mmr_select(relevance, embeddings, top_k, lambda_mult=0.7, duplicate_threshold=None):
+    """Greedy maximal marginal relevance; returns the positions of the selected rows.
+
+    relevance is scaled to [0, 1]; similarities between candidates come from a
+    single cosine similarity matrix, and each step updates every candidate's
+    maximum similarity to the selection in one vectorized operation. Candidates
+    at least duplicate_threshold similar to a selected row are never selected,
+    so fewer than top_k rows may be returned.
+    """
+    n = len(relevance)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n)
+
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    similarity = embeddings @ embeddings.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    for _ in range(min(top_k, n) - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        if duplicate_threshold is not None:
+            scores[max_similarity >= duplicate_threshold] = -np.inf
+        chosen = int(np.argmax(scores))
+        if not np.isfinite(scores[chosen]):
+            break
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+    return selected
+
+
+class MMRPostprocessor(BaseNodePostprocessor):
+    """Keep a diverse top_k of the retrieved nodes by maximal marginal relevance.
+
+    Relevance is the retrieval score. Near-duplicates of a kept node (cosine
+    similarity of at least duplicate_threshold) are dropped even if that leaves
+    fewer than top_k nodes. Nodes without an embedding are kept in score order
+    after the diversified selection.
+    """
+
+    top_k: int = 9
+    lambda_mult: float = 0.7
+    duplicate_threshold: float = 0.95
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MMRPostprocessor"
+
+    def _postprocess_nodes(self, nodes, query_bundle: Optional[object] = None):
+        embedded = [n for n in nodes if n.node.embedding is not None]
+        if len(embedded) < 2:
+            return nodes[:self.top_k]
+        relevance = np.array([n.score or 0.0 for n in embedded], dtype=np.float32)
+        embeddings = np.array([n.node.embedding for n in embedded], dtype=np.float32)
+        selected = mmr_select(relevance, embeddings, self.top_k, self.lambda_mult, self.duplicate_threshold)
+        kept = [embedded[i] for i in selected]
+        if len(kept) < self.top_k:
+            kept.extend([n for n in nodes if n.node.embedding is None][:self.top_k - len(kept)])
+        print(f"MMR kept {len(kept)} of {len(nodes)} candidates")
+        return kept
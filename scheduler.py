@@ -0,0 +1,211 @@
+"""Admission control and priority queueing in front of LMStudio.
+
+LMStudio serves one model on one machine, so piling more concurrent generations
+onto it only makes every request slower until they all hit the timeout. The
+scheduler caps the number of in-flight LLM calls, queues the rest by priority
+(interactive chat before glossary batch work) and rejects requests early when the
+queue is full (429) or when they could not start before their deadline (503).
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    'semanticyarn_llm_queue_depth', 'LLM calls waiting for an LMStudio slot', ['priority'])
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    'semanticyarn_llm_in_flight', 'LLM calls currently running on LMStudio')
+QUEUE_WAIT = REGISTRY.histogram(
+    'semanticyarn_llm_queue_wait_seconds', 'Time LLM calls waited for an LMStudio slot', ['priority'])
+REJECTIONS = REGISTRY.counter(
+    'semanticyarn_llm_rejections_total', 'LLM calls rejected by admission control', ['priority', 'reason'])
+
+
+class AdmissionRejected(Exception):
+    """Raised when an LLM call is not admitted; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ('priority', 'seq', 'enqueued', 'cancelled')
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """Bounded priority queue with a max-in-flight limit."""
+
+    def __init__(self, max_in_flight=1, max_queue=16, initial_service_time=20.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._heap = []
+        self._seq = itertools.count()
+        # Exponentially weighted average of LLM call duration, used to estimate waits
+        self._service_time = initial_service_time
+
+    def _waiting(self):
+        return [t for t in self._heap if not t.cancelled]
+
+    def _publish(self):
+        waiting = self._waiting()
+        for priority, name in PRIORITY_NAMES.items():
+            QUEUE_DEPTH.set(sum(1 for t in waiting if t.priority == priority), priority=name)
+        LLM_IN_FLIGHT.set(self._in_flight)
+
+    def _estimated_wait(self, ahead):
+        """Seconds until a call with `ahead` calls queued before it can start."""
+        if self._in_flight < self.max_in_flight and ahead == 0:
+            return 0.0
+        rounds = (ahead // self.max_in_flight) + 1
+        return rounds * self._service_time
+
+    def _reject(self, priority, reason, message, status_code, retry_after):
+        REJECTIONS.inc(priority=PRIORITY_NAMES[priority], reason=reason)
+        raise AdmissionRejected(message, status_code, retry_after)
+
+    def check_admission(self, priority, deadline):
+        """Fail fast, before any work is done, if a call could not be admitted."""
+        with self._cond:
+            self._check_locked(priority, deadline)
+
+    def _check_locked(self, priority, deadline):
+        waiting = self._waiting()
+        if len(waiting) >= self.max_queue:
+            self._reject(priority, 'queue_full', "LMStudio queue is full, please retry shortly",
+                         429, retry_after=int(self._service_time) + 1)
+        ahead = sum(1 for t in waiting if t.priority <= priority)
+        estimate = self._estimated_wait(ahead)
+        if deadline is not None and time.monotonic() + estimate > deadline:
+            self._reject(priority, 'deadline', f"LMStudio is busy; expected wait of {estimate:.0f}s exceeds the deadline",
+                         503, retry_after=int(estimate) + 1)
+
+    def acquire(self, priority=INTERACTIVE, deadline=None):
+        """Block until a slot is free; returns the time spent waiting."""
+        with self._cond:
+            if self._in_flight < self.max_in_flight and not self._waiting():
+                self._in_flight += 1
+                self._publish()
+                QUEUE_WAIT.observe(0.0, priority=PRIORITY_NAMES[priority])
+                return 0.0
+
+            self._check_locked(priority, deadline)
+            ticket = _Ticket(priority, next(self._seq))
+            heapq.heappush(self._heap, ticket)
+            self._publish()
+            try:
+                while True:
+                    while self._heap and self._heap[0].cancelled:
+                        heapq.heappop(self._heap)
+                    if self._heap and self._heap[0] is ticket and self._in_flight < self.max_in_flight:
+                        heapq.heappop(self._heap)
+                        self._in_flight += 1
+                        break
+                    timeout = None
+                    if deadline is not None:
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            ticket.cancelled = True
+                            self._reject(priority, 'deadline', "Timed out waiting for LMStudio", 503,
+                                         retry_after=int(self._service_time) + 1)
+                    self._cond.wait(timeout)
+            finally:
+                self._publish()
+                # Wake the next waiter in case this one gave up
+                self._cond.notify_all()
+
+            waited = time.monotonic() - ticket.enqueued
+            QUEUE_WAIT.observe(waited, priority=PRIORITY_NAMES[priority])
+            return waited
+
+    def release(self, duration=None):
+        with self._cond:
+            self._in_flight -= 1
+            if duration is not None:
+                self._service_time = 0.8 * self._service_time + 0.2 * duration
+            self._publish()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE, deadline=None):
+        self.acquire(priority, deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        with self._cond:
+            waiting = self._waiting()
+            now = time.monotonic()
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'queue_depth': {
+                    name: sum(1 for t in waiting if t.priority == priority)
+                    for priority, name in PRIORITY_NAMES.items()
+                },
+                'oldest_wait_seconds': max((now - t.enqueued for t in waiting), default=0.0),
+                'avg_service_seconds': self._service_time,
+            }
+
+
+# Priority and deadline of the request running on the current (green) thread
+_request = threading.local()
+
+
+@contextmanager
+def request_priority(priority, deadline=None):
+    """Mark LLM calls made inside this block with a priority and an absolute deadline."""
+    previous = getattr(_request, 'state', None)
+    state = {'priority': priority, 'deadline': deadline, 'rejection': None}
+    _request.state = state
+    try:
+        yield state
+    finally:
+        _request.state = previous
+
+
+def current_request():
+    state = getattr(_request, 'state', None)
+    if state is None:
+        return {'priority': INTERACTIVE, 'deadline': None, 'rejection': None}
+    return state
+
+
+@contextmanager
+def llm_slot(scheduler):
+    """Run one LLM call inside a scheduler slot, remembering a rejection for the request."""
+    state = current_request()
+    try:
+        scheduler.acquire(state['priority'], state['deadline'])
+    except AdmissionRejected as e:
+        # Callers such as extract_keywords swallow exceptions; keep the rejection for the route
+        state['rejection'] = e
+        raise
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        scheduler.release(time.monotonic() - start)
@@ -0,0 +1,59 @@
+"""Single-flight coalescing of identical in-flight computations.
+
+The first caller for a key runs the computation; callers arriving with the same
+key while it runs wait for it and receive the same result (or exception)
+instead of starting duplicate work.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """Run func once per concurrent key; returns (result, shared).
+
+        shared is True for callers that attached to another caller's computation.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    def in_flight(self):
+        """Return {key: number of attached duplicates} for the running computations."""
+        with self._lock:
+            return {key: call.waiters for key, call in self._calls.items()}
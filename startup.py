@@ -0,0 +1,126 @@
+"""Startup timing report and deferred loading of the embedding model.
+
+The BGE embedding model (and the Optimum/ONNX runtime behind it) is by far the
+most expensive thing the app loads, so it is no longer loaded at import time.
+``ensure_embed_model`` loads it on first use, ``start_warmup`` loads it on a
+background thread, and STARTUP records how long each import and initialization
+step took so the cost of a cold start can be inspected at /api/startup.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from async_mode import native_lock, run_blocking
+from config import EMBED_MODEL_NAME, ONNX_MODEL_PATH, STARTUP_MODE
+
+PROCESS_START = time.perf_counter()
+
+
+class StartupReport:
+    """Durations of the import and initialization steps of the application."""
+
+    def __init__(self):
+        self.phases = []
+        self.ready_seconds = None
+
+    @contextmanager
+    def phase(self, name, kind='init'):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, kind, start)
+
+    def record(self, name, seconds, kind='init', start=None):
+        offset = (start if start is not None else time.perf_counter() - seconds) - PROCESS_START
+        self.phases.append({
+            'name': name,
+            'kind': kind,
+            'seconds': round(seconds, 4),
+            'started_at': round(offset, 4),
+            'thread': threading.current_thread().name,
+        })
+
+    def mark_ready(self):
+        """Record the moment the application finished importing and can serve requests."""
+        self.ready_seconds = round(time.perf_counter() - PROCESS_START, 4)
+
+    def as_dict(self):
+        totals = {}
+        for phase in self.phases:
+            totals[phase['kind']] = round(totals.get(phase['kind'], 0.0) + phase['seconds'], 4)
+        return {
+            'mode': STARTUP_MODE,
+            'ready_seconds': self.ready_seconds,
+            'embed_model_loaded': _embed_ready,
+            'totals': totals,
+            'phases': list(self.phases),
+        }
+
+    def print_summary(self):
+        report = self.as_dict()
+        print(f"Startup ({report['mode']} mode) ready after {report['ready_seconds']}s")
+        for phase in report['phases']:
+            print(f"  {phase['seconds']:8.3f}s  {phase['kind']:7} {phase['name']}")
+
+
+STARTUP = StartupReport()
+
+_embed_lock = native_lock()
+_embed_ready = False
+
+
+def ensure_embed_model():
+    """Load the embedding model into Settings.embed_model on first use."""
+    global _embed_ready
+    if _embed_ready:
+        return
+    with _embed_lock:
+        if _embed_ready:
+            return
+        from llama_index.core import Settings
+        # A model configured beforehand (e.g. by a benchmark) is left in place
+        if Settings._embed_model is None:
+            with STARTUP.phase('import llama_index.embeddings.huggingface_optimum', 'import'):
+                from llama_index.embeddings.huggingface_optimum import OptimumEmbedding
+            if not os.path.exists(ONNX_MODEL_PATH):
+                with STARTUP.phase(f'export {EMBED_MODEL_NAME} to ONNX'):
+                    OptimumEmbedding.create_and_save_optimum_model(EMBED_MODEL_NAME, ONNX_MODEL_PATH)
+            with STARTUP.phase('load embedding model'):
+                Settings.embed_model = OptimumEmbedding(folder_name=ONNX_MODEL_PATH)
+        _embed_ready = True
+
+
+_import_lock = native_lock()
+
+
+def timed_import(module_name):
+    """Import a module, recording the cost in the startup report the first time."""
+    # sys.modules already holds a module while it is being imported; without the
+    # lock a second thread would get it half-initialized
+    with _import_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        with STARTUP.phase(f'import {module_name}', 'import'):
+            return importlib.import_module(module_name)
+
+
+def _warmup(steps):
+    start = time.perf_counter()
+    for name, func in steps:
+        try:
+            # CPU-bound loading must not stall green threads serving requests
+            run_blocking(func)
+        except Exception as e:
+            print(f"Warm-up step '{name}' failed: {str(e)}")
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+
+def start_warmup(steps):
+    """Run (name, func) warm-up steps on a background thread."""
+    thread = threading.Thread(target=_warmup, args=(list(steps),), name='warmup', daemon=True)
+    thread.start()
+    return thread
@@ -21,6 +21,12 @@ class ChatManager {
         const question = this.questionInput.value.trim();
         if (!question) return;
 
+        // "/search <query>" searches every vector database, not just the selected ones
+        if (question.startsWith('/search ')) {
+            await this.runLibrarySearch(question.slice('/search '.length).trim());
+            return;
+        }
+
         const currentValue = window.currentValue || 0; // Get from global state
         
         if (currentValue > 0) {
@@ -39,8 +45,7 @@ class ChatManager {
     }
 
     getSelectedCitekeys() {
-        return Array.from(document.querySelectorAll('.doc-checkbox:checked'))
-            .map(checkbox => checkbox.id.replace('doc-', ''));
+        return window.documentManager ? window.documentManager.getSelectedCitekeys() : [];
     }
 
     async sendChatRequest(question, selectedCitekeys) {
@@ -57,7 +62,9 @@ class ChatManager {
                 model_name: modelSelect ? modelSelect.value : 'meta-llama-3.1-8b-instruct',
                 word_count: parseInt(wordCountInput.value),
                 use_refine: refineToggle.checked,
-                glossary_mode: window.currentValue || 0
+                glossary_mode: window.currentValue || 0,
+                // Retrieval events for this request go to this tab's connection only
+                socket_id: window.semanticYarnSocket?.id
             };
 
             const response = await fetch('http://localhost:5001/chat', {
@@ -91,12 +98,82 @@ class ChatManager {
         }
     }
 
+    async runLibrarySearch(query) {
+        if (!query) return;
+        this.setInputsDisabled(true);
+
+        try {
+            const response = await fetch('/api/search', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ query: query, top_k: 20 })
+            });
+            const data = await response.json();
+            if (data.error) {
+                throw new Error(data.error);
+            }
+
+            this.appendSearchResults(data);
+            this.questionInput.value = '';
+
+            // Highlight hits of documents currently shown in the 3D view
+            if (window.visualizationManager && data.results.length) {
+                window.visualizationManager.handleRetrievedNodes([{
+                    context: 'search',
+                    node_ids: data.results.map(r => r.node_id)
+                }]);
+                setTimeout(() => window.visualizationManager.handleResponseComplete(), 1500);
+            }
+        } catch (error) {
+            console.error('Library search error:', error);
+            this.appendSystemMessage(`Error: ${error.message}`);
+        } finally {
+            this.setInputsDisabled(false);
+            this.questionInput.focus();
+        }
+    }
+
+    appendSearchResults(data) {
+        const selected = new Set(this.getSelectedCitekeys());
+        const elsewhere = data.documents.filter(doc => !selected.has(doc.citekey)).length;
+        const searchItem = document.createElement('div');
+        searchItem.className = 'message-group';
+
+        const documents = data.documents.map(doc => {
+            const snippets = data.results
+                .filter(r => r.citekey === doc.citekey)
+                .slice(0, 3)
+                .map(r => `<div class="search-snippet">${escapeHtml(r.text)} <span class="search-score">(${r.score.toFixed(3)})</span></div>`)
+                .join('');
+            return `
+                <div class="search-document">
+                    <div class="doc-title">${escapeHtml(doc.title || doc.citekey)}</div>
+                    <div class="doc-meta"><span class="citekey">${escapeHtml(doc.citekey)}</span> best ${doc.best_score.toFixed(3)}, ${doc.hits} hits</div>
+                    ${snippets}
+                </div>`;
+        }).join('');
+
+        searchItem.innerHTML = `
+            <div class="message">
+                <div class="message-question">Search: ${escapeHtml(data.query)}</div>
+            </div>
+            <div class="message">
+                <div class="message-content">${documents || 'No matching chunks found.'}</div>
+                <div class="message-metadata">
+                    <span class="timestamp">${data.results.length} chunks from ${data.documents.length} of ${data.index.documents} documents in ${(data.timings.search * 1000).toFixed(1)} ms</span>
+                    ${elsewhere ? `<span class="timestamp">${elsewhere} not selected (not shown in the 3D view)</span>` : ''}
+                </div>
+            </div>
+        `;
+        this.chatMessages.insertBefore(searchItem, this.chatMessages.firstChild);
+    }
+
     setInputsDisabled(disabled) {
         this.questionInput.disabled = disabled;
         document.getElementById('searchInput').disabled = disabled;
-        document.querySelectorAll('.doc-checkbox').forEach(checkbox => {
-            checkbox.disabled = disabled;
-        });
+        if (window.documentManager) {
+            window.documentManager.setDisabled(disabled);
+        }
     }
 
     appendChatMessage(question, answer) {
@@ -1,17 +1,56 @@
+/**
+ * documents.js - Document panel backed by the paginated /api/documents endpoint.
+ *
+ * Only the rows in view are rendered (virtual scrolling), pages are fetched as
+ * they scroll into view, and the selection lives in this.selected so it survives
+ * searching, filtering and scrolling rows out of the DOM.
+ */
+
 class DocumentManager {
     constructor() {
+        this.pageSize = 100;
+        this.overscan = 10; // rows rendered above and below the visible range
+        this.rows = [];     // sparse array of loaded rows for the current query
+        this.total = 0;
+        this.pendingPages = new Set();
+        this.queryVersion = 0;
+        this.selected = new Map(); // citekey -> document row
+        this.disabled = false;
         this.initializeDocuments();
     }
 
     initializeDocuments() {
         this.searchInput = document.getElementById('searchInput');
+        this.authorFilter = document.getElementById('authorFilter');
+        this.yearFilter = document.getElementById('yearFilter');
+        this.vectorDbFilter = document.getElementById('vectorDbFilter');
+        this.documentCount = document.getElementById('documentCount');
         this.documentList = document.getElementById('documentList');
+
+        // Row height comes from the stylesheet so both stay in sync
+        const cssHeight = getComputedStyle(this.documentList).getPropertyValue('--document-row-height');
+        this.rowHeight = parseInt(cssHeight, 10) || 60;
+
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'document-list-spacer';
+        this.documentList.classList.add('virtual');
+        this.documentList.appendChild(this.spacer);
+
         this.bindEvents();
+        this.resetQuery();
     }
 
     bindEvents() {
-        // Search functionality
-        this.searchInput.addEventListener('input', () => this.handleSearch());
+        // Search and filters; text inputs are debounced so typing sends one request
+        [this.searchInput, this.authorFilter, this.yearFilter].forEach(input => {
+            if (input) input.addEventListener('input', () => this.scheduleQuery());
+        });
+        if (this.vectorDbFilter) {
+            this.vectorDbFilter.addEventListener('change', () => this.resetQuery());
+        }
+
+        this.documentList.addEventListener('scroll', () => this.scheduleRender());
+        window.addEventListener('resize', () => this.scheduleRender());
 
         // Document selection
         this.documentList.addEventListener('change', (e) => {
@@ -30,25 +69,135 @@ class DocumentManager {
         });
     }
 
-    handleSearch() {
-        const searchTerm = this.searchInput.value.toLowerCase();
-        const documents = this.documentList.getElementsByClassName('document-item');
-        
-        Array.from(documents).forEach(doc => {
-            const title = doc.querySelector('.doc-title').textContent.toLowerCase();
-            const authors = doc.querySelector('.doc-meta').textContent.toLowerCase();
-            doc.style.display = (title.includes(searchTerm) || authors.includes(searchTerm)) ? '' : 'none';
+    scheduleQuery() {
+        clearTimeout(this.queryTimer);
+        this.queryTimer = setTimeout(() => this.resetQuery(), 200);
+    }
+
+    scheduleRender() {
+        if (this.renderRequested) return;
+        this.renderRequested = true;
+        requestAnimationFrame(() => {
+            this.renderRequested = false;
+            this.renderVisibleRows();
         });
     }
 
+    buildQuery(offset) {
+        const params = new URLSearchParams({ offset: offset, limit: this.pageSize });
+        const search = this.searchInput?.value.trim();
+        const author = this.authorFilter?.value.trim();
+        const year = this.yearFilter?.value.trim();
+        if (search) params.set('q', search);
+        if (author) params.set('author', author);
+        if (year) params.set('year', year);
+        if (this.vectorDbFilter?.checked) params.set('has_vector_db', 'true');
+        return params.toString();
+    }
+
+    resetQuery() {
+        this.queryVersion++;
+        this.rows = [];
+        this.total = 0;
+        this.pendingPages.clear();
+        this.documentList.scrollTop = 0;
+        this.loadPage(0);
+    }
+
+    async loadPage(page) {
+        if (this.pendingPages.has(page)) return;
+        this.pendingPages.add(page);
+        const version = this.queryVersion;
+
+        try {
+            const response = await fetch(`/api/documents?${this.buildQuery(page * this.pageSize)}`);
+            const data = await response.json();
+            // A newer search replaced the one this page belongs to
+            if (version !== this.queryVersion) return;
+            if (data.error) throw new Error(data.error);
+
+            this.total = data.total;
+            data.documents.forEach((doc, i) => {
+                this.rows[data.offset + i] = doc;
+                // Keep selected rows current (e.g. has_vector_db after indexing)
+                if (this.selected.has(doc.citekey)) this.selected.set(doc.citekey, doc);
+            });
+            this.documentCount.textContent = data.total === data.library_size
+                ? `${data.total} documents`
+                : `${data.total} of ${data.library_size} documents`;
+            this.renderVisibleRows();
+        } catch (error) {
+            console.error('DocumentManager: Error loading documents:', error);
+            if (version === this.queryVersion) {
+                this.documentCount.textContent = `Error: ${error.message}`;
+            }
+        } finally {
+            if (version === this.queryVersion) this.pendingPages.delete(page);
+        }
+    }
+
+    renderVisibleRows() {
+        const { scrollTop, clientHeight } = this.documentList;
+        const first = Math.max(0, Math.floor(scrollTop / this.rowHeight) - this.overscan);
+        const last = Math.min(this.total, Math.ceil((scrollTop + clientHeight) / this.rowHeight) + this.overscan);
+        this.spacer.style.height = `${this.total * this.rowHeight}px`;
+
+        // Fetch pages that scrolled into view
+        for (let page = Math.floor(first / this.pageSize); page * this.pageSize < last; page++) {
+            if (this.rows[page * this.pageSize] === undefined) this.loadPage(page);
+        }
+
+        const fragment = document.createDocumentFragment();
+        for (let i = first; i < last; i++) {
+            if (this.rows[i]) fragment.appendChild(this.createRow(this.rows[i], i));
+        }
+        this.spacer.replaceChildren(fragment);
+    }
+
+    createRow(doc, index) {
+        const item = document.createElement('div');
+        item.className = 'document-item';
+        item.style.top = `${index * this.rowHeight}px`;
+        item.dataset.index = index;
+
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.id = `doc-${doc.citekey}`;
+        checkbox.className = 'doc-checkbox';
+        checkbox.checked = this.selected.has(doc.citekey);
+        checkbox.disabled = this.disabled;
+
+        const label = document.createElement('label');
+        label.htmlFor = checkbox.id;
+        label.innerHTML = `
+            <div class="doc-content">
+                <div class="doc-title" title="${escapeHtml(doc.title)}">${escapeHtml(doc.title)}</div>
+                <div class="doc-meta">
+                    ${escapeHtml(doc.authors)} (${escapeHtml(doc.year)}${doc.has_vector_db ? '<span class="vector-db-indicator">D</span>' : ''})
+                </div>
+            </div>`;
+
+        item.appendChild(checkbox);
+        item.appendChild(label);
+        return item;
+    }
+
     handleDocumentSelection(e) {
         console.log('Document checkbox changed - updating selected docs list');
+        const index = parseInt(e.target.closest('.document-item').dataset.index, 10);
+        const doc = this.rows[index];
+        if (doc) {
+            if (e.target.checked) {
+                this.selected.set(doc.citekey, doc);
+            } else {
+                this.selected.delete(doc.citekey);
+            }
+        }
         const count = this.updateSelectedDocsList();
-        
-        const selectedCheckboxes = document.querySelectorAll('.doc-checkbox:checked');
+
         console.log(`Document selection changed: ${count} documents now selected`);
-        console.log('Selected document IDs:', Array.from(selectedCheckboxes).map(cb => cb.id));
-        
+        console.log('Selected document IDs:', this.getSelectedCitekeys());
+
         // Handle glossary mode updates
         if (count > 1 && window.currentValue > 0) {
             console.log('Multiple documents selected while glossary was active - forcing reset');
@@ -56,7 +205,7 @@ class DocumentManager {
                 window.glossaryManager.updateSlider(0);
             }
         }
-        
+
         // Update glossary visibility
         if (window.handleGlossaryModeVisibility) {
             window.handleGlossaryModeVisibility(count);
@@ -73,59 +222,67 @@ class DocumentManager {
 
     updateSelectedDocsList() {
         console.log('Updating selected docs list');
-        
-        const checkedBoxes = document.querySelectorAll('.doc-checkbox:checked');
-        console.log(`Found ${checkedBoxes.length} checked document checkboxes`);
-        
-        const selectedCitekeys = Array.from(checkedBoxes)
-            .map(checkbox => {
-                const label = checkbox.nextElementSibling;
-                return {
-                    citekey: checkbox.id.replace('doc-', ''),
-                    title: label.querySelector('.doc-title').textContent,
-                    authors: label.querySelector('.doc-meta').textContent
-                };
-            });
+        const selectedDocs = this.getSelectedDocuments();
 
         const selectedDocsContainer = document.getElementById('selectedDocs');
         const sectionHeader = document.querySelector('.section-header');
-        
-        sectionHeader.innerHTML = `Selected Documents <span class="doc-count">(${selectedCitekeys.length})</span>`;
-        
-        selectedDocsContainer.innerHTML = selectedCitekeys.map(doc => `
+
+        sectionHeader.innerHTML = `Selected Documents <span class="doc-count">(${selectedDocs.length})</span>`;
+
+        selectedDocsContainer.innerHTML = selectedDocs.map(doc => `
             <div class="selected-doc">
-                <button class="remove-doc" data-citekey="${doc.citekey}">×</button>
-                <div class="doc-title">${doc.title}</div>
-                <div class="doc-meta">${doc.authors}</div>
+                <button class="remove-doc" data-citekey="${escapeHtml(doc.citekey)}">×</button>
+                <div class="doc-title">${escapeHtml(doc.title)}</div>
+                <div class="doc-meta">${escapeHtml(doc.authors)} (${escapeHtml(doc.year)})</div>
             </div>
         `).join('');
-        
-        return selectedCitekeys.length;
+
+        return selectedDocs.length;
     }
 
     removeDocument(citekey) {
         console.log(`Removing document with citekey: ${citekey}`);
+        if (!this.selected.delete(citekey)) return;
+
         const checkbox = document.getElementById(`doc-${citekey}`);
-        if (checkbox) {
-            checkbox.checked = false;
-            const count = this.updateSelectedDocsList();
-            console.log(`After removal: ${count} documents selected`);
-            
-            if (typeof window.handleGlossaryModeVisibility === 'function') {
-                window.handleGlossaryModeVisibility(count);
-            }
+        if (checkbox) checkbox.checked = false;
 
-            if (typeof window.redrawScene === 'function') {
-                window.redrawScene();
-            }
+        const count = this.updateSelectedDocsList();
+        console.log(`After removal: ${count} documents selected`);
+
+        if (typeof window.handleGlossaryModeVisibility === 'function') {
+            window.handleGlossaryModeVisibility(count);
+        }
+
+        if (typeof window.redrawScene === 'function') {
+            window.redrawScene();
         }
     }
 
+    setDisabled(disabled) {
+        this.disabled = disabled;
+        this.documentList.querySelectorAll('.doc-checkbox').forEach(checkbox => {
+            checkbox.disabled = disabled;
+        });
+    }
+
     getSelectedCitekeys() {
-        return Array.from(document.querySelectorAll('.doc-checkbox:checked'))
-            .map(checkbox => checkbox.id.replace('doc-', ''));
+        return Array.from(this.selected.keys());
+    }
+
+    getSelectedDocuments() {
+        return Array.from(this.selected.values());
     }
 }
 
+function escapeHtml(value) {
+    return String(value ?? '')
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
 // Export for use in other files
 window.DocumentManager = DocumentManager;
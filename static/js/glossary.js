@@ -52,7 +52,7 @@ class GlossaryManager {
     }
 
     updateSlider(value) {
-        const selectedCount = document.querySelectorAll('.doc-checkbox:checked').length;
+        const selectedCount = window.documentManager ? window.documentManager.getSelectedCitekeys().length : 0;
         if (selectedCount > 1 && value > 0) {
             console.log('Blocking glossary slider change - multiple documents selected');
             value = 0;
@@ -5,7 +5,9 @@
 class ModelManager {
     constructor() {
         this.modelSelect = document.getElementById('modelSelect');
+        this.healthIndicator = document.getElementById('lmstudioHealth');
         this.initialized = false;
+        this.healthInterval = 30000; // ms between LMStudio health checks
         
         if (this.modelSelect) {
             this.initialize();
@@ -16,6 +18,7 @@ class ModelManager {
 
     initialize() {
         this.fetchModels();
+        setInterval(() => this.checkHealth(), this.healthInterval);
     }
 
     async fetchModels() {
@@ -25,12 +28,13 @@ class ModelManager {
             this.setLoadingState(true);
             const response = await fetch('/api/models');
             const data = await response.json();
+            if (data.health) this.updateHealth(data.health);
             
             if (data.success && Array.isArray(data.models)) {
                 this.updateModelSelect(data.models, data.default);
                 this.initialized = true;
             } else {
-                throw new Error('Invalid response format');
+                throw new Error(data.error || 'Invalid response format');
             }
         } catch (error) {
             console.error('ModelManager: Error fetching models:', error);
@@ -38,6 +42,31 @@ class ModelManager {
         }
     }
 
+    async checkHealth() {
+        try {
+            const response = await fetch('/api/lmstudio/health');
+            const health = await response.json();
+            this.updateHealth(health);
+            // The catalog loaded after the page did; pick up the model list now
+            if (!this.initialized && health.models_loaded) {
+                this.fetchModels();
+            }
+        } catch (error) {
+            this.updateHealth({ status: 'down', error: error.message });
+        }
+    }
+
+    updateHealth(health) {
+        if (!this.healthIndicator) return;
+        const labels = { ok: '[ok]', slow: '[slow]', down: '[down]' };
+        this.healthIndicator.className = `lmstudio-health ${health.status || ''}`;
+        this.healthIndicator.textContent = labels[health.status] || '[?]';
+        const latency = health.latency_ms != null ? `${Math.round(health.latency_ms)} ms` : 'n/a';
+        this.healthIndicator.title = health.error
+            ? `LMStudio: ${health.error}`
+            : `LMStudio responded in ${latency}`;
+    }
+
     setLoadingState(loading) {
         if (!this.modelSelect) return;
         this.modelSelect.disabled = loading;
@@ -20,7 +20,10 @@ const DEFAULT_SETTINGS = {
     scatterLengthMax: '5.0',
     scatterVelocity: '5',
     scatterLife: '2.0',
-    colorMode: 'rgb'
+    colorMode: 'rgb',
+    channelDims: '0,1,2,3,4,5,6,7,8,9,10,11',
+    threadNeighbors: '3',
+    clusterCount: '8'
 };
 
 class SettingsManager {
@@ -44,14 +47,8 @@ class SettingsManager {
                     const settings = this.getCurrentSettings();
                     localStorage.setItem('vectorVisSettings', JSON.stringify(settings));
                     
-                    // Directly trigger visualization update if available
-                    if (window.visualizationManager?.currentData) {
-                        console.log('Triggering immediate visualization update');
-                        window.visualizationManager.redrawYarn(
-                            window.visualizationManager.currentData.points,
-                            window.visualizationManager.currentData.metadata
-                        );
-                    }
+                    // Patch the drawn scene with the changed setting
+                    window.visualizationManager?.applySettingChange(input.id);
                 });
             });
         });
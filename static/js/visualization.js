@@ -1,3 +1,43 @@
+// Form fields of the visual channels, in the order of the dimension mapping
+// (see the mapping notes in index.html)
+const CHANNEL_FIELDS = [
+    'x_dimension', 'y_dimension', 'z_dimension', 'w_dimension', 'v_dimension', 'color_dimension',
+    'undulation_dimension', 'amplitude_dimension', 'phase_dimension',
+    'scatter_frequency', 'scatter_length', 'scatter_color'
+];
+// Keys of the channels in the 'dimensions' of the server response
+const CHANNEL_KEYS = ['x', 'y', 'z', 'v', 'p', 'c', 'u', 'a', 'ph', 'sf', 'sl', 'sc'];
+const DEFAULT_CHANNEL_DIMS = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11];
+
+// Parts of the drawn scene each channel feeds; channel 0 also colors the
+// 'dimension' color mode and channels 9-11 also displace the rings
+const CHANNEL_EFFECTS = [
+    ['rings', 'colors'], ['rings'], ['rings'], ['velocity'], ['size'], ['colors'],
+    ['rings'], ['rings'], ['rings'], ['rings', 'scatter'], ['rings', 'scatter'], ['rings', 'scatter']
+];
+
+// Parts of the drawn scene each setting feeds; scatter settings are read live
+const SETTING_EFFECTS = {
+    colorMode: 'colors',
+    scaleMin: 'rings', scaleMax: 'rings', curveMin: 'rings', curveMax: 'rings',
+    undulationsMin: 'rings', undulationsMax: 'rings', amplitudeMin: 'rings', amplitudeMax: 'rings',
+    phaseMin: 'rings', phaseMax: 'rings',
+    speedMin: 'velocity', speedMax: 'velocity',
+    sizeMin: 'size', sizeMax: 'size'
+};
+
+const RING_SEGMENTS = 200;
+// Channel ranges of points the server already scaled to [-1, 1] over the whole selection
+const UNIT_RANGES = DEFAULT_CHANNEL_DIMS.map(() => ({ min: -1, max: 1 }));
+
+// Chunk details requested within this window are fetched in one /api/node call
+const NODE_BATCH_DELAY_MS = 30;
+const NODE_CACHE_SIZE = 500;
+const TOOLTIP_PREVIEW_CHARS = 280;
+
+// Characters of each cluster's closest chunk shown in the legend
+const LEGEND_PREVIEW_CHARS = 60;
+
 class VisualizationManager {
     constructor() {
         this.scene = null;
@@ -7,6 +47,25 @@ class VisualizationManager {
         this.points = [];
         this.scatterLines = [];
         this.currentData = null;
+        // Ring and point of every drawn chunk, patched in place on settings changes
+        this.yarnObjects = [];
+        // Server-side session of the shown selection ({id, version}) and its channel mapping
+        this.vizSession = null;
+        // Kept while a new selection streams in, so the server reuses the tab's session
+        this.vizSessionId = null;
+        this.channelDims = DEFAULT_CHANNEL_DIMS.slice();
+        this.remapRequest = 0;
+        // Progressive loading of the selection from /api/viz/stream
+        this.streamRequest = 0;
+        this.streamAbort = null;
+        // Lines between nearest-neighbor chunks, following the moving points
+        this.threads = null;
+        this.threadRequest = 0;
+        // Semantic clusters of the session for the 'cluster' color mode ({session, k, labels, clusters})
+        this.clusters = null;
+        this.clusterRequest = 0;
+        this.clusterPending = null;
+        this.clusterLegend = null;
         this.animationFrameId = null;
         this.lastFrameTime = 0;
         this.firstVisualization = true;
@@ -44,28 +103,7 @@ class VisualizationManager {
         }
 
         this.queryAnimationManager = new QueryAnimationManager();
-
-        // Setup socket event handlers
-        this.setupSocketHandlers();
-    }
-
-    setupSocketHandlers() {
-        const socket = io();
-        
-        // Listen for retrieved nodes events
-        socket.on('nodes_retrieved', (data) => {
-            console.log('Nodes retrieved:', data);
-            if (data.node_ids && data.node_ids.length > 0) {
-                // Start animation immediately when nodes are found
-                this.queryAnimationManager.handleRetrievedNodes(data.node_ids, this.scene);
-            }
-        });
-
-        // Listen for chat response completion
-        socket.on('chat_response_complete', () => {
-            console.log('Chat response complete, triggering decay');
-            this.queryAnimationManager.handleResponseComplete();
-        });
+        // Socket.IO events reach the active manager through index.html's shared socket
     }
 
     initialize(callback) {
@@ -108,6 +146,7 @@ class VisualizationManager {
 
             // Add event listeners
             this.initializeEventListeners();
+            this.setupPointTooltip(canvas);
             
             console.log('Visualization manager initialized');
 
@@ -169,8 +208,9 @@ class VisualizationManager {
             'colorMode', 'scaleMin', 'scaleMax', 'curveMin', 'curveMax', 
             'speedMin', 'speedMax', 'sizeMin', 'sizeMax', 'undulationsMin', 
             'undulationsMax', 'amplitudeMin', 'amplitudeMax', 'phaseMin', 
-            'phaseMax', 'scatterFreqMin', 'scatterFreqMax', 'scatterLengthMin', 
-            'scatterLengthMax', 'scatterVelocity', 'scatterLife'
+            'phaseMax', 'scatterFreqMin', 'scatterFreqMax', 'scatterLengthMin',
+            'scatterLengthMax', 'scatterVelocity', 'scatterLife', 'channelDims', 'threadNeighbors',
+            'clusterCount'
         ];
 
         settingsIds.forEach(id => {
@@ -178,10 +218,8 @@ class VisualizationManager {
             if (element) {
                 ['change', 'input'].forEach(eventType => {
                     element.addEventListener(eventType, () => {
-                        // Force a complete refresh instead of just updating the point cloud
                         if (this.initialized) {
-                            console.log(`Setting ${id} changed, triggering full visualization update`);
-                            this.redrawScene();  // Call full update instead of redrawYarn
+                            this.applySettingChange(id);
                         }
                     });
                 });
@@ -210,6 +248,7 @@ class VisualizationManager {
             this.updatePoints(currentTime, deltaTime);
         }
         this.updateScatterLines(deltaTime);
+        this.updateThreads();
         
         // Update controls and render
         if (this.controls) this.controls.update();
@@ -447,6 +486,20 @@ class VisualizationManager {
                 colors[i * 3 + 1] = color.g;
                 colors[i * 3 + 2] = color.b;
             });
+        } else if (colorMode === 'cluster') {
+            const labels = this.currentClusters()?.labels;
+            if (!labels || labels.length !== pointsData.length) {
+                // Gray until the clusters of this selection arrive
+                colors.fill(0.5);
+                this.loadClusters();
+            } else {
+                labels.forEach((label, i) => {
+                    const color = this.clusterColor(label);
+                    colors[i * 3] = color.r;
+                    colors[i * 3 + 1] = color.g;
+                    colors[i * 3 + 2] = color.b;
+                });
+            }
         } else if (colorMode === 'rgb') {
             pointsData.forEach((point, i) => {
                 const colorValue = point[5] || 0;  //color of the ring according to dimension 6 [5]
@@ -477,6 +530,125 @@ class VisualizationManager {
         return colors;
     }
 
+    readYarnSettings() {
+        const value = (id, fallback) => parseFloat(document.getElementById(id).value) || fallback;
+        return {
+            scaleMin: value('scaleMin', 0.6),
+            scaleMax: value('scaleMax', 1.5),
+            curveMin: value('curveMin', -1.0),
+            curveMax: value('curveMax', 1.0),
+            speedMin: value('speedMin', -0.02),
+            speedMax: value('speedMax', 0.02),
+            sizeMin: value('sizeMin', 0.1),
+            sizeMax: value('sizeMax', 0.3),
+            undulationsMin: value('undulationsMin', 2),
+            undulationsMax: value('undulationsMax', 10),
+            amplitudeMin: value('amplitudeMin', 0.05),
+            amplitudeMax: value('amplitudeMax', 0.4),
+            phaseMin: value('phaseMin', 0),
+            phaseMax: value('phaseMax', 6.28)
+        };
+    }
+
+    // Min/max of every channel over all points
+    channelRanges(pointsData) {
+        return DEFAULT_CHANNEL_DIMS.map(dim => {
+            let min = Infinity;
+            let max = -Infinity;
+            pointsData.forEach(p => {
+                const val = typeof p[dim] === 'number' ? p[dim] : 0;
+                if (val < min) min = val;
+                if (val > max) max = val;
+            });
+            return {
+                min: min === max ? min - 1 : min,
+                max: min === max ? max + 1 : max
+            };
+        });
+    }
+
+    normalizePoint(point, ranges) {
+        // Normalize dimensions, using 0 for missing ones
+        return ranges.map((range, dim) => {
+            const val = point[dim] || 0;
+            return -1 + 2 * (val - range.min) / (range.max - range.min);
+        });
+    }
+
+    pointVelocity(normalizedPoint, settings) {
+        // Map normalized values to the speed range, negative values run counter-clockwise
+        if (normalizedPoint[3] > 0) {
+            return normalizedPoint[3] * settings.speedMax;
+        } else if (normalizedPoint[3] < 0) {
+            return normalizedPoint[3] * Math.abs(settings.speedMin);
+        }
+        return 0;
+    }
+
+    pointSize(normalizedPoint, settings) {
+        return settings.sizeMin + ((normalizedPoint[4] + 1) / 2) * (settings.sizeMax - settings.sizeMin);
+    }
+
+    ringPoints(point, normalizedPoint, settings) {
+        const baseRadius = 2;
+        const numPoints = 100;
+        const rotationX = (normalizedPoint[0] * Math.PI) / 2;
+        const rotationZ = (normalizedPoint[1] * Math.PI) / 2;
+        const scale = settings.scaleMin + ((normalizedPoint[2] + 1) / 2) * (settings.scaleMax - settings.scaleMin);
+
+        // Undulations, wave amplitude and phase from dimensions 6, 7 and 8
+        const undulations = Math.round(settings.undulationsMin + ((normalizedPoint[6] + 1) / 2) * (settings.undulationsMax - settings.undulationsMin));
+        const waveAmplitude = settings.amplitudeMin + ((normalizedPoint[7] + 1) / 2) * (settings.amplitudeMax - settings.amplitudeMin);
+        const wavePhase = settings.phaseMin + ((normalizedPoint[8] + 1) / 2) * (settings.phaseMax - settings.phaseMin);
+
+        const ringPoints = [];
+        for (let p = 0; p <= numPoints; p++) {
+            const angle = (p / numPoints) * Math.PI * 2;
+            const baseX = Math.cos(angle);
+            const baseZ = Math.sin(angle);
+            
+            // Add undulation effect with amplitude and phase control
+            const undulationEffect = Math.sin(angle * undulations + wavePhase) * waveAmplitude;
+            
+            let displacement = undulationEffect;
+            let dimensionsUsed = 0;
+            
+            for (let d = 9; d < point.length && d < 384; d++) {
+                if (point[d] !== undefined && !isNaN(point[d])) {
+                    const weight = Math.sin((d - 9) * angle);
+                    displacement += point[d] * weight;
+                    dimensionsUsed++;
+                }
+            }
+            
+            if (dimensionsUsed > 0) {
+                displacement = (displacement / Math.sqrt(dimensionsUsed + 1)) * (settings.curveMax - settings.curveMin) + settings.curveMin;
+            }
+            
+            let x = baseX;
+            let y = displacement;
+            let z = baseZ;
+            
+            // Apply rotations
+            const y1 = y * Math.cos(rotationX) - z * Math.sin(rotationX);
+            const z1 = y * Math.sin(rotationX) + z * Math.cos(rotationX);
+            y = y1;
+            z = z1;
+            
+            const x1 = x * Math.cos(rotationZ) - y * Math.sin(rotationZ);
+            const y2 = x * Math.sin(rotationZ) + y * Math.cos(rotationZ);
+            x = x1;
+            y = y2;
+            
+            ringPoints.push(new THREE.Vector3(
+                x * scale * baseRadius,
+                y * scale * baseRadius,
+                z * scale * baseRadius
+            ));
+        }
+        return ringPoints;
+    }
+
     createSemanticYarn(pointsData, colors, metadata) {
         console.log('Creating semantic yarn with:', {
             points: pointsData?.length,
@@ -485,128 +657,63 @@ class VisualizationManager {
         });
 
         const group = new THREE.Group();
-        const baseRadius = 2;
-        const numPoints = 100;
-
-        // Get all settings first and log them
-        const settings = {
-            scaleMin: parseFloat(document.getElementById('scaleMin').value) || 0.6,
-            scaleMax: parseFloat(document.getElementById('scaleMax').value) || 1.5,
-            curveMin: parseFloat(document.getElementById('curveMin').value) || -1.0,
-            curveMax: parseFloat(document.getElementById('curveMax').value) || 1.0,
-            speedMin: parseFloat(document.getElementById('speedMin').value) || -0.02,
-            speedMax: parseFloat(document.getElementById('speedMax').value) || 0.02,
-            sizeMin: parseFloat(document.getElementById('sizeMin').value) || 0.1,
-            sizeMax: parseFloat(document.getElementById('sizeMax').value) || 0.3
-        };
+        this.yarnObjects = [];
 
+        const settings = this.readYarnSettings();
         console.log('Using visualization settings:', settings);
 
         // Find min/max values for normalization
-        const dimensions = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11];
-        const ranges = dimensions.map(dim => {
-            const values = pointsData.map(p => {
-                const val = p[dim];
-                return typeof val === 'number' ? val : 0;
-            });
-            const min = Math.min(...values);
-            const max = Math.max(...values);
-            return {
-                min: min === max ? min - 1 : min,
-                max: min === max ? max + 1 : max
-            };
+        const ranges = this.channelRanges(pointsData);
+
+        this.addYarnObjects(group, pointsData, colors, metadata, 0, ranges, settings);
+
+        // Create origin marker - green wireframe cube with diagonals
+        const cubeSize = 0.8;
+        const originColor = 0x00ff00;
+        
+        // Create wireframe cube vertices
+        const edges = [
+            [-1, -1, -1], [1, -1, -1], [1, -1, -1], [1, 1, -1],
+            [1, 1, -1], [-1, 1, -1], [-1, 1, -1], [-1, -1, -1],
+            [-1, -1, 1], [1, -1, 1], [1, -1, 1], [1, 1, 1],
+            [1, 1, 1], [-1, 1, 1], [-1, 1, 1], [-1, -1, 1],
+            [-1, -1, -1], [-1, -1, 1], [1, -1, -1], [1, -1, 1],
+            [1, 1, -1], [1, 1, 1], [-1, 1, -1], [-1, 1, 1],
+            [-1, -1, -1], [1, 1, 1], [1, -1, -1], [-1, 1, 1],
+            [-1, -1, 1], [1, 1, -1], [1, -1, 1], [-1, 1, -1]
+        ];
+
+        const points = [];
+        for (let i = 0; i < edges.length; i += 2) {
+            points.push(
+                new THREE.Vector3(edges[i][0] * cubeSize/2, edges[i][1] * cubeSize/2, edges[i][2] * cubeSize/2),
+                new THREE.Vector3(edges[i+1][0] * cubeSize/2, edges[i+1][1] * cubeSize/2, edges[i+1][2] * cubeSize/2)
+            );
+        }
+
+        const geometry = new THREE.BufferGeometry().setFromPoints(points);
+        const material = new THREE.LineBasicMaterial({
+            color: originColor,
+            linewidth: 2,
+            transparent: true,
+            opacity: 1.0
         });
 
-        pointsData.forEach((point, i) => {
-            try {
-                // Log raw value for velocity dimension
-                console.log(`Point ${i}: raw velocity dimension value=${point[3]}`);
-                
-                // Normalize dimensions, using 0 for missing ones
-                const normalizedPoint = dimensions.map(dim => {
-                    const val = point[dim] || 0;
-                    const range = ranges[dim];
-                    return -1 + 2 * (val - range.min) / (range.max - range.min);
-                });
+        const originMarker = new THREE.LineSegments(geometry, material);
+        group.add(originMarker);
 
-                const rotationX = (normalizedPoint[0] * Math.PI) / 2;
-                const rotationZ = (normalizedPoint[1] * Math.PI) / 2;
-                const scale = settings.scaleMin + ((normalizedPoint[2] + 1) / 2) * (settings.scaleMax - settings.scaleMin);
-                
-                // Velocity calculation: map normalized values to speed range
-                let velocity;
-                if (normalizedPoint[3] > 0) {
-                    velocity = normalizedPoint[3] * settings.speedMax;
-                } else if (normalizedPoint[3] < 0) {
-                    velocity = normalizedPoint[3] * Math.abs(settings.speedMin);
-                } else {
-                    velocity = 0;
-                }
-                
-                console.log(`Point ${i}: normalized=${normalizedPoint[3]}, velocity=${velocity}`);
-                
-                const pointSize = settings.sizeMin + ((normalizedPoint[4] + 1) / 2) * (settings.sizeMax - settings.sizeMin);
-                
-                // Calculate undulations based on dimension 6
-                const undulationsMin = parseFloat(document.getElementById('undulationsMin').value) || 2;
-                const undulationsMax = parseFloat(document.getElementById('undulationsMax').value) || 10;
-                const undulations = Math.round(undulationsMin + ((normalizedPoint[6] + 1) / 2) * (undulationsMax - undulationsMin));
-                
-                // Calculate wave amplitude from dimension 7
-                const amplitudeMin = parseFloat(document.getElementById('amplitudeMin').value) || 0.05;
-                const amplitudeMax = parseFloat(document.getElementById('amplitudeMax').value) || 0.4;
-                const waveAmplitude = amplitudeMin + ((normalizedPoint[7] + 1) / 2) * (amplitudeMax - amplitudeMin);
-                
-                // Calculate wave phase from dimension 8
-                const phaseMin = parseFloat(document.getElementById('phaseMin').value) || 0;
-                const phaseMax = parseFloat(document.getElementById('phaseMax').value) || 6.28;
-                const wavePhase = phaseMin + ((normalizedPoint[8] + 1) / 2) * (phaseMax - phaseMin);
-                
-                const ringPoints = [];
-                for (let p = 0; p <= numPoints; p++) {
-                    const angle = (p / numPoints) * Math.PI * 2;
-                    const baseX = Math.cos(angle);
-                    const baseZ = Math.sin(angle);
-                    
-                    // Add undulation effect with amplitude and phase control
-                    const undulationEffect = Math.sin(angle * undulations + wavePhase) * waveAmplitude;
-                    
-                    let displacement = undulationEffect;
-                    let dimensionsUsed = 0;
-                    
-                    for (let d = 9; d < point.length && d < 384; d++) {
-                        if (point[d] !== undefined && !isNaN(point[d])) {
-                            const weight = Math.sin((d - 9) * angle);
-                            displacement += point[d] * weight;
-                            dimensionsUsed++;
-                        }
-                    }
-                    
-                    if (dimensionsUsed > 0) {
-                        displacement = (displacement / Math.sqrt(dimensionsUsed + 1)) * (settings.curveMax - settings.curveMin) + settings.curveMin;
-                    }
-                    
-                    let x = baseX;
-                    let y = displacement;
-                    let z = baseZ;
-                    
-                    // Apply rotations
-                    const y1 = y * Math.cos(rotationX) - z * Math.sin(rotationX);
-                    const z1 = y * Math.sin(rotationX) + z * Math.cos(rotationX);
-                    y = y1;
-                    z = z1;
-                    
-                    const x1 = x * Math.cos(rotationZ) - y * Math.sin(rotationZ);
-                    const y2 = x * Math.sin(rotationZ) + y * Math.cos(rotationZ);
-                    x = x1;
-                    y = y2;
-                    
-                    ringPoints.push(new THREE.Vector3(
-                        x * scale * baseRadius,
-                        y * scale * baseRadius,
-                        z * scale * baseRadius
-                    ));
-                }
+        return group;
+    }
+
+    // Rings and points of pointsData[start:], added to group and this.yarnObjects
+    addYarnObjects(group, pointsData, colors, metadata, start, ranges, settings) {
+        for (let i = start; i < pointsData.length; i++) {
+            const point = pointsData[i];
+            try {
+                const normalizedPoint = this.normalizePoint(point, ranges);
+                const velocity = this.pointVelocity(normalizedPoint, settings);
+                const pointSize = this.pointSize(normalizedPoint, settings);
+                const ringPoints = this.ringPoints(point, normalizedPoint, settings);
                 
                 if (ringPoints.length >= 2) {
                     try {
@@ -620,7 +727,7 @@ class VisualizationManager {
                         }
 
                         // Create yarn line with thicker line
-                        const curvePoints = curve.getPoints(200);
+                        const curvePoints = curve.getPoints(RING_SEGMENTS);
                         const geometry = new THREE.BufferGeometry().setFromPoints(curvePoints);
                         const material = new THREE.LineBasicMaterial({
                             color: new THREE.Color(colors[i * 3], colors[i * 3 + 1], colors[i * 3 + 2]),
@@ -665,22 +772,23 @@ class VisualizationManager {
                             this.lookAt(camera.position);
                         }.bind(pointMesh);
                         
-                        // Log node ID assignment
                         const nodeId = metadata[i]?.node_id;
-                        console.log(`Creating point ${i} with node_id: ${nodeId}`);
                         
                         // Store animation data with node_id
                         pointMesh.userData = {
                             curve: curve,
                             progress: initialProgress,
                             velocity: velocity,
+                            pointSize: pointSize,
                             scatterFrequency: normalizedPoint[9],
                             scatterLength: normalizedPoint[10],
                             scatterColor: normalizedPoint[11],
                             lastScatterTime: null,
                             nextScatterTime: 0,
-                            nodeId: nodeId
-                            
+                            nodeId: nodeId,
+                            database: metadata[i]?.database,
+                            index: i
+
                         };
                         
                         // Store the same nodeId on the ring for animation
@@ -690,6 +798,7 @@ class VisualizationManager {
                         
                         group.add(yarn);
                         group.add(pointMesh);
+                        this.yarnObjects.push({ index: i, yarn, pointMesh });
                         
                     } catch (error) {
                         console.warn(`Error creating curve for point ${i}:`, error);
@@ -698,44 +807,451 @@ class VisualizationManager {
             } catch (error) {
                 console.warn('Error creating yarn', i, error);
             }
+        }
+    }
+
+    setupPointTooltip(canvas) {
+        this.raycaster = new THREE.Raycaster();
+        this.pointer = new THREE.Vector2();
+        // node_id -> chunk details, least recently used first
+        this.nodeDetails = new Map();
+        // node_id -> database of details waiting for the next batch, and their callbacks
+        this.pendingDetails = new Map();
+        this.detailWaiters = new Map();
+        this.detailTimer = null;
+        this.hoveredNode = null;
+        this.pinnedNode = null;
+
+        this.tooltip = document.createElement('div');
+        this.tooltip.className = 'point-tooltip';
+        document.body.appendChild(this.tooltip);
+
+        let lastMove = 0;
+        canvas.addEventListener('pointermove', (event) => {
+            const now = performance.now();
+            if (this.pinnedNode || now - lastMove < 50) return;
+            lastMove = now;
+            this.showNodeTooltip(this.pickPoint(event), event, false);
         });
 
-        // Create origin marker - green wireframe cube with diagonals
-        const cubeSize = 0.8;
-        const originColor = 0x00ff00;
-        
-        // Create wireframe cube vertices
-        const edges = [
-            [-1, -1, -1], [1, -1, -1], [1, -1, -1], [1, 1, -1],
-            [1, 1, -1], [-1, 1, -1], [-1, 1, -1], [-1, -1, -1],
-            [-1, -1, 1], [1, -1, 1], [1, -1, 1], [1, 1, 1],
-            [1, 1, 1], [-1, 1, 1], [-1, 1, 1], [-1, -1, 1],
-            [-1, -1, -1], [-1, -1, 1], [1, -1, -1], [1, -1, 1],
-            [1, 1, -1], [1, 1, 1], [-1, 1, -1], [-1, 1, 1],
-            [-1, -1, -1], [1, 1, 1], [1, -1, -1], [-1, 1, 1],
-            [-1, -1, 1], [1, 1, -1], [1, -1, 1], [-1, 1, -1]
-        ];
+        // A click pins the full text of a point; dragging the camera does not
+        let downAt = null;
+        canvas.addEventListener('pointerdown', (event) => {
+            downAt = { x: event.clientX, y: event.clientY };
+        });
+        canvas.addEventListener('click', (event) => {
+            if (downAt && Math.hypot(event.clientX - downAt.x, event.clientY - downAt.y) > 5) return;
+            const mesh = this.pickPoint(event);
+            this.pinnedNode = mesh ? mesh.userData.nodeId : null;
+            this.showNodeTooltip(mesh, event, !!mesh);
+        });
+    }
 
-        const points = [];
-        for (let i = 0; i < edges.length; i += 2) {
-            points.push(
-                new THREE.Vector3(edges[i][0] * cubeSize/2, edges[i][1] * cubeSize/2, edges[i][2] * cubeSize/2),
-                new THREE.Vector3(edges[i+1][0] * cubeSize/2, edges[i+1][1] * cubeSize/2, edges[i+1][2] * cubeSize/2)
-            );
+    pickPoint(event) {
+        if (this.yarnObjects.length === 0 || !this.camera) return null;
+        const rect = this.renderer.domElement.getBoundingClientRect();
+        this.pointer.set(
+            ((event.clientX - rect.left) / rect.width) * 2 - 1,
+            -((event.clientY - rect.top) / rect.height) * 2 + 1
+        );
+        this.raycaster.setFromCamera(this.pointer, this.camera);
+        const hits = this.raycaster.intersectObjects(this.yarnObjects.map(o => o.pointMesh), false);
+        return hits.length > 0 ? hits[0].object : null;
+    }
+
+    showNodeTooltip(mesh, event, pinned) {
+        if (!mesh || !mesh.userData.nodeId) {
+            this.hideNodeTooltip();
+            return;
+        }
+        const { nodeId, database, index } = mesh.userData;
+        this.hoveredNode = nodeId;
+        const label = this.clusterLabel(index);
+        this.tooltip.classList.toggle('pinned', pinned);
+        this.tooltip.style.left = `${event.clientX + 12}px`;
+        this.tooltip.style.top = `${event.clientY + 12}px`;
+        this.tooltip.style.display = 'block';
+
+        const details = this.cachedNodeDetails(nodeId);
+        this.renderNodeTooltip(database, details, pinned, label);
+        if (!details) {
+            this.fetchNodeDetails(nodeId, database).then(fetched => {
+                if (this.hoveredNode === nodeId) {
+                    this.renderNodeTooltip(database, fetched, pinned, label);
+                }
+            });
+        }
+    }
+
+    hideNodeTooltip() {
+        this.hoveredNode = null;
+        this.pinnedNode = null;
+        if (this.tooltip) this.tooltip.style.display = 'none';
+    }
+
+    renderNodeTooltip(database, details, pinned, label) {
+        const page = details?.metadata?.page_label ? `, p. ${details.metadata.page_label}` : '';
+        const source = document.createElement('div');
+        source.className = 'tooltip-source';
+        source.textContent = `[${database}${page}]` + (label !== null && label !== undefined ? ` cluster ${label}` : '');
+
+        const text = document.createElement('div');
+        if (details === undefined) {
+            text.textContent = 'loading...';
+        } else if (!details) {
+            text.textContent = 'Chunk not found';
+        } else if (pinned || details.text.length <= TOOLTIP_PREVIEW_CHARS) {
+            text.textContent = details.text;
+        } else {
+            text.textContent = details.text.slice(0, TOOLTIP_PREVIEW_CHARS) + '... (click for full text)';
         }
+        this.tooltip.replaceChildren(source, text);
+    }
 
-        const geometry = new THREE.BufferGeometry().setFromPoints(points);
-        const material = new THREE.LineBasicMaterial({
-            color: originColor,
-            linewidth: 2,
-            transparent: true,
-            opacity: 1.0
+    cachedNodeDetails(nodeId) {
+        const details = this.nodeDetails.get(nodeId);
+        if (details !== undefined) {
+            // Mark as recently used
+            this.nodeDetails.delete(nodeId);
+            this.nodeDetails.set(nodeId, details);
+        }
+        return details;
+    }
+
+    // Resolve with the details of a chunk (or null); requests are batched per NODE_BATCH_DELAY_MS
+    fetchNodeDetails(nodeId, database) {
+        return new Promise(resolve => {
+            if (this.detailWaiters.has(nodeId)) {
+                this.detailWaiters.get(nodeId).push(resolve);
+                return;
+            }
+            this.detailWaiters.set(nodeId, [resolve]);
+            this.pendingDetails.set(nodeId, database);
+            if (!this.detailTimer) {
+                this.detailTimer = setTimeout(() => this.flushNodeDetails(), NODE_BATCH_DELAY_MS);
+            }
         });
+    }
 
-        const originMarker = new THREE.LineSegments(geometry, material);
-        group.add(originMarker);
+    flushNodeDetails() {
+        this.detailTimer = null;
+        const nodes = [...this.pendingDetails].map(([node_id, database]) => ({ node_id, database }));
+        this.pendingDetails.clear();
+        fetch('/api/node', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ nodes })
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) throw new Error(data.error);
+                data.nodes.forEach(node => {
+                    this.nodeDetails.set(node.node_id, node);
+                    if (this.nodeDetails.size > NODE_CACHE_SIZE) {
+                        this.nodeDetails.delete(this.nodeDetails.keys().next().value);
+                    }
+                });
+            })
+            .catch(error => {
+                console.error('Error fetching chunk details:', error);
+            })
+            .finally(() => {
+                nodes.forEach(({ node_id }) => {
+                    const waiters = this.detailWaiters.get(node_id) || [];
+                    this.detailWaiters.delete(node_id);
+                    waiters.forEach(resolve => resolve(this.nodeDetails.get(node_id) || null));
+                });
+            });
+    }
 
-        return group;
+    // Threads from every chunk to its nearest neighbors, from the session's kNN graph
+    loadThreads() {
+        const request = ++this.threadRequest;
+        this.removeThreads();
+        const k = parseInt(document.getElementById('threadNeighbors')?.value, 10) || 0;
+        if (k <= 0 || !this.vizSession || this.yarnObjects.length === 0) return;
+
+        const session = this.vizSession;
+        fetch(`/api/viz/${session.id}/graph?k=${k}&version=${session.version}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`Neighbor graph request failed (${response.status})`);
+                const edges = parseInt(response.headers.get('X-Viz-Edges'), 10);
+                return response.arrayBuffer().then(buffer => ({ buffer, edges }));
+            })
+            .then(({ buffer, edges }) => {
+                // A newer request, or the selection changed while the graph was loading
+                if (request !== this.threadRequest || this.vizSession !== session || this.points.length === 0) return;
+                this.createThreads(new Uint32Array(buffer, 0, edges * 2), new Float32Array(buffer, edges * 8, edges));
+            })
+            .catch(error => {
+                console.error('Error loading neighbor threads:', error);
+            });
+    }
+
+    createThreads(pairs, weights) {
+        this.removeThreads();
+        const meshes = [];
+        this.yarnObjects.forEach(({ index, pointMesh }) => { meshes[index] = pointMesh; });
+
+        // Brighter threads for more similar chunks
+        let minWeight = Infinity;
+        let maxWeight = -Infinity;
+        weights.forEach(w => {
+            if (w < minWeight) minWeight = w;
+            if (w > maxWeight) maxWeight = w;
+        });
+        const spread = maxWeight - minWeight || 1;
+
+        const ends = [];
+        const colors = [];
+        for (let e = 0; e < weights.length; e++) {
+            const source = meshes[pairs[e * 2]];
+            const target = meshes[pairs[e * 2 + 1]];
+            if (!source || !target) continue;
+            const brightness = 0.25 + 0.75 * (weights[e] - minWeight) / spread;
+            ends.push(source, target);
+            colors.push(brightness, brightness, brightness, brightness, brightness, brightness);
+        }
+
+        const geometry = new THREE.BufferGeometry();
+        geometry.setAttribute('position', new THREE.BufferAttribute(new Float32Array(ends.length * 3), 3));
+        geometry.setAttribute('color', new THREE.BufferAttribute(new Float32Array(colors), 3));
+        const material = new THREE.LineBasicMaterial({ vertexColors: true, transparent: true, opacity: 0.35 });
+        this.threads = new THREE.LineSegments(geometry, material);
+        // The ends move with the points every frame
+        this.threads.frustumCulled = false;
+        this.threads.userData = { ends };
+        this.points[0].add(this.threads);
+        this.updateThreads();
+        console.log(`Drew ${ends.length / 2} neighbor threads`);
+    }
+
+    updateThreads() {
+        if (!this.threads) return;
+        const ends = this.threads.userData.ends;
+        const position = this.threads.geometry.attributes.position;
+        const array = position.array;
+        for (let i = 0; i < ends.length; i++) {
+            const p = ends[i].position;
+            array[i * 3] = p.x;
+            array[i * 3 + 1] = p.y;
+            array[i * 3 + 2] = p.z;
+        }
+        position.needsUpdate = true;
+    }
+
+    removeThreads() {
+        if (!this.threads) return;
+        if (this.threads.parent) this.threads.parent.remove(this.threads);
+        this.threads.geometry.dispose();
+        this.threads.material.dispose();
+        this.threads = null;
+    }
+
+    readClusterCount() {
+        return parseInt(document.getElementById('clusterCount')?.value, 10) || 8;
+    }
+
+    // Clusters of the shown selection at the current cluster count, or null
+    currentClusters() {
+        const clusters = this.clusters;
+        if (!clusters || clusters.session !== this.vizSession || clusters.k !== this.readClusterCount()) return null;
+        return clusters;
+    }
+
+    // Cluster id of a drawn chunk while points are colored by cluster
+    clusterLabel(index) {
+        if (document.getElementById('colorMode')?.value !== 'cluster') return null;
+        const labels = this.currentClusters()?.labels;
+        return labels && index !== undefined ? labels[index] : null;
+    }
+
+    // Hues spread by the golden ratio, so neighboring ids get distinct colors
+    clusterColor(label) {
+        return new THREE.Color().setHSL((label * 0.618034) % 1, 0.75, 0.55);
+    }
+
+    // Fetch the session's clusters, then recolor the points and show the legend
+    loadClusters() {
+        const session = this.vizSession;
+        const k = this.readClusterCount();
+        if (!session || (this.clusterPending && this.clusterPending.session === session && this.clusterPending.k === k)) return;
+        const request = ++this.clusterRequest;
+        this.clusterPending = { session, k };
+
+        fetch(`/api/viz/${session.id}/clusters?k=${k}&version=${session.version}`)
+            .then(response => response.json().then(data => {
+                if (!response.ok) throw new Error(data.error || `Cluster request failed (${response.status})`);
+                return data;
+            }))
+            .then(data => {
+                // A newer request, or the selection changed while clustering
+                if (request !== this.clusterRequest || this.vizSession !== session) return;
+                // The server caps k, so keep the requested count to match the setting
+                this.clusters = { session, k, labels: data.labels, clusters: data.clusters };
+                console.log(`Loaded ${data.k} clusters (${data.mode})`);
+                if (this.currentData && this.yarnObjects.length > 0) {
+                    this.patchScene(new Set(['colors']));
+                }
+            })
+            .catch(error => {
+                console.error('Error loading clusters:', error);
+            })
+            .finally(() => {
+                if (request === this.clusterRequest) this.clusterPending = null;
+            });
+    }
+
+    // Legend of the clusters with the chunk closest to each centroid; hidden in other color modes
+    updateClusterLegend() {
+        const clusters = document.getElementById('colorMode')?.value === 'cluster' ? this.currentClusters() : null;
+        if (!clusters) {
+            if (this.clusterLegend) this.clusterLegend.style.display = 'none';
+            return;
+        }
+        if (!this.clusterLegend) {
+            this.clusterLegend = document.createElement('div');
+            this.clusterLegend.className = 'cluster-legend';
+            document.body.appendChild(this.clusterLegend);
+        }
+        const entries = clusters.clusters.filter(cluster => cluster.size > 0).map(cluster => {
+            const entry = document.createElement('div');
+            entry.className = 'cluster-entry';
+            const swatch = document.createElement('span');
+            swatch.className = 'cluster-swatch';
+            swatch.style.background = `#${this.clusterColor(cluster.id).getHexString()}`;
+            const closest = cluster.representatives[0];
+            const preview = closest ? closest.text.replace(/\s+/g, ' ').slice(0, LEGEND_PREVIEW_CHARS) : '';
+            entry.append(swatch, `${cluster.id} (${cluster.size}) ${preview}`);
+            entry.title = cluster.representatives.map(r => `[${r.database}] ${r.text}`).join('\n\n');
+            return entry;
+        });
+        this.clusterLegend.replaceChildren(...entries);
+        this.clusterLegend.style.display = 'block';
+    }
+
+    // Channel -> dimension mapping from the Dimensions setting, or null while it is incomplete
+    readChannelDims() {
+        const element = document.getElementById('channelDims');
+        if (!element || !element.value.trim()) return DEFAULT_CHANNEL_DIMS.slice();
+        const dims = element.value.split(',').map(d => d.trim());
+        if (dims.length !== DEFAULT_CHANNEL_DIMS.length || !dims.every(d => /^\d+$/.test(d))) {
+            return null;
+        }
+        return dims.map(d => parseInt(d, 10));
+    }
+
+    applySettingChange(id) {
+        // Nothing is drawn yet; the next redrawScene reads the settings
+        if (!this.currentData || this.yarnObjects.length === 0) return;
+        if (id === 'channelDims') {
+            this.remapChannels();
+        } else if (id === 'threadNeighbors') {
+            this.loadThreads();
+        } else if (id === 'clusterCount') {
+            if (document.getElementById('colorMode')?.value === 'cluster') {
+                this.patchScene(new Set(['colors']));
+            }
+        } else if (SETTING_EFFECTS[id]) {
+            this.patchScene(new Set([SETTING_EFFECTS[id]]));
+        }
+    }
+
+    // Fetch only the columns of remapped channels from the visualization session
+    remapChannels() {
+        const dims = this.readChannelDims();
+        if (!dims) return;
+        const changed = DEFAULT_CHANNEL_DIMS.filter(channel => dims[channel] !== this.channelDims[channel]);
+        if (changed.length === 0) return;
+        if (!this.vizSession) {
+            this.redrawScene();
+            return;
+        }
+
+        const wanted = [...new Set(changed.map(channel => dims[channel]))];
+        const request = ++this.remapRequest;
+        const session = this.vizSession;
+        fetch(`/api/viz/${session.id}/columns?dims=${wanted.join(',')}&version=${session.version}`)
+            .then(response => {
+                if (response.status === 404 || response.status === 409) {
+                    // The session was dropped or shows another selection now
+                    return null;
+                }
+                if (!response.ok) {
+                    return response.json().then(data => { throw new Error(data.error); });
+                }
+                return response.arrayBuffer();
+            })
+            .then(buffer => {
+                // A newer remap is under way; it covers these channels too
+                if (request !== this.remapRequest || !this.currentData) return;
+                const pointsData = this.currentData.points;
+                const columns = buffer ? new Float32Array(buffer) : null;
+                if (!columns || columns.length !== wanted.length * pointsData.length) {
+                    // Reload with the new mapping unless a newer selection already replaced the session
+                    if (this.vizSession === session) this.redrawScene();
+                    return;
+                }
+                const effects = new Set();
+                changed.forEach(channel => {
+                    const offset = wanted.indexOf(dims[channel]) * pointsData.length;
+                    pointsData.forEach((point, i) => { point[channel] = columns[offset + i]; });
+                    CHANNEL_EFFECTS[channel].forEach(effect => effects.add(effect));
+                });
+                this.channelDims = dims;
+                console.log(`Remapped channels ${changed.join(',')} with ${buffer.byteLength} bytes`);
+                this.patchScene(effects);
+            })
+            .catch(error => {
+                console.error('Error remapping dimensions:', error);
+            });
+    }
+
+    // Update the drawn rings and points in place: ring vertices, point sizes,
+    // colors and animation data, without rebuilding the scene
+    patchScene(effects) {
+        const start = performance.now();
+        const { points: pointsData, metadata } = this.currentData;
+        const settings = this.readYarnSettings();
+        const ranges = this.channelRanges(pointsData);
+        const colors = effects.has('colors') ? this.updateColors(pointsData, metadata) : null;
+        if (colors) this.updateClusterLegend();
+
+        this.yarnObjects.forEach(({ index, yarn, pointMesh }) => {
+            const point = pointsData[index];
+            const normalizedPoint = this.normalizePoint(point, ranges);
+            const userData = pointMesh.userData;
+
+            if (effects.has('rings')) {
+                const curve = new THREE.CatmullRomCurve3(this.ringPoints(point, normalizedPoint, settings), true);
+                const position = yarn.geometry.attributes.position;
+                curve.getPoints(RING_SEGMENTS).forEach((p, k) => position.setXYZ(k, p.x, p.y, p.z));
+                position.needsUpdate = true;
+                yarn.geometry.computeBoundingSphere();
+                userData.curve = curve;
+            }
+            if (effects.has('velocity')) {
+                userData.velocity = this.pointVelocity(normalizedPoint, settings);
+            }
+            if (effects.has('size')) {
+                const size = this.pointSize(normalizedPoint, settings);
+                if (userData.pointSize > 0 && size > 0) {
+                    const ratio = size / userData.pointSize;
+                    pointMesh.geometry.scale(ratio, ratio, 1);
+                    userData.pointSize = size;
+                }
+            }
+            if (effects.has('scatter')) {
+                userData.scatterFrequency = normalizedPoint[9];
+                userData.scatterLength = normalizedPoint[10];
+                userData.scatterColor = normalizedPoint[11];
+            }
+            if (colors) {
+                yarn.material.color.setRGB(colors[index * 3], colors[index * 3 + 1], colors[index * 3 + 2]);
+                pointMesh.material.color.setRGB(colors[index * 3], colors[index * 3 + 1], colors[index * 3 + 2]);
+            }
+        });
+        console.log(`Patched ${[...effects].join(', ')} of ${this.yarnObjects.length} chunks in ${(performance.now() - start).toFixed(1)}ms`);
     }
 
     redrawScene() {
@@ -747,11 +1263,8 @@ class VisualizationManager {
         console.log('Starting full visualization update');
         
         // Get selected documents with vector databases
-        const selectedDocs = document.querySelectorAll('.doc-checkbox:checked');
-        const vectorDbDocs = Array.from(selectedDocs).filter(doc => {
-            const docItem = doc.closest('.document-item');
-            return docItem.querySelector('.vector-db-indicator') !== null;
-        });
+        const selectedDocs = window.documentManager ? window.documentManager.getSelectedDocuments() : [];
+        const vectorDbDocs = selectedDocs.filter(doc => doc.has_vector_db);
         
         if (vectorDbDocs.length === 0) {
             console.log('No vector documents selected, clearing visualization');
@@ -764,39 +1277,131 @@ class VisualizationManager {
         this.showOverlay('Updating visualization...');
 
         // Extract citekeys and prepare form data
-        const selectedCitekeys = vectorDbDocs.map(doc => doc.id.replace('doc-', ''));
+        const selectedCitekeys = vectorDbDocs.map(doc => doc.citekey);
         const formData = new FormData();
         selectedCitekeys.forEach(citekey => formData.append('databases[]', citekey));
 
-        // Add all dimension mappings
-        const dimensions = ['x', 'y', 'z', 'w', 'v', 'color', 'undulation', 'amplitude', 'phase', 'scatter_frequency', 'scatter_length', 'scatter_color'];
-        dimensions.forEach((dim, index) => {
-            formData.append(`${dim}_dimension`, index);
+        // Add all dimension mappings and the session to keep the selection in
+        const channelDims = this.readChannelDims() || this.channelDims;
+        CHANNEL_FIELDS.forEach((field, channel) => {
+            formData.append(field, channelDims[channel]);
         });
+        if (this.vizSessionId) {
+            formData.append('session_id', this.vizSessionId);
+        }
 
-        // Fetch fresh data from server
-        fetch('/', {
-            method: 'POST',
-            body: formData
-        })
-        .then(response => response.json())
-        .then(data => {
-            if (data.error) throw new Error(data.error);
-            this.currentData = {
-                points: data.points,
-                metadata: data.metadata
-            };
-            // Update with fresh data
-            this.redrawYarn(data.points, data.metadata);
-
-            this.hideOverlay();
-        })
+        // Points are drawn batch by batch while the server reads the databases
+        this.streamScene(formData)
         .catch(error => {
+            if (error.name === 'AbortError') return;  // Replaced by a newer selection
             console.error('Visualization update error:', error);
             this.showOverlay('Error: ' + error.message, 'error');
         });
     }
 
+    // Fetch the selection from /api/viz/stream (newline-delimited JSON) and draw each batch as it arrives
+    streamScene(formData) {
+        const request = ++this.streamRequest;
+        if (this.streamAbort) this.streamAbort.abort();
+        const controller = new AbortController();
+        this.streamAbort = controller;
+        const stream = { databases: [], ranges: null };
+
+        return fetch('/api/viz/stream', { method: 'POST', body: formData, signal: controller.signal })
+            .then(response => {
+                if (!response.ok || !response.body) {
+                    return response.json().then(data => {
+                        throw new Error(data.error || `Visualization request failed (${response.status})`);
+                    });
+                }
+                return this.readStreamLines(response.body, message => {
+                    if (request === this.streamRequest) this.handleStreamMessage(message, stream);
+                });
+            });
+    }
+
+    async readStreamLines(body, onMessage) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => onMessage(JSON.parse(line)));
+        }
+        if (buffered.trim()) onMessage(JSON.parse(buffered));
+    }
+
+    handleStreamMessage(message, stream) {
+        if (message.type === 'error') {
+            throw new Error(message.error);
+        } else if (message.type === 'start') {
+            stream.databases = message.databases;
+            // Points already have their final [-1, 1] values when the server knew the selection's statistics
+            stream.ranges = message.final_values ? UNIT_RANGES : null;
+            this.channelDims = CHANNEL_KEYS.map(key => message.dimensions[key]);
+            this.beginYarn();
+        } else if (message.type === 'points') {
+            // Points carry only node ids and database indexes; details are fetched on hover
+            const database = stream.databases[message.db_index];
+            this.appendYarn(message.points, message.node_ids.map(nodeId => ({ node_id: nodeId, database })), stream.ranges);
+        } else if (message.type === 'end') {
+            this.vizSession = message.session;
+            this.vizSessionId = message.session.id;
+            this.finishYarn(stream.ranges);
+        }
+    }
+
+    // Empty yarn group for a streamed selection; appendYarn adds the points
+    beginYarn() {
+        this.clearVisualization();
+        // Threads, clusters and remapping wait for the session sent at the end
+        this.vizSession = null;
+        this.currentData = { points: [], metadata: [] };
+        const group = this.createSemanticYarn([], [], []);
+        this.scene.add(group);
+        this.points.push(group);
+        document.getElementById('chunkCount').textContent = 0;
+    }
+
+    appendYarn(pointsData, metadata, ranges) {
+        const data = this.currentData;
+        if (!data || this.points.length === 0) return;
+        const start = data.points.length;
+        pointsData.forEach(point => data.points.push(point));
+        metadata.forEach(meta => data.metadata.push(meta));
+
+        const colors = this.updateColors(data.points, data.metadata);
+        this.addYarnObjects(this.points[0], data.points, colors, data.metadata, start,
+            ranges || this.channelRanges(data.points), this.readYarnSettings());
+        document.getElementById('chunkCount').textContent = data.points.length;
+        this.hideOverlay();
+    }
+
+    finishYarn(ranges) {
+        const data = this.currentData;
+        if (!data || data.points.length === 0) {
+            this.showOverlay('No data points to visualize', 'error');
+            return;
+        }
+        // Batches drawn with other ranges than the whole selection's, and colors that
+        // depend on all points (database hues, cluster labels), are patched in place
+        const final = this.channelRanges(data.points);
+        const settled = ranges && final.every((range, dim) =>
+            Math.abs(range.min - ranges[dim].min) < 1e-4 && Math.abs(range.max - ranges[dim].max) < 1e-4);
+        this.patchScene(new Set(settled ? ['colors'] : ['rings', 'velocity', 'size', 'scatter', 'colors']));
+        this.loadThreads();
+        if (this.firstVisualization) {
+            this.zoomExtents();
+            this.firstVisualization = false;
+        }
+        this.hideOverlay();
+        console.log(`Streamed ${data.points.length} points`);
+    }
+
     redrawYarn(pointsData, metadata) {
         try {
             console.log('Updating visualization with new settings');
@@ -833,7 +1438,9 @@ class VisualizationManager {
                 metadata = Array(pointsData.length).fill({database: 'unknown'});
             }
 
+            this.currentData = { points: pointsData, metadata: metadata };
             const colors = this.updateColors(pointsData, metadata);
+            this.updateClusterLegend();
             let visualization = this.createSemanticYarn(pointsData, colors, metadata);
             
             // Debug the created visualization
@@ -868,6 +1475,7 @@ class VisualizationManager {
 
             // Update the chunk count display
             document.getElementById('chunkCount').textContent = pointsData.length;
+            this.loadThreads();
 
             // Reset camera on first visualization
             if (this.firstVisualization) {
@@ -958,8 +1566,13 @@ class VisualizationManager {
         });
         this.scatterLines = [];
         
+        this.removeThreads();
+        if (this.clusterLegend) this.clusterLegend.style.display = 'none';
+
         // Reset current data
         this.currentData = null;
+        this.yarnObjects = [];
+        this.hideNodeTooltip();
         
         // Update chunk count
         document.getElementById('chunkCount').textContent = '0';
@@ -984,7 +1597,7 @@ class VisualizationManager {
         if (overlay && this.isOverlayVisible) {
             // Only hide overlay if we're not in the initial state 
             // or if we have selected documents
-            const hasSelectedDocs = document.querySelectorAll('.doc-checkbox:checked').length > 0;
+            const hasSelectedDocs = (window.documentManager?.getSelectedCitekeys().length || 0) > 0;
             if (hasSelectedDocs || !this.firstVisualization) {
                 overlay.style.transition = 'opacity 0.5s ease-out';
                 overlay.style.opacity = '0';
@@ -1034,8 +1647,13 @@ class VisualizationManager {
         });
         this.scatterLines = [];
         
+        this.removeThreads();
+        if (this.clusterLegend) this.clusterLegend.style.display = 'none';
+
         // Reset current data
         this.currentData = null;
+        this.yarnObjects = [];
+        this.hideNodeTooltip();
         
         // Update chunk count
         document.getElementById('chunkCount').textContent = '0';
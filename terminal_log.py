@@ -0,0 +1,31 @@
+"""Terminal output shown in the UI after each request."""
+import threading
+from datetime import datetime
+from typing import List
+
+from flask import g, has_request_context
+
+# Terminal output buffer used outside of requests; requests collect their own output
+terminal_output_buffer = []
+terminal_output_lock = threading.Lock()
+
+
+def log_terminal(message: str):
+    """Add a message to the terminal output of the current request."""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    line = f"[{timestamp}] {message}"
+    if has_request_context():
+        g.setdefault('terminal_output', []).append(line)
+        return
+    with terminal_output_lock:
+        terminal_output_buffer.append(line)
+
+
+def get_terminal_output() -> List[str]:
+    """Get the terminal output of the current request and clear the buffer."""
+    if has_request_context():
+        return g.pop('terminal_output', [])
+    with terminal_output_lock:
+        output = terminal_output_buffer.copy()
+        terminal_output_buffer.clear()
+    return output
@@ -0,0 +1,121 @@
+"""Versioned visualization sessions for the 3D view.
+
+A session keeps the embeddings, metadata and combined statistics of the
+databases a browser tab is showing. Columns are normalized to [-1, 1] on first
+use and cached, so remapping a visual channel to another dimension fetches one
+column of the selection instead of reloading it. The version increases whenever
+the session's selection is replaced; column requests for an older version are
+rejected, so a late response never patches a different set of points.
+"""
+import uuid
+from collections import OrderedDict
+from itertools import groupby
+
+import numpy as np
+
+from async_mode import native_lock
+from knn_graph import KNN_K, edge_list, normalize_rows, selection_graph
+
+# Visual channels in the order of the dimension mapping: ring rotation about x
+# and z, ring scale, velocity, point size, color, undulations, wave amplitude and phase,
+# scatter frequency, length and color
+VIZ_CHANNELS = ('x', 'y', 'z', 'v', 'p', 'c', 'u', 'a', 'ph', 'sf', 'sl', 'sc')
+# Sessions kept (one per open tab); the least recently used is dropped first
+MAX_SESSIONS = 16
+
+
+def normalize_columns(columns, stats, dimensions):
+    """Scale columns to [-1, 1] with the selection's per-dimension min/max."""
+    embeddings_min = stats['min'][dimensions].astype(np.float32)
+    embeddings_max = stats['max'][dimensions].astype(np.float32)
+    denominator = embeddings_max - embeddings_min
+    denominator = np.where(denominator == 0, 1e-8, denominator)  # Prevent division by zero
+    return 2 * (columns - embeddings_min) / denominator - 1
+
+
+class VisualizationSession:
+    """The selection shown in one tab, with its normalized columns."""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.version = 0
+        self.databases = ()
+        self.embeddings = None
+        self.metadata = []
+        self.stats = None
+        self._columns = {}
+        self._graph = None
+
+    def update(self, databases, embeddings, metadata, stats):
+        self.databases = tuple(databases)
+        self.embeddings = embeddings
+        self.metadata = metadata
+        self.stats = stats
+        self._columns = {}
+        self._graph = None
+        self.version += 1
+
+    @property
+    def dims(self):
+        return self.embeddings.shape[1]
+
+    def columns(self, dimensions):
+        """float32 array (rows x len(dimensions)) of normalized columns."""
+        cached = self._columns
+        missing = [d for d in dict.fromkeys(dimensions) if d not in cached]
+        if missing:
+            values = normalize_columns(self.embeddings.dequantize(columns=missing), self.stats, missing)
+            for j, d in enumerate(missing):
+                cached[d] = np.ascontiguousarray(values[:, j], dtype=np.float32)
+        return np.stack([cached[d] for d in dimensions], axis=1)
+
+    def knn_edges(self, k, store_graph):
+        """Undirected kNN edges of the selection (see knn_graph.py), built once per version.
+
+        store_graph(database) returns the stored graph of one database.
+        """
+        if self._graph is None:
+            parts = []
+            offset = 0
+            n_databases = 0
+            # The rows of each database are contiguous
+            for database, rows in groupby(self.metadata, key=lambda m: m['db_name']):
+                ids = [m['node_id'] for m in rows]
+                graph = store_graph(database)
+                # Rows must match the stored graph, which is keyed by content hash
+                if graph is not None and graph['ids'] == ids:
+                    parts.append((offset, graph['indices'], graph['scores']))
+                offset += len(ids)
+                n_databases += 1
+            self._graph = selection_graph(parts, normalize_rows(self.embeddings.dequantize()), n_databases, KNN_K)
+        return edge_list(*self._graph, k)
+
+
+class VisualizationSessions:
+    """Visualization sessions by id, bounded to MAX_SESSIONS."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        # Requests run on OS threads (run_blocking), so use a real lock
+        self._lock = native_lock()
+        self._sessions = OrderedDict()
+
+    def open(self, session_id, databases, embeddings, metadata, stats):
+        """Replace the selection of a session (a new one if session_id is unknown)."""
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = VisualizationSession(uuid.uuid4().hex)
+                self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            session.update(databases, embeddings, metadata, stats)
+            return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session